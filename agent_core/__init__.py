@@ -0,0 +1,65 @@
+"""Shared runtime for the Cognitive Canvas agents.
+
+Every agent imports its provider access from here instead of building its own
+blocking ``OpenAI`` client, so a slow generation never stalls the event loop.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from .cache import ResponseCache, response_cache
+from .idea_memory import IdeaMemory, idea_memory
+from .compression import CompressionMiddleware
+from .logs import start_logging, stop_logging, stream_failed
+from .ops import router as ops_router, start_loop_monitor, stop_loop_monitor
+from .parsers import (CritiqueParser, IdeaParser, LineParser, PhaseParser, SlideParser,
+                      TaskParser, ndjson_events)
+from .providers import PROVIDERS, Provider, close_clients, get_client
+from .responses import stream_response
+from .sections import in_order
+from .streaming import ChatRequest, stream_chat
+from .tracing import TraceMiddleware, span
+from .warmup import start_warmup, stop_warmup
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan: runs the log writer, samples event-loop lag, warms the provider pool and releases it on shutdown."""
+    start_logging()
+    start_loop_monitor()
+    start_warmup()
+    yield
+    await stop_warmup()
+    await stop_loop_monitor()
+    await close_clients()
+    await asyncio.to_thread(stop_logging)
+
+
+__all__ = [
+    "PROVIDERS",
+    "ChatRequest",
+    "CompressionMiddleware",
+    "CritiqueParser",
+    "IdeaMemory",
+    "IdeaParser",
+    "LineParser",
+    "PhaseParser",
+    "Provider",
+    "ResponseCache",
+    "SlideParser",
+    "TaskParser",
+    "TraceMiddleware",
+    "close_clients",
+    "get_client",
+    "idea_memory",
+    "in_order",
+    "lifespan",
+    "ndjson_events",
+    "ops_router",
+    "response_cache",
+    "span",
+    "start_logging",
+    "stop_logging",
+    "stream_chat",
+    "stream_failed",
+    "stream_response",
+]
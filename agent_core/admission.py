@@ -0,0 +1,173 @@
+"""Per-agent admission control: a concurrency limit with a bounded wait queue.
+
+Every agent response stream needs a slot from its agent's limiter before it
+starts generating. Requests beyond ``max_concurrent`` wait in a FIFO queue of
+at most ``max_queued``; once that is full too, new requests are turned away
+straight away with ``429 Too Many Requests`` and a ``Retry-After`` estimated
+from how long streams have recently held a slot. Each agent has its own
+limiter, so a burst on the 70B agents never queues the task agent.
+
+The streams ``/pipeline`` fans out to (see ``pipeline``) claim slots from the
+same limiters, so one pipeline request never runs past an agent's limit; they
+wait in the queue even when it is full, since their request has already been
+admitted as a whole.
+
+Limits come from the agent's ``AgentSpec`` and can be overridden as
+``<AGENT>_MAX_CONCURRENT`` and ``<AGENT>_MAX_QUEUED``; ``ADMISSION=0`` turns
+admission control off.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+from .metrics import LATENCY_BUCKETS, Counter, Gauge, Histogram
+from .registry import AgentSpec, get_spec
+
+ENABLED = os.getenv("ADMISSION", "1") != "0"
+ALPHA = 0.2  # EWMA weight of the newest slot hold time
+
+ACTIVE = Gauge("admission_active", "Streams holding an admission slot", ("agent",))
+QUEUED = Gauge("admission_queued", "Requests waiting for an admission slot", ("agent",))
+REJECTED = Counter("admission_rejected_total", "Requests turned away with a 429 because the queue was full",
+                   ("agent",))
+QUEUE_WAIT = Histogram("admission_wait_seconds", "Time spent waiting for an admission slot", ("agent",),
+                       buckets=LATENCY_BUCKETS)
+
+
+class Overloaded(RuntimeError):
+    """An agent's slots and wait queue are both full."""
+
+    def __init__(self, agent: str, retry_after: int):
+        super().__init__(f"{agent} is at capacity; retry in {retry_after}s")
+        self.agent = agent
+        self.retry_after = retry_after
+
+    def response(self) -> JSONResponse:
+        return JSONResponse({"detail": str(self)}, status_code=429,
+                            headers={"Retry-After": str(self.retry_after)})
+
+
+class _Claim:
+    """A granted slot or a place in the queue; ``async with`` waits for the slot and releases it."""
+
+    def __init__(self, limiter: "AgentLimiter", waiter: Optional[asyncio.Future]):
+        self.limiter = limiter
+        self.waiter = waiter
+        self.acquired_at: Optional[float] = None
+        self.closed = False
+
+    async def __aenter__(self):
+        if self.waiter is not None:
+            start = time.monotonic()
+            try:
+                await self.waiter
+            except asyncio.CancelledError:
+                self.close()
+                raise
+            QUEUE_WAIT.observe(time.monotonic() - start, agent=self.limiter.agent)
+        self.acquired_at = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def transfer(self) -> "_Claim":
+        """Hand the acquired slot over to a new claim, to be released by whoever holds that one.
+
+        This claim is closed without releasing anything.
+        """
+        other = _Claim(self.limiter, None)
+        other.acquired_at, self.closed = self.acquired_at, True
+        return other
+
+    def close(self):
+        """Give back the slot or the place in the queue; later calls do nothing."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.acquired_at is not None:
+            self.limiter._release(time.monotonic() - self.acquired_at)
+        elif self.waiter is None:
+            self.limiter._release(None)
+        else:
+            self.limiter._abandon(self.waiter)
+
+
+class AgentLimiter:
+    def __init__(self, agent: str, max_concurrent: int, max_queued: int):
+        self.agent = agent
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.active = 0
+        self.hold = 5.0  # EWMA seconds a stream keeps its slot
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.hold * (len(self._waiters) + 1) / self.max_concurrent))
+
+    def claim(self, always_queue: bool = False) -> _Claim:
+        """Take a slot or a place in the queue now, or raise ``Overloaded`` (never with ``always_queue``)."""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            ACTIVE.set(self.active, agent=self.agent)
+            return _Claim(self, None)
+        if len(self._waiters) >= self.max_queued and not always_queue:
+            REJECTED.inc(agent=self.agent)
+            raise Overloaded(self.agent, self.retry_after())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        QUEUED.set(len(self._waiters), agent=self.agent)
+        return _Claim(self, waiter)
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            self._release(None)  # the slot was handed over just as the request went away
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        QUEUED.set(len(self._waiters), agent=self.agent)
+
+    def _release(self, held: Optional[float]):
+        if held is not None:
+            self.hold = ALPHA * held + (1 - ALPHA) * self.hold
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # hand the slot straight to the next in line
+                QUEUED.set(len(self._waiters), agent=self.agent)
+                return
+        self.active -= 1
+        ACTIVE.set(self.active, agent=self.agent)
+        QUEUED.set(0, agent=self.agent)
+
+
+_limiters: Dict[str, AgentLimiter] = {}
+
+
+def limiter_for(agent: str) -> Optional[AgentLimiter]:
+    """The admission limiter for ``agent`` (``None`` when admission control is off)."""
+    if not ENABLED:
+        return None
+    limiter = _limiters.get(agent)
+    if limiter is None:
+        try:
+            spec = get_spec(agent)
+        except KeyError:
+            spec = AgentSpec(agent, "", "", "", 0)  # e.g. the pipeline: the defaults
+        prefix = agent.upper()
+        limiter = _limiters[agent] = AgentLimiter(
+            agent,
+            int(os.getenv(f"{prefix}_MAX_CONCURRENT", spec.max_concurrent)),
+            int(os.getenv(f"{prefix}_MAX_QUEUED", spec.max_queued)),
+        )
+    return limiter
@@ -0,0 +1,111 @@
+"""Batch generation for offline catalogs: many prompts in, NDJSON results out.
+
+``POST /brainstorm/batch`` and ``POST /roadmap/batch`` take a list of items
+and run them with at most ``concurrency`` in flight, answering one NDJSON line
+per item in *completion* order, each tagged with its input index:
+
+    {"index": 3, "status": "ok", "text": "1. ...", "seconds": 1.84}
+    {"index": 0, "status": "error", "error": "...", "seconds": 10.02}
+    {"type": "done", "items": 2, "ok": 1, "failed": 1}
+
+A failing item is reported and the batch carries on. Items are generated in
+the batch provider-quota lane (see ``ratelimit``), so a nightly batch only
+uses quota that interactive requests leave. An item waits for that quota for
+up to ``PROVIDER_QUOTA_BATCH_MAX_WAIT`` rather than the interactive limit, and
+is then held to its agent's generation budget, timed from its first chunk.
+
+Configuration (environment):
+    BATCH_MAX_ITEMS         items accepted per request (default 1000)
+    BATCH_MAX_CONCURRENCY   upper bound on a request's ``concurrency`` (default 16)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, List, Optional, Type
+
+from pydantic import BaseModel, Field
+
+from .budgets import Budgeted
+from .metrics import Counter
+from .parsers import LineParser
+from .ratelimit import BATCH_PRIORITY, priority_lane
+from .responses import DisconnectAwareResponse, observed
+
+MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+BATCH_ITEMS = Counter("batch_items_total", "Batch items generated, by outcome", ("agent", "status"))
+
+
+class BatchItem(BaseModel):
+    prompt: str
+    persona: Optional[str] = None  # e.g. "student"; sent to the agent as a [PERSONA: ...] tag
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(min_length=1, max_length=MAX_ITEMS)
+    concurrency: int = Field(default=4, ge=1)
+    structured: bool = False  # also return each item's parsed events
+
+
+async def _run_item(agent: str, index: int, item: BatchItem,
+                    generate: Callable[[BatchItem], AsyncIterator[str]], parser: Optional[LineParser]) -> dict:
+    start = time.perf_counter()
+    try:
+        budgeted = Budgeted(agent, generate(item), marker=False, from_first_chunk=True)  # paced, not generating
+        text = "".join([content async for content in budgeted])
+        result = {"index": index, "status": "ok", "text": text}
+        if budgeted.exhausted:
+            result["truncated"] = budgeted.exhausted
+        if parser is not None:
+            result["events"] = parser.feed(text) + parser.close()
+    except Exception as e:
+        result = {"index": index, "status": "error", "error": str(e) or type(e).__name__}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    BATCH_ITEMS.inc(agent=agent, status=result["status"])
+    return result
+
+
+async def batch_results(agent: str, request: BatchRequest,
+                        generate: Callable[[BatchItem], AsyncIterator[str]],
+                        parser: Optional[Type[LineParser]] = None) -> AsyncIterator[dict]:
+    """Yield one result per item as each finishes, then a ``done`` summary."""
+    queue: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(request.items))
+
+    async def worker():
+        with priority_lane(BATCH_PRIORITY):
+            for index, item in pending:  # the workers share one iterator, so each item runs once
+                await queue.put(await _run_item(agent, index, item, generate,
+                                                parser() if parser and request.structured else None))
+
+    concurrency = min(request.concurrency, MAX_CONCURRENCY, len(request.items))
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    ok = 0
+    try:
+        for _ in request.items:
+            result = await queue.get()
+            ok += result["status"] == "ok"
+            yield result
+        yield {"type": "done", "items": len(request.items), "ok": ok, "failed": len(request.items) - ok}
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _ndjson(results: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for result in results:
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+def batch_response(agent: str, request: BatchRequest,
+                   generate: Callable[[BatchItem], AsyncIterator[str]],
+                   parser: Optional[Type[LineParser]] = None) -> DisconnectAwareResponse:
+    """Stream ``batch_results`` as NDJSON; a batch takes one of the agent's batch admission slots."""
+    return DisconnectAwareResponse(
+        observed(f"{agent}_batch", _ndjson(batch_results(agent, request, generate, parser))),
+        media_type="application/x-ndjson", agent=f"{agent}_batch")
@@ -0,0 +1,124 @@
+"""Per-agent generation budgets and the tokens saved by stopping streams early.
+
+Every response stream gets a wall-clock and a token budget (defaults on the
+agent's ``AgentSpec``, overridable as ``<AGENT>_BUDGET_SECONDS`` and
+``<AGENT>_BUDGET_TOKENS``, e.g. ``PITCHDECK_BUDGET_TOKENS=1200``). A stream that
+runs past either is ended cleanly: the upstream is closed and text responses
+end with ``TERMINAL_MARKER``, structured ones with ``"truncated"`` on their
+``done`` event. Tokens are estimated from characters, about four per token.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from .metrics import Counter
+from .registry import get_spec
+
+TERMINAL_MARKER = "\n\n[Generation stopped: {reason} budget reached]\n"
+CHARS_PER_TOKEN = 4
+
+BUDGET_EXHAUSTED = Counter("budget_exhausted_total", "Streams ended because they ran out of budget",
+                           ("agent", "budget"))
+TOKENS_SAVED = Counter("tokens_saved_total",
+                       "Estimated completion tokens not generated because an upstream stream was closed early",
+                       ("agent", "provider", "model"))
+
+
+@dataclass(frozen=True)
+class Budget:
+    seconds: Optional[float]
+    tokens: Optional[int]
+
+
+def budget_for(agent: str) -> Budget:
+    try:
+        spec = get_spec(agent)
+        seconds, tokens = spec.budget_seconds, spec.budget_tokens
+    except KeyError:
+        seconds, tokens = None, None
+    prefix = agent.upper()
+    seconds = float(os.getenv(f"{prefix}_BUDGET_SECONDS", seconds or 0)) or None
+    tokens = int(os.getenv(f"{prefix}_BUDGET_TOKENS", tokens or 0)) or None
+    return Budget(seconds, tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+class Budgeted:
+    """Iterate an agent's chunks until they end or the agent's budget is spent.
+
+    ``exhausted`` names the budget that ran out (``"time"`` or ``"tokens"``),
+    or stays ``None`` when the stream finished on its own. With
+    ``from_first_chunk`` the time budget starts with the first chunk instead of
+    at once, for work that may wait a long time for provider quota first.
+    """
+
+    def __init__(self, agent: str, chunks: AsyncIterator[str], marker: bool = True,
+                 from_first_chunk: bool = False):
+        self.agent = agent
+        self.budget = budget_for(agent)
+        self.chunks = chunks
+        self.marker = marker
+        self.from_first_chunk = from_first_chunk
+        self.exhausted: Optional[str] = None
+
+    def _exhaust(self, reason: str):
+        self.exhausted = reason
+        BUDGET_EXHAUSTED.inc(agent=self.agent, budget=reason)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        chars = 0
+        chunks = self.chunks.__aiter__()
+        waiting: Optional[asyncio.Task] = None  # the task awaiting the next chunk, if any
+        expired = False
+
+        def expire():
+            # One timer for the whole stream: cancel the wait for a chunk if there is one,
+            # otherwise the next round of the loop sees ``expired``
+            nonlocal expired
+            expired = True
+            if waiting is not None:
+                waiting.cancel()
+
+        watchdog = None
+        if self.budget.seconds and not self.from_first_chunk:
+            watchdog = loop.call_later(self.budget.seconds, expire)
+        try:
+            while True:
+                if expired:
+                    self._exhaust("time")
+                    break
+                waiting = asyncio.current_task()
+                try:
+                    content = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    uncancel = getattr(waiting, "uncancel", None)  # Python 3.11+
+                    if not expired or (uncancel is not None and uncancel() > 0):
+                        raise  # cancelled by someone else
+                    self._exhaust("time")
+                    break
+                finally:
+                    waiting = None
+                if watchdog is None and self.budget.seconds:
+                    watchdog = loop.call_later(self.budget.seconds, expire)
+                chars += len(content)
+                yield content
+                if self.budget.tokens and chars > self.budget.tokens * CHARS_PER_TOKEN:
+                    self._exhaust("tokens")
+                    break
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            close = getattr(chunks, "aclose", None)
+            if close is not None:
+                await close()
+        if self.marker:
+            yield TERMINAL_MARKER.format(reason=self.exhausted)
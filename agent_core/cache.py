@@ -0,0 +1,184 @@
+"""Content-addressed response cache with streaming replay.
+
+A completed generation is stored under ``ChatRequest.fingerprint()`` (agent,
+model, system prompt, prompt and sampling params) in two tiers: an in-memory
+LRU and a SQLite file with a TTL and a total-size cap, evicting least recently
+used entries first. A hit is replayed through the caller's normal streaming
+path, either at once or paced at ``RESPONSE_CACHE_REPLAY_CPS`` characters per
+second. Only generations that finished cleanly are stored.
+
+Configuration (environment):
+    RESPONSE_CACHE             "0" disables caching entirely (default "1")
+    RESPONSE_CACHE_MEMORY_ITEMS  in-memory LRU entries (default 512)
+    RESPONSE_CACHE_PATH        SQLite file; empty disables the disk tier
+    RESPONSE_CACHE_TTL         seconds an entry stays valid (default 86400)
+    RESPONSE_CACHE_MAX_MB      disk tier size cap (default 256)
+    RESPONSE_CACHE_REPLAY_CPS  replay pacing, 0 = instant (default 0)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Optional
+
+from .chat import ChatRequest
+from .metrics import Counter
+from .tracing import current_span
+
+CACHE_HITS = Counter("response_cache_hits_total", "Generations served from the response cache",
+                     ("agent", "tier"))
+CACHE_MISSES = Counter("response_cache_misses_total", "Cacheable generations not found in the cache",
+                       ("agent",))
+CACHE_STORES = Counter("response_cache_stores_total", "Completed generations written to the cache",
+                       ("agent",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+
+class ResponseCache:
+    def __init__(self, memory_items: int = 512, path: Optional[str] = None,
+                 ttl: float = 86400.0, max_bytes: int = 256 * 1024 * 1024):
+        self.memory_items = memory_items
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    # -- disk tier (runs in a worker thread) ---------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT text, expires FROM responses WHERE key = ? AND expires > ?",
+                             (key, now)).fetchone()
+            if row is not None:
+                db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                db.commit()
+            return row
+
+    def _disk_put(self, key: str, text: str, now: float):
+        size = len(text.encode("utf-8"))
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                       (key, text, size, now + self.ttl, now))
+            db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            while total > self.max_bytes:
+                victims = db.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 64").fetchall()
+                if not victims:
+                    break
+                db.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k, _ in victims])
+                total -= sum(s for _, s in victims)
+            db.commit()
+
+    # -- public API -----------------------------------------------------------
+
+    def _remember(self, key: str, text: str, expires: float):
+        self._memory[key] = (text, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str, agent: str = "") -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._memory.move_to_end(key)
+                CACHE_HITS.inc(agent=agent, tier="memory")
+                return entry[0]
+            del self._memory[key]
+        if self.path:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                CACHE_HITS.inc(agent=agent, tier="disk")
+                return row[0]
+        return None
+
+    async def put(self, key: str, text: str, agent: str = ""):
+        now = time.time()
+        self._remember(key, text, now + self.ttl)
+        if self.path:
+            await asyncio.to_thread(self._disk_put, key, text, now)
+        CACHE_STORES.inc(agent=agent)
+
+
+async def replay(text: str, chars_per_second: float = 0.0, chunk_chars: int = 24) -> AsyncIterator[str]:
+    """Stream a cached generation back, instantly or at a steady pace."""
+    if chars_per_second <= 0:
+        yield text
+        return
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars]
+        await asyncio.sleep(chunk_chars / chars_per_second)
+
+
+def _from_env() -> Optional[ResponseCache]:
+    if os.getenv("RESPONSE_CACHE", "1") == "0":
+        return None
+    return ResponseCache(
+        memory_items=int(os.getenv("RESPONSE_CACHE_MEMORY_ITEMS", "512")),
+        path=os.getenv("RESPONSE_CACHE_PATH",
+                       os.path.join(tempfile.gettempdir(), "cognitive-canvas", "responses.sqlite3")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+        max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    )
+
+
+response_cache = _from_env()
+REPLAY_CPS = float(os.getenv("RESPONSE_CACHE_REPLAY_CPS", "0"))
+
+
+async def cached(chat: ChatRequest, source: Callable[[ChatRequest], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Serve ``chat`` from the cache, or stream it from ``source`` and store the result."""
+    if response_cache is None or not chat.cache:
+        async for content in source(chat):
+            yield content
+        return
+
+    key = chat.fingerprint()
+    text = await response_cache.get(key, chat.agent)
+    if text is not None:
+        parent = current_span()
+        if parent is not None:
+            parent.attributes.setdefault("provider", "cache")
+        async for content in replay(text, REPLAY_CPS):
+            yield content
+        return
+
+    CACHE_MISSES.inc(agent=chat.agent)
+    parts = []
+    async for content in source(chat):
+        parts.append(content)
+        yield content
+    # Only reached when the upstream finished cleanly and the consumer read it all
+    if parts:
+        await response_cache.put(key, "".join(parts), chat.agent)
@@ -0,0 +1,45 @@
+"""The provider-agnostic description of one chat completion."""
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ChatRequest:
+    """One system+user chat completion, as every agent issues it.
+
+    ``stable_prompt`` is what caches key on when ``prompt`` carries deliberate
+    per-request noise (the brainstormer's session seeds); ``cache`` lets an
+    agent opt a request out of response caching and in-flight coalescing.
+    ``fallbacks`` are alternative ``(provider, model)`` routes the router may
+    fail over or hedge to; the fingerprint deliberately ignores them.
+    """
+
+    agent: str
+    model: str
+    system_prompt: str
+    prompt: str
+    provider: str = "openrouter"
+    params: Dict[str, Any] = field(default_factory=dict)
+    stable_prompt: Optional[str] = None
+    cache: bool = True
+    fallbacks: Tuple[Tuple[str, str], ...] = ()
+
+    def messages(self) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": self.prompt},
+        ]
+
+    def fingerprint(self) -> str:
+        """Content hash of everything that determines the output."""
+        material = json.dumps(
+            [self.agent, self.model, self.system_prompt,
+             self.prompt if self.stable_prompt is None else self.stable_prompt,
+             self.params],
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
@@ -0,0 +1,146 @@
+"""Coalescing of provider fragments into fewer, larger response chunks.
+
+Providers stream one delta per token or two, and sending each as its own HTTP
+chunk costs a write syscall and a proxy write at the gateway for a few bytes.
+``coalesce`` sends the first fragment straight away (TTFT is unchanged), then
+holds fragments back until ``flush_bytes`` have collected or ``flush_ms`` have
+passed since the oldest unsent one, whichever comes first.
+
+The thresholds are per agent (``AgentSpec.flush_bytes`` / ``flush_ms``: tight
+for the brainstormer's short lines, looser for the pitch deck) and can be
+overridden as ``<AGENT>_FLUSH_BYTES`` / ``<AGENT>_FLUSH_MS``; ``COALESCE=0``
+turns coalescing off.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+from .registry import AgentSpec, get_spec
+
+ENABLED = os.getenv("COALESCE", "1") != "0"
+
+
+def thresholds(agent: str) -> Tuple[int, float]:
+    """``(flush_bytes, flush_seconds)`` for ``agent``."""
+    try:
+        spec = get_spec(agent)
+    except KeyError:
+        spec = AgentSpec(agent, "", "", "", 0)
+    prefix = agent.upper()
+    flush_bytes = int(os.getenv(f"{prefix}_FLUSH_BYTES", spec.flush_bytes))
+    flush_ms = float(os.getenv(f"{prefix}_FLUSH_MS", spec.flush_ms))
+    return flush_bytes, flush_ms / 1000
+
+
+class Pump:
+    """Iterate ``chunks`` to the end in a task of its own, buffering what it yields.
+
+    Readers can then wait for the next chunk with a deadline, or race several
+    iterators, without running any step of ``chunks`` in a task of their own:
+    every step, and its ``finally`` blocks, run in the pump's task, so context
+    variables set inside ``chunks`` (the current trace span) are reset in the
+    context that set them.
+    """
+
+    def __init__(self, chunks: AsyncIterator[str]):
+        self._buffer: Deque[str] = deque()
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._changed = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run(chunks))
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _run(self, chunks: AsyncIterator[str]):
+        try:
+            async for content in chunks:
+                self._buffer.append(content)
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+            close = getattr(chunks, "aclose", None)
+            if close is not None:
+                await close()
+
+    async def get(self, deadline: Optional[float] = None) -> Optional[str]:
+        """The next chunk, or ``None`` once ``deadline`` (loop time) has passed without one.
+
+        Raises ``StopAsyncIteration`` at the end, or what ``chunks`` raised.
+        """
+        loop = asyncio.get_running_loop()
+        while not self._buffer:
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            if deadline is not None and loop.time() >= deadline:
+                return None
+            changed = self._changed
+            timer = loop.call_at(deadline, self._notify) if deadline is not None else None
+            try:
+                await changed.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+        return self._buffer.popleft()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            try:
+                content = await self.get()
+            except StopAsyncIteration:
+                return
+            yield content
+
+    async def aclose(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def coalesce(agent: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Re-chunk ``chunks`` by ``agent``'s flush thresholds."""
+    if not ENABLED:
+        async for content in chunks:
+            yield content
+        return
+    flush_bytes, flush_after = thresholds(agent)
+    loop = asyncio.get_running_loop()
+    source = Pump(chunks)
+    pending: List[str] = []
+    size = 0
+    deadline = 0.0
+    first = True
+    try:
+        while True:
+            try:
+                content = await source.get(deadline if pending else None)
+            except StopAsyncIteration:
+                if pending:
+                    yield "".join(pending)
+                return
+            if content is None:
+                # The oldest held-back fragment has waited long enough
+                yield "".join(pending)
+                pending, size = [], 0
+                continue
+            if first:
+                first = False
+                yield content
+                continue
+            if not pending:
+                deadline = loop.time() + flush_after
+            pending.append(content)
+            size += len(content)
+            if size >= flush_bytes:
+                yield "".join(pending)
+                pending, size = [], 0
+    finally:
+        await source.aclose()
@@ -0,0 +1,143 @@
+"""Token counting and deterministic compaction of upstream agent output used as context.
+
+The pitch deck is prompted with everything the canvas produced before it
+(ideas, roadmap phases, critiques), so its input and with it its TTFT grow
+with every upstream generation. ``fit_context`` measures that context and,
+when it is over budget, rewrites it in progressively tighter passes until it
+fits:
+
+1. roadmap phases keep their title and the sentences carrying a metric
+   (numbers, %, $, targets); critiques keep their top two strengths and
+   challenges and the full recommendation;
+2. one strength and one challenge, one metric per phase, and free-text lines
+   cut to their first sentence;
+3. whole lines are dropped from the end, keeping the closing instruction line.
+
+The same input always compacts to the same output, so compacted prompts
+still hit the response cache.
+
+Tokens are counted with ``tiktoken`` (``cl100k_base``, close to the Llama 3
+vocabulary) when it is installed, and otherwise estimated from a word and
+punctuation split that tracks it within a few percent on English text.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable, List
+
+from .parsers import CritiqueParser, PhaseParser, _clean
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to the estimate below
+    tiktoken = None
+
+
+def _load_encoder() -> Callable[[str], int]:
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass  # no cached vocabulary and no network to fetch it
+    return _estimate
+
+
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def _estimate(text: str) -> int:
+    # Common words are one token, long ones roughly one per six letters; digits go in threes
+    return sum(1 + (len(piece) - 1) // 6 if piece[0].isalpha() else 1 for piece in _PIECES.findall(text))
+
+
+count_tokens: Callable[[str], int] = _load_encoder()
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_NUMBER = re.compile(r"\d|%|\$")
+_METRIC = re.compile(r"\b(?:metrics?|targets?|kpis?|users?|revenue|retention|nps|conversion)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class FittedContext:
+    text: str
+    tokens_before: int
+    tokens_after: int
+    level: int  # 0 when the context fitted as it was, else the compaction pass that made it fit
+
+    @property
+    def compacted(self) -> bool:
+        return self.level > 0
+
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE.split(text.strip()) if s]
+
+
+def _metrics(description: str, level: int) -> List[str]:
+    sentences = _sentences(description)
+    if level == 1:
+        return [s for s in sentences if _NUMBER.search(s) or _METRIC.search(s)]
+    numbers = [s for s in sentences if _NUMBER.search(s)]
+    return (numbers or [s for s in sentences if _METRIC.search(s)])[:1]
+
+
+def _compact_lines(text: str, level: int) -> List[str]:
+    keep_points = 2 if level == 1 else 1
+    lines: List[str] = []
+    section = None
+    kept = 0
+    for raw in text.splitlines():
+        line = _clean(raw)
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        phase = PhaseParser.PHASE.match(line)
+        if phase:
+            title, _, description = phase.group(2).partition("::")
+            metrics = _metrics(description, level)
+            lines.append(f"Phase {phase.group(1)}: {title.strip()}"
+                         + (f" :: {' '.join(metrics)}" if metrics else ""))
+            section = None
+            continue
+        if CritiqueParser.HEADER.match(line):
+            lines.append(raw.strip())
+            section = None
+            continue
+        heading = CritiqueParser.SECTION.match(line)
+        if heading:
+            section, kept = heading.group(1).lower(), 0
+            lines.append(raw.strip())
+            continue
+        if section in ("strengths", "challenges") and CritiqueParser.BULLET.match(raw.strip()):
+            kept += 1
+            if kept <= keep_points:
+                lines.append(raw.strip())
+            continue
+        if section == "recommendation":
+            lines.append(raw.strip())
+            continue
+        section = None
+        lines.append(raw.strip() if level == 1 else (_sentences(raw)[:1] or [""])[0])
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def fit_context(text: str, budget: int) -> FittedContext:
+    """Return ``text`` unchanged if it is within ``budget`` tokens, else its tightest needed compaction."""
+    before = count_tokens(text)
+    if before <= budget:
+        return FittedContext(text, before, before, 0)
+    for level in (1, 2):
+        compacted = "\n".join(_compact_lines(text, level))
+        tokens = count_tokens(compacted)
+        if tokens <= budget:
+            return FittedContext(compacted, before, tokens, level)
+    lines = _compact_lines(text, 2)
+    while len(lines) > 2 and count_tokens("\n".join(lines)) > budget:
+        del lines[-2]
+    compacted = "\n".join(lines)
+    return FittedContext(compacted, before, count_tokens(compacted), 3)
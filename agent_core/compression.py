@@ -0,0 +1,94 @@
+"""Optional streaming gzip / brotli compression of agent response streams.
+
+Unlike a buffering compressor, every body chunk is compressed and flushed on
+its own, so compressed streams reach the client as promptly as plain ones.
+Only the streaming media types (text, NDJSON, SSE) are compressed, and only
+for clients that accept the encoding.
+
+    STREAM_COMPRESSION   comma-separated encodings to offer, in order of
+                         preference: "br", "gzip" (default: off). "br" needs
+                         the ``brotli`` package and is skipped without it.
+"""
+from __future__ import annotations
+
+import os
+import zlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+STREAMING_TYPES = ("text/plain", "application/x-ndjson", "text/event-stream")
+
+
+def _configured() -> Tuple[str, ...]:
+    names = [name.strip() for name in os.getenv("STREAM_COMPRESSION", "").split(",") if name.strip()]
+    return tuple(name for name in names if name == "gzip" or (name == "br" and brotli is not None))
+
+
+ENCODINGS = _configured()
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._b = brotli.Compressor(quality=4)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._b.process(data) + self._b.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._b.process(data) + self._b.finish()
+
+
+def _negotiate(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    return next((name for name in ENCODINGS if name in accepted), None)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing streaming responses chunk by chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        encoding = _negotiate(Headers(scope=scope).get("accept-encoding", "")) if (
+            ENCODINGS and scope["type"] == "http") else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal compressor
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                if media_type in STREAMING_TYPES and "content-encoding" not in headers:
+                    compressor = _Brotli() if encoding == "br" else _Gzip()
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+            elif message["type"] == "http.response.body" and compressor is not None:
+                body = message.get("body", b"")
+                more = message.get("more_body", False)
+                message = dict(message, body=compressor.chunk(body) if more else compressor.finish(body))
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
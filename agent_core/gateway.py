@@ -0,0 +1,378 @@
+"""Replica-aware gateway: N processes per agent behind one port.
+
+The agent host runs every agent once per worker, so a hot agent can only be
+scaled by scaling all of them. The gateway instead starts ``replicas``
+uvicorn processes per agent (``AgentSpec.replicas``, overridable as
+``<AGENT>_REPLICAS``, e.g. ``BRAINSTORMER_REPLICAS=4``) and proxies each
+agent's paths to its own pool:
+
+    python -m agent_core.gateway        # GATEWAY_PORT, GATEWAY_BASE_PORT, ...
+
+* Every request goes to the healthy replica with the fewest outstanding
+  streams (ties to the one least recently given a request), not round-robin:
+  a replica busy with three long pitch decks is passed over for one that is
+  idle.
+* Response bytes are forwarded as soon as they arrive, chunk by chunk, with no
+  buffering; a client that disconnects closes the upstream stream at once.
+* Replicas are health-checked through the agents' ``GET /ready`` every
+  ``GATEWAY_HEALTH_INTERVAL`` seconds, so a replica only gets traffic once its
+  provider connections are warm (see ``warmup``). One failing the check, or
+  ``GATEWAY_MAX_FAILS`` requests in a row, is taken out of rotation until it
+  passes again, and a replica whose process exited is restarted. A request
+  that cannot reach its replica is retried on another one.
+
+Paths: each agent's public endpoint and ``<endpoint>/batch``, and its own
+prefix (``/brainstormer/generate``, ...). ``/streams/{id}`` (SSE resume) goes
+to the replica that opened the stream. ``/nodes`` and ``/sessions`` go to any
+replica: the gateway points every replica at one SQLite session store (see
+``sessions``) unless ``SESSION_STORE_PATH`` is already set. ``/pipeline`` and
+``/jobs`` need every agent in one process, so they go to one agent host
+process (``agent_core.host``) the gateway runs alongside the replicas.
+``GET /live`` answers once the gateway serves, ``GET /ready`` 503 until every
+agent and the host have a healthy replica, and ``GET /metrics`` reports the
+gateway's own metrics.
+
+Configuration (environment):
+    GATEWAY_PORT             port the gateway listens on (default 8000)
+    GATEWAY_BIND             address it binds (default 0.0.0.0)
+    GATEWAY_BASE_PORT        first replica port; replicas take consecutive ports (default 8100)
+    GATEWAY_HEALTH_INTERVAL  seconds between health checks (default 2.0)
+    GATEWAY_MAX_FAILS        consecutive failed requests that take a replica out (default 3)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from . import metrics
+from .logs import start_logging, stop_logging
+from .registry import AGENTS, ROOT, AgentSpec
+
+BASE_PORT = int(os.getenv("GATEWAY_BASE_PORT", "8100"))
+HEALTH_INTERVAL = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "2.0"))
+MAX_FAILS = int(os.getenv("GATEWAY_MAX_FAILS", "3"))
+MAX_STREAMS = 10000  # stream ids remembered for /streams affinity
+
+# The cross-agent endpoints run in one agent host process: /pipeline is its route, /jobs its prefix
+HOST = AgentSpec("host", ".", "/pipeline", "/jobs", 8000)
+
+OUTSTANDING = metrics.Gauge("gateway_outstanding_streams", "Requests in flight per replica", ("agent", "replica"))
+REPLICA_UP = metrics.Gauge("gateway_replica_up", "1 while a replica is in rotation", ("agent", "replica"))
+GATEWAY_REQUESTS = metrics.Counter("gateway_requests_total", "Requests proxied, by replica and status class",
+                                   ("agent", "replica", "status"))
+EJECTIONS = metrics.Counter("gateway_ejections_total", "Times a replica was taken out of rotation",
+                            ("agent", "replica", "reason"))
+RETRIES = metrics.Counter("gateway_retries_total", "Requests retried on another replica", ("agent",))
+RESTARTS = metrics.Counter("gateway_replica_restarts_total", "Replica processes restarted after exiting",
+                           ("agent", "replica"))
+
+# Hop-by-hop headers are the proxy's own business, never forwarded
+_HOP_BY_HOP = {b"connection", b"keep-alive", b"proxy-connection", b"transfer-encoding", b"te", b"trailer",
+               b"upgrade", b"host", b"content-length"}
+
+logger = logging.getLogger("agent_core.gateway")
+
+
+class Replica:
+    def __init__(self, spec: AgentSpec, index: int, port: int, env: Dict[str, str]):
+        self.spec = spec
+        self.name = str(index)
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+        self.outstanding = 0
+        self.last_used = 0.0  # monotonic time it was last given a request, for tie breaks
+        self.healthy = False
+        self.failures = 0
+
+    def start(self):
+        app = ["agent_core.host:app"] if self.spec is HOST else ["main:app", "--app-dir", self.spec.directory]
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", *app,
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=self.env)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def _set_healthy(self, healthy: bool, reason: str = ""):
+        if self.healthy and not healthy:
+            EJECTIONS.inc(agent=self.spec.name, replica=self.name, reason=reason)
+            logger.warning("replica taken out of rotation", extra={"agent": self.spec.name, "replica": self.name,
+                                                                   "reason": reason})
+        self.healthy = healthy
+        REPLICA_UP.set(1 if healthy else 0, agent=self.spec.name, replica=self.name)
+
+    def acquire(self):
+        self.outstanding += 1
+        self.last_used = time.monotonic()
+        OUTSTANDING.set(self.outstanding, agent=self.spec.name, replica=self.name)
+
+    def release(self):
+        self.outstanding -= 1
+        OUTSTANDING.set(self.outstanding, agent=self.spec.name, replica=self.name)
+
+    def failed(self):
+        self.failures += 1
+        if self.failures >= MAX_FAILS:
+            self._set_healthy(False, "requests")
+
+    def succeeded(self):
+        self.failures = 0
+
+
+class Pool:
+    """The replicas of one agent."""
+
+    def __init__(self, spec: AgentSpec, replicas: List[Replica]):
+        self.spec = spec
+        self.replicas = replicas
+
+    def pick(self, exclude: Set[Replica] = frozenset()) -> Optional[Replica]:
+        """The healthy replica with the fewest outstanding requests, least recently used first, or ``None``."""
+        candidates = [r for r in self.replicas if r.healthy and r not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r.outstanding, r.last_used))
+
+
+async def _send_json(send, status: int, payload: dict, headers: Tuple[Tuple[bytes, bytes], ...] = ()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class Gateway:
+    """The ASGI app: lifespan starts and supervises the replicas, requests are proxied to them."""
+
+    def __init__(self, specs=AGENTS):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        # Node references must resolve whichever replica served the node
+        env.setdefault("SESSION_STORE_PATH", os.path.join(tempfile.gettempdir(), "cognitive-canvas", "nodes.sqlite3"))
+        self.pools: Dict[str, Pool] = {}
+        port = BASE_PORT
+        for spec in specs:
+            count = max(1, int(os.getenv(f"{spec.name.upper()}_REPLICAS", spec.replicas)))
+            self.pools[spec.name] = Pool(spec, [Replica(spec, i, port + i, env) for i in range(count)])
+            port += count
+        self.host = self.pools[HOST.name] = Pool(HOST, [Replica(HOST, 0, port, env)])  # jobs live in-process: one
+        self._streams: "OrderedDict[str, Replica]" = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._monitor: Optional[asyncio.Task] = None
+
+    # -- routing ----------------------------------------------------------------
+
+    def route(self, path: str) -> Tuple[Optional[Pool], str]:
+        """The pool serving ``path`` and the path to request from its replica."""
+        if path == HOST.route or path == HOST.prefix or path.startswith(HOST.prefix + "/"):
+            return self.host, path
+        for pool in self.pools.values():
+            spec = pool.spec
+            if path in (spec.route, f"{spec.route}/batch"):
+                return pool, path
+            if path.startswith(spec.prefix + "/"):
+                return pool, path[len(spec.prefix):]
+        if path.startswith(("/nodes/", "/sessions/")):
+            return min(self.pools.values(), key=lambda pool: min(r.outstanding for r in pool.replicas)), path
+        return None, path
+
+    # -- supervision --------------------------------------------------------------
+
+    async def _check(self, replica: Replica):
+        if replica.process is not None and replica.process.poll() is not None:
+            replica._set_healthy(False, "exited")
+            RESTARTS.inc(agent=replica.spec.name, replica=replica.name)
+            logger.warning("replica exited; restarting", extra={"agent": replica.spec.name, "replica": replica.name,
+                                                                "returncode": replica.process.returncode})
+            replica.start()
+            return
+        try:
+            response = await self._client.get(replica.url + "/ready", timeout=HEALTH_INTERVAL)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy:
+            replica.failures = 0
+        replica._set_healthy(healthy, "health_check")
+
+    async def _health_checks(self):
+        while True:
+            replicas = [r for pool in self.pools.values() for r in pool.replicas]
+            await asyncio.gather(*(self._check(r) for r in replicas))
+            await asyncio.sleep(HEALTH_INTERVAL if self.ready() else 0.2)  # poll booting replicas closely
+
+    def ready(self) -> bool:
+        return all(any(r.healthy for r in pool.replicas) for pool in self.pools.values())
+
+    async def _startup(self):
+        start_logging()
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None),
+                                         limits=httpx.Limits(max_connections=None, max_keepalive_connections=64))
+        for pool in self.pools.values():
+            for replica in pool.replicas:
+                replica.start()
+        self._monitor = asyncio.ensure_future(self._health_checks())
+
+    async def _shutdown(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+        replicas = [r for pool in self.pools.values() for r in pool.replicas]
+        await asyncio.gather(*(asyncio.to_thread(r.stop) for r in replicas))
+        await self._client.aclose()
+        await asyncio.to_thread(stop_logging)
+
+    # -- ASGI ---------------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await self._startup()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await self._shutdown()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        if path == "/":
+            return await _send_json(send, 200, {"status": "ok", "agent": "Gateway", "replicas": {
+                name: [r.healthy for r in pool.replicas] for name, pool in self.pools.items()}})
+        if path == "/live":
+            return await _send_json(send, 200, {"status": "live"})
+        if path == "/ready":
+            if not self.ready():
+                return await _send_json(send, 503, {"status": "starting"})
+            return await _send_json(send, 200, {"status": "ready"})
+        if path == "/metrics":
+            body = metrics.render().encode("utf-8")
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/plain; version=0.0.4")]})
+            return await send({"type": "http.response.body", "body": body})
+
+        pinned = None
+        if path.startswith("/streams/"):
+            pinned = self._streams.get(path[len("/streams/"):].split("/")[0])
+            if pinned is None:
+                return await _send_json(send, 404, {"detail": "stream expired; start a new generation"})
+            pool, upstream_path = self.pools[pinned.spec.name], path
+        else:
+            pool, upstream_path = self.route(path)
+            if pool is None:
+                return await _send_json(send, 404, {"detail": "Not Found"})
+
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        proxying = asyncio.ensure_future(self._proxy(scope, pool, pinned, upstream_path, body, send))
+        watcher = asyncio.ensure_future(_disconnected(receive))
+        try:
+            await asyncio.wait({proxying, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            finished = proxying.done()
+            for task in (proxying, watcher):
+                task.cancel()
+            await asyncio.gather(proxying, watcher, return_exceptions=True)
+        if finished and not proxying.cancelled():
+            proxying.result()  # re-raise what went wrong, if anything
+
+    async def _proxy(self, scope, pool: Pool, pinned: Optional[Replica], path: str, body: bytes, send):
+        agent = pool.spec.name
+        query = scope.get("query_string", b"")
+        url = path + ("?" + query.decode("latin-1") if query else "")
+        headers = [(k, v) for k, v in scope["headers"] if k.lower() not in _HOP_BY_HOP]
+        client = scope.get("client")
+        if client:
+            forwarded = dict(scope["headers"]).get(b"x-forwarded-for")
+            address = client[0].encode("latin-1")
+            headers.append((b"x-forwarded-for", forwarded + b", " + address if forwarded else address))
+        tried: Set[Replica] = set()
+        while True:
+            replica = pinned if pinned is not None else pool.pick(tried)
+            if replica is None:
+                return await _send_json(send, 503, {"detail": f"no healthy {agent} replica"},
+                                        ((b"retry-after", str(max(1, int(HEALTH_INTERVAL))).encode()),))
+            tried.add(replica)
+            replica.acquire()
+            try:
+                request = self._client.build_request(scope["method"], replica.url + url, headers=headers, content=body)
+                try:
+                    response = await self._client.send(request, stream=True)
+                except httpx.TransportError:
+                    replica.failed()
+                    GATEWAY_REQUESTS.inc(agent=agent, replica=replica.name, status="error")
+                    if pinned is not None:
+                        return await _send_json(send, 502, {"detail": f"{agent} replica unavailable"})
+                    RETRIES.inc(agent=agent)
+                    continue
+                try:
+                    stream_id = response.headers.get("x-stream-id")
+                    if stream_id and pinned is None:
+                        self._streams[stream_id] = replica
+                        while len(self._streams) > MAX_STREAMS:
+                            self._streams.popitem(last=False)
+                    await send({"type": "http.response.start", "status": response.status_code,
+                                "headers": [(k, v) for k, v in response.headers.raw if k.lower() not in _HOP_BY_HOP]})
+                    async for chunk in response.aiter_raw():
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    await send({"type": "http.response.body", "body": b""})
+                except httpx.TransportError:
+                    replica.failed()  # mid-stream: too late to retry, the client sees a cut-off response
+                    GATEWAY_REQUESTS.inc(agent=agent, replica=replica.name, status="error")
+                    raise
+                finally:
+                    await response.aclose()
+                replica.succeeded()
+                GATEWAY_REQUESTS.inc(agent=agent, replica=replica.name, status=f"{response.status_code // 100}xx")
+                return
+            finally:
+                replica.release()
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(
+        "agent_core.gateway:app",
+        host=os.getenv("GATEWAY_BIND", "0.0.0.0"),
+        port=int(os.getenv("GATEWAY_PORT", "8000")),
+        log_level=os.getenv("GATEWAY_LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
+else:
+    app = Gateway()
@@ -0,0 +1,93 @@
+"""One ASGI process serving all five agents.
+
+Replaces the five separate uvicorn processes: every agent app is imported
+once, mounted under both its public endpoint (``/brainstorm``, ``/criticize``,
+...), its batch endpoint (``/brainstorm/batch``, where the agent has one) and its
+own prefix (``/brainstormer/generate``, ``/critic/``, ...), and they
+all share this process's provider client pool. ``POST /pipeline`` (see
+``agent_core.pipeline``) chains the agents server-side, and ``/jobs`` (see
+``agent_core.jobs``) runs generations as durable background jobs.
+
+    python -m agent_core.host                      # AGENT_HOST_PORT, AGENT_HOST_WORKERS
+    uvicorn agent_core.host:app --workers 4
+
+``GET /ready`` answers 503 until every agent has started and the provider
+connections are warm (see ``agent_core.warmup``), so start-up scripts can wait
+on it instead of sleeping for a fixed time; ``GET /live`` answers as soon as
+the process serves.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from fastapi import FastAPI
+from starlette.routing import Mount, Route
+
+from . import jobs, pipeline
+from .logs import start_logging, stop_logging
+from .ops import router as ops_router, start_loop_monitor, stop_loop_monitor
+from .providers import close_clients
+from .registry import AGENTS, load_agent
+from .warmup import start_warmup, stop_warmup
+
+
+def create_app(specs=AGENTS) -> FastAPI:
+    agent_apps = {spec.name: load_agent(spec.name).app for spec in specs}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        start_logging()
+        start_loop_monitor()
+        start_warmup()
+        async with AsyncExitStack() as stack:
+            for agent_app in agent_apps.values():
+                await stack.enter_async_context(agent_app.router.lifespan_context(agent_app))
+            if jobs.job_queue is not None:
+                await jobs.job_queue.start()
+                stack.push_async_callback(jobs.job_queue.stop)
+            try:
+                yield
+            finally:
+                await stop_warmup()  # /ready turns 503 while the agents drain
+        await stop_loop_monitor()
+        await close_clients()
+        await asyncio.to_thread(stop_logging)
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(ops_router)
+    app.include_router(jobs.router)
+
+    @app.get("/")
+    def root():
+        return {"status": "ok", "agent": "Agent Host", "agents": [spec.name for spec in specs]}
+
+    # Exact public endpoints first, so /roadmap is not swallowed by the /roadmap mount
+    for spec in specs:
+        app.router.routes.append(Route(spec.route, agent_apps[spec.name]))
+        app.router.routes.append(Route(f"{spec.route}/batch", agent_apps[spec.name]))
+    app.router.routes.append(Route("/pipeline", pipeline.app))
+    for spec in specs:
+        app.router.routes.append(Mount(spec.prefix, agent_apps[spec.name]))
+    return app
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(
+        "agent_core.host:app",
+        host=os.getenv("AGENT_HOST_BIND", "0.0.0.0"),
+        port=int(os.getenv("AGENT_HOST_PORT", "8000")),
+        workers=int(os.getenv("AGENT_HOST_WORKERS", "1")),
+        log_level=os.getenv("AGENT_HOST_LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    # uvicorn imports agent_core.host:app itself (once per worker), so the
+    # supervising process never loads the agents.
+    main()
+else:
+    app = create_app()
@@ -0,0 +1,191 @@
+"""Persistent per-persona memory of brainstormed ideas with near-duplicate lookup.
+
+Each idea is reduced to a MinHash signature over its normalised words and
+indexed with locality-sensitive hashing (20 bands of 3 rows), so a lookup only
+compares against the few ideas that share a band bucket instead of every idea
+ever generated. Signatures are persisted in SQLite and loaded at startup.
+
+Configuration (environment):
+    IDEA_MEMORY            "0" disables the memory (default "1")
+    IDEA_MEMORY_PATH       SQLite file; empty keeps the memory in-process only
+    IDEA_MEMORY_THRESHOLD  estimated Jaccard similarity that counts as a repeat (default 0.5)
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .metrics import Counter, Gauge
+
+BANDS = 20
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x1DEA)  # fixed, so persisted signatures stay comparable
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and app apps as at based by for from in into of on or platform the to tool "
+    "using via with your".split())
+
+IDEAS_REMEMBERED = Gauge("idea_memory_ideas", "Ideas held in the idea memory", ("persona",))
+IDEA_DUPLICATES = Counter("idea_memory_duplicates_total",
+                          "Streamed ideas rejected as near-duplicates of earlier ones", ("persona",))
+
+
+def _shingles(text: str) -> List[int]:
+    words = set()
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        words.add(word)
+    return [int.from_bytes(hashlib.blake2b(w.encode(), digest_size=8).digest(), "little") for w in words]
+
+
+def signature(text: str) -> Optional[array]:
+    hashes = _shingles(text)
+    if not hashes:
+        return None
+    return array("Q", (min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS))
+
+
+def similarity(left: array, right: array) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+def _bands(sig: array):
+    for band in range(BANDS):
+        yield band, hash(tuple(sig[band * ROWS:(band + 1) * ROWS]))
+
+
+class _PersonaIndex:
+    def __init__(self, recent: int):
+        self.signatures: Dict[int, array] = {}
+        self.texts: Dict[int, str] = {}
+        self.buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.recent: Deque[str] = deque(maxlen=recent)
+
+    def add(self, idea_id: int, text: str, sig: array):
+        self.signatures[idea_id] = sig
+        self.texts[idea_id] = text
+        for key in _bands(sig):
+            self.buckets[key].append(idea_id)
+        self.recent.append(text)
+
+    def nearest(self, sig: array, threshold: float) -> Optional[Tuple[str, float]]:
+        best, seen = None, set()
+        for key in _bands(sig):
+            for idea_id in self.buckets.get(key, ()):
+                if idea_id in seen:
+                    continue
+                seen.add(idea_id)
+                score = similarity(sig, self.signatures[idea_id])
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (self.texts[idea_id], score)
+        return best
+
+
+class IdeaMemory:
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.5, recent: int = 50):
+        self.path = path
+        self.threshold = threshold
+        self._recent = recent
+        self._personas: Dict[str, _PersonaIndex] = {}
+        self._next_id = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _persona(self, persona: Optional[str]) -> _PersonaIndex:
+        name = persona or "default"
+        index = self._personas.get(name)
+        if index is None:
+            index = self._personas[name] = _PersonaIndex(self._recent)
+        return index
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS ideas (id INTEGER PRIMARY KEY, persona TEXT NOT NULL,"
+                       " text TEXT NOT NULL, signature BLOB NOT NULL, created REAL NOT NULL)")
+            self._db = db
+        return self._db
+
+    def _read_all(self):
+        with self._db_lock:
+            return self._connect().execute("SELECT id, persona, text, signature FROM ideas ORDER BY id").fetchall()
+
+    def _write(self, persona: str, text: str, sig: array):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT INTO ideas (persona, text, signature, created) VALUES (?, ?, ?, ?)",
+                       (persona, text, sig.tobytes(), time.time()))
+            db.commit()
+
+    async def load(self):
+        """Read every persisted signature into the in-memory LSH index (once)."""
+        async with self._load_lock:
+            if self._loaded:
+                return
+            rows = await asyncio.to_thread(self._read_all) if self.path else []
+            for idea_id, persona, text, blob in rows:
+                sig = array("Q")
+                sig.frombytes(blob)
+                self._persona(persona).add(idea_id, text, sig)
+                self._next_id = max(self._next_id, idea_id + 1)
+            for name, index in self._personas.items():
+                IDEAS_REMEMBERED.set(len(index.signatures), persona=name)
+            self._loaded = True
+
+    def find_similar(self, persona: Optional[str], text: str) -> Optional[Tuple[str, float]]:
+        """The closest remembered idea at or above the threshold, with its similarity."""
+        sig = signature(text)
+        if sig is None:
+            return None
+        return self._persona(persona).nearest(sig, self.threshold)
+
+    async def remember(self, persona: Optional[str], text: str):
+        sig = signature(text)
+        if sig is None:
+            return
+        name = persona or "default"
+        index = self._persona(name)
+        index.add(self._next_id, text, sig)
+        self._next_id += 1
+        IDEAS_REMEMBERED.set(len(index.signatures), persona=name)
+        if self.path:
+            await asyncio.to_thread(self._write, name, text, sig)
+
+    def recent(self, persona: Optional[str], limit: int = 12) -> List[str]:
+        """The most recently remembered ideas for ``persona``, newest first."""
+        return list(reversed(self._persona(persona).recent))[:limit]
+
+
+def _from_env() -> Optional[IdeaMemory]:
+    if os.getenv("IDEA_MEMORY", "1") == "0":
+        return None
+    return IdeaMemory(
+        path=os.getenv("IDEA_MEMORY_PATH",
+                       os.path.join(tempfile.gettempdir(), "cognitive-canvas", "ideas.sqlite3")),
+        threshold=float(os.getenv("IDEA_MEMORY_THRESHOLD", "0.5")),
+    )
+
+
+idea_memory = _from_env()
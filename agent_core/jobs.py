@@ -0,0 +1,376 @@
+"""Durable generation jobs: submit now, fetch or stream the result later.
+
+A long generation (a pitch deck above all) no longer lives and dies with one
+HTTP stream. ``POST /jobs`` with ``{"agent": "pitchdeck", "prompt": "..."}``
+records a job in a local SQLite store and answers its id straight away; a pool
+of workers per agent runs it, retrying failures with exponential backoff, and
+keeps the finished output, so fetching it again costs no tokens:
+
+    GET /jobs/{id}          status, attempts and (once done) the output
+    GET /jobs/{id}/stream   the output as text: live while the job runs in this
+                            process, replayed from the store once it is done
+
+Submitting the same agent and prompt (or the same ``key``) again while the
+earlier job is queued, running or done returns the earlier job instead of
+generating twice. The agent-and-prompt default only applies to agents whose
+requests are cacheable: a brainstorm is random on purpose, so brainstorm jobs
+are only deduplicated by an explicit ``key``. A job whose worker died (its heartbeat went stale) is picked
+up again by the next free worker, so jobs survive restarts, and several host
+processes can share one store.
+
+Configuration (environment):
+    JOBS                    "0" disables the job API and workers (default "1")
+    JOBS_PATH               SQLite file (default <tmp>/cognitive-canvas/jobs.sqlite3)
+    JOBS_MAX_ATTEMPTS       attempts before a job fails for good (default 3)
+    JOBS_RETENTION          seconds finished jobs are kept (default 7 days)
+    <AGENT>_JOB_CONCURRENCY workers per agent, e.g. PITCHDECK_JOB_CONCURRENCY (default 2)
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from .budgets import Budgeted
+from .cache import replay
+from .metrics import Counter
+from .registry import AGENTS, get_spec, load_agent
+from .responses import DisconnectAwareResponse
+from .streaming import stream_chat
+from .tracing import span
+
+ENABLED = os.getenv("JOBS", "1") != "0"
+MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+RETENTION = float(os.getenv("JOBS_RETENTION", str(7 * 86400)))
+RETRY_BACKOFF = 2.0  # seconds before the first retry, doubled for each one after
+POLL_INTERVAL = 1.0  # how often idle workers and followers look for work done by other processes
+HEARTBEAT = 10.0  # a running job's heartbeat period ...
+STALE = 60.0  # ... and how old it may get before the job is taken as abandoned
+RETRY_MARKER = "\n\n[Attempt failed, retrying]\n\n"
+
+JOBS_SUBMITTED = Counter("jobs_submitted_total", "Jobs submitted, and whether an existing job was reused",
+                         ("agent", "deduplicated"))
+JOBS_FINISHED = Counter("jobs_finished_total", "Jobs finished, by outcome", ("agent", "status"))
+JOB_RETRIES = Counter("job_retries_total", "Job attempts that failed and were rescheduled", ("agent",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output TEXT,
+    error TEXT,
+    truncated TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (agent, status, not_before, created);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (agent, key, status);
+"""
+_FIELDS = ("id", "agent", "prompt", "key", "status", "attempts", "output", "error", "truncated",
+           "created", "updated", "not_before")
+
+
+class JobStore:
+    """The SQLite side of the queue; every method runs in a worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute(f"SELECT {', '.join(_FIELDS)} FROM jobs WHERE id = ?",
+                                          (job_id,)).fetchone()
+        return dict(zip(_FIELDS, row)) if row else None
+
+    def submit(self, agent: str, prompt: str, key: str, now: float) -> tuple:
+        """Return ``(job id, status, deduplicated)``."""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT id, status FROM jobs WHERE key = ? AND agent = ? AND status != 'failed' "
+                                 "ORDER BY created DESC LIMIT 1", (key, agent)).fetchone()
+                if row is not None:
+                    return row[0], row[1], True
+                job_id = uuid.uuid4().hex
+                db.execute("INSERT INTO jobs (id, agent, prompt, key, status, created, updated) "
+                           "VALUES (?, ?, ?, ?, 'queued', ?, ?)", (job_id, agent, prompt, key, now, now))
+                return job_id, "queued", False
+            finally:
+                db.execute("COMMIT")
+
+    def claim(self, agent: str, now: float) -> Optional[dict]:
+        """Mark the oldest runnable job of ``agent`` (queued, or running with a stale heartbeat) as running."""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, prompt, attempts FROM jobs WHERE agent = ? AND ("
+                    "(status = 'queued' AND not_before <= ?) OR (status = 'running' AND updated < ?)) "
+                    "ORDER BY created LIMIT 1", (agent, now, now - STALE)).fetchone()
+                if row is None:
+                    return None
+                db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? "
+                           "WHERE id = ?", (now, row[0]))
+                return {"id": row[0], "agent": agent, "prompt": row[1], "attempts": row[2] + 1}
+            finally:
+                db.execute("COMMIT")
+
+    def heartbeat(self, job_id: str, now: float):
+        with self._lock:
+            self._connect().execute("UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running'",
+                                    (now, job_id))
+
+    def finish(self, job_id: str, output: str, truncated: Optional[str], now: float):
+        with self._lock:
+            self._connect().execute("UPDATE jobs SET status = 'done', output = ?, truncated = ?, error = NULL, "
+                                    "updated = ? WHERE id = ?", (output, truncated, now, job_id))
+
+    def fail(self, job_id: str, error: str, retry_at: Optional[float], now: float):
+        """Reschedule the job for ``retry_at``, or fail it for good when that is ``None``."""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, error = ?, not_before = ?, updated = ? WHERE id = ?",
+                ("failed" if retry_at is None else "queued", error, retry_at or 0, now, job_id))
+
+    def release(self, job_id: str, now: float):
+        """Put back a job whose worker is shutting down, without counting the interrupted attempt."""
+        with self._lock:
+            self._connect().execute("UPDATE jobs SET status = 'queued', attempts = attempts - 1, updated = ? "
+                                    "WHERE id = ? AND status = 'running'", (now, job_id))
+
+    def prune(self, now: float):
+        with self._lock:
+            self._connect().execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?",
+                                    (now - RETENTION,))
+
+
+class _Live:
+    """The output of one attempt of a job running in this process, for followers to read as it grows."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+        self.retrying = False
+        self.error: Optional[str] = None
+        self.changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def push(self, content: str):
+        self.chunks.append(content)
+        self._notify()
+
+    def finish(self, error: Optional[str] = None, retrying: bool = False):
+        self.finished, self.error, self.retrying = True, error, retrying
+        self._notify()
+
+
+class JobQueue:
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._live: Dict[str, _Live] = {}
+        self._attempt_started = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    def _wakeup(self, agent: str) -> asyncio.Event:
+        event = self._wakeups.get(agent)
+        if event is None:
+            event = self._wakeups[agent] = asyncio.Event()
+        return event
+
+    async def start(self):
+        await asyncio.to_thread(self.store.prune, time.time())
+        for spec in AGENTS:
+            workers = int(os.getenv(f"{spec.name.upper()}_JOB_CONCURRENCY", "2"))
+            self._workers += [asyncio.ensure_future(self._worker(spec.name)) for _ in range(workers)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def submit(self, agent: str, prompt: str, key: Optional[str] = None) -> dict:
+        if not key:
+            if load_agent(agent).build_request(prompt).cache:
+                key = hashlib.sha256(f"{agent}\0{prompt}".encode("utf-8")).hexdigest()
+            else:
+                key = uuid.uuid4().hex  # a fresh answer every time, like the agent's own endpoint
+        job_id, status, deduplicated = await asyncio.to_thread(self.store.submit, agent, prompt, key, time.time())
+        JOBS_SUBMITTED.inc(agent=agent, deduplicated=str(deduplicated).lower())
+        if not deduplicated:
+            self._wakeup(agent).set()
+        return {"id": job_id, "agent": agent, "status": status, "deduplicated": deduplicated}
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self, agent: str):
+        wakeup = self._wakeup(agent)
+        while True:
+            wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim, agent, time.time())
+            if job is None:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        job_id, agent = job["id"], job["agent"]
+        live = self._live[job_id] = _Live()
+        started, self._attempt_started = self._attempt_started, asyncio.Event()
+        started.set()
+        output: List[str] = []
+        beat = time.monotonic()
+        try:
+            with span("job", agent=agent, job=job_id, attempt=job["attempts"]):
+                module = load_agent(agent)
+                generate = getattr(module, "generate", stream_chat)
+                budgeted = Budgeted(agent, generate(module.build_request(job["prompt"])), marker=False)
+                async for content in budgeted:
+                    output.append(content)
+                    live.push(content)
+                    if time.monotonic() - beat > HEARTBEAT:
+                        beat = time.monotonic()
+                        await asyncio.to_thread(self.store.heartbeat, job_id, time.time())
+            await asyncio.to_thread(self.store.finish, job_id, "".join(output), budgeted.exhausted, time.time())
+            JOBS_FINISHED.inc(agent=agent, status="done")
+            live.finish()
+        except asyncio.CancelledError:
+            live.finish("the job was interrupted and will be resumed")
+            # Shutting down: leave it for the next worker (shielded, so a second cancel cannot skip it)
+            await asyncio.shield(asyncio.to_thread(self.store.release, job_id, time.time()))
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if job["attempts"] < MAX_ATTEMPTS:
+                retry_at = time.time() + RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+                await asyncio.to_thread(self.store.fail, job_id, error, retry_at, time.time())
+                JOB_RETRIES.inc(agent=agent)
+                live.push(RETRY_MARKER)
+                live.finish(retrying=True)
+            else:
+                await asyncio.to_thread(self.store.fail, job_id, error, None, time.time())
+                JOBS_FINISHED.inc(agent=agent, status="failed")
+                live.finish(error)
+        finally:
+            if self._live.get(job_id) is live:
+                del self._live[job_id]
+
+    async def follow(self, job_id: str) -> AsyncIterator[str]:
+        """Yield a job's output: live while an attempt runs here, from the store once it is done."""
+        while True:
+            live = self._live.get(job_id)
+            if live is not None:
+                sent = 0
+                while True:
+                    changed = live.changed
+                    if sent < len(live.chunks):
+                        yield "".join(live.chunks[sent:])
+                        sent = len(live.chunks)
+                    elif live.finished:
+                        break
+                    else:
+                        await changed.wait()
+                if not live.retrying:
+                    if live.error:
+                        yield f"\n\nError: {live.error}\n"
+                    return
+                continue  # the next attempt may start here again, or in another process
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None:
+                return
+            if job["status"] == "done":
+                async for content in replay(job["output"]):
+                    yield content
+                return
+            if job["status"] == "failed":
+                yield f"\n\nError: {job['error']}\n"
+                return
+            # Queued, or running in another process: look again when an attempt starts here, or after a while
+            try:
+                await asyncio.wait_for(self._attempt_started.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _from_env() -> Optional[JobQueue]:
+    if not ENABLED:
+        return None
+    return JobQueue(JobStore(os.getenv("JOBS_PATH", os.path.join(tempfile.gettempdir(), "cognitive-canvas",
+                                                                 "jobs.sqlite3"))))
+
+
+job_queue = _from_env()
+
+router = APIRouter()
+
+
+class JobRequest(BaseModel):
+    agent: str      # brainstormer, critic, roadmap, tasks or pitchdeck
+    prompt: str
+    key: Optional[str] = None  # deduplication key; defaults to a hash of agent and prompt where answers are cacheable
+
+
+def _queue() -> JobQueue:
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="the job API is disabled (JOBS=0)")
+    return job_queue
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    try:
+        get_spec(request.agent)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"unknown agent {request.agent!r}")
+    return await _queue().submit(request.agent, request.prompt, request.key)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await _queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="no such job")
+    job.pop("key")
+    return job
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    if await _queue().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="no such job")
+    return DisconnectAwareResponse(job_queue.follow(job_id), media_type="text/plain")
@@ -0,0 +1,179 @@
+"""Structured JSON logging that never blocks the event loop.
+
+``start_logging()`` routes the standard ``logging`` records of this process
+through a bounded queue to a background thread that formats them as one JSON
+object per line on stdout. Tracebacks are formatted on that thread too, not
+on the request path. If the queue is full a record is dropped (and counted)
+rather than waited for.
+
+Every record carries the ``trace_id`` and ``span_id`` of the request it was
+logged in (see ``tracing``), so all the lines of one request, and the client's
+``traceparent``, can be correlated. Warnings and errors are rate limited per
+call site: after ``LOG_RATE_BURST`` records with the same logger, message and
+exception type within ``LOG_RATE_WINDOW`` seconds the rest are suppressed,
+and the next one that gets through says how many were. So a provider outage
+costs a few lines a minute instead of one traceback per request.
+
+``observed`` (in ``responses``) writes one summary line per stream:
+
+    {"ts": "...", "level": "INFO", "logger": "agent_core.streams", "message": "stream ok",
+     "trace_id": "...", "agent": "critic", "provider": "openrouter", "ttft_ms": 412.3,
+     "duration_ms": 5120.8, "chunks": 41, "chars": 2203, "outcome": "ok"}
+
+Configuration (environment):
+    LOG_LEVEL          root log level (default INFO)
+    LOG_QUEUE_SIZE     records buffered for the writer thread (default 10000)
+    LOG_RATE_BURST     warnings/errors let through per call site and window (default 5)
+    LOG_RATE_WINDOW    seconds of that window (default 60)
+    LOG_STREAM_SAMPLE  fraction of successful streams that get a summary line (default 1.0)
+"""
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from .metrics import Counter
+from .tracing import current_span
+
+LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+RATE_BURST = int(os.getenv("LOG_RATE_BURST", "5"))
+RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))
+STREAM_SAMPLE = float(os.getenv("LOG_STREAM_SAMPLE", "1.0"))
+
+LOG_DROPPED = Counter("log_records_dropped_total", "Log records not written, by reason", ("reason",))
+
+streams = logging.getLogger("agent_core.streams")
+
+# Client libraries that log every HTTP request (and retry) at INFO; the stream summary covers those
+QUIET_LOGGERS = ("httpx", "httpcore", "openai")
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "trace_id", "span_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; ``extra`` fields become top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("trace_id", "span_id"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RESERVED)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most ``burst`` warnings per call site through per ``window`` seconds."""
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites: Dict[Tuple[str, object, str], list] = {}  # key -> [window start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        error = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else ""
+        key = (record.name, record.msg, error)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                site = self._sites[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if site[1] >= self.burst:
+                site[2] += 1
+                LOG_DROPPED.inc(reason="rate_limited")
+                return False
+            site[1] += 1
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records as they are, leaving all formatting to the writer thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = current_span()  # must be read here, in the logging task's context
+        if span is not None:
+            record.trace_id, record.span_id = span.trace_id, span.span_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(reason="queue_full")
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[_QueueHandler] = None
+
+
+def start_logging():
+    """Attach the queue handler to the root logger and start the writer (once per process)."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    records: queue.Queue = queue.Queue(QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    _handler = _QueueHandler(records)
+    _handler.addFilter(RateLimitFilter(RATE_BURST, RATE_WINDOW))
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LEVEL)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+    _listener = logging.handlers.QueueListener(records, writer)
+    _listener.start()
+
+
+def stop_logging():
+    """Write out what is queued and detach (blocks until the writer is done)."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _listener = _handler = None
+
+
+def stream_summary(agent: str, outcome: str, **fields):
+    """Log the one summary line of a finished stream (successful ones sampled by ``LOG_STREAM_SAMPLE``)."""
+    if outcome == "ok" and STREAM_SAMPLE < 1.0 and random.random() >= STREAM_SAMPLE:
+        return
+    level = logging.INFO if outcome in ("ok", "cancelled") else logging.WARNING
+    streams.log(level, "stream %s", outcome, extra=dict(fields, agent=agent, outcome=outcome))
+
+
+def stream_failed(logger: logging.Logger, error: BaseException):
+    """Log a generation that failed inside an agent, and mark its stream's outcome as an error.
+
+    For the ``except`` blocks of the agents' stream generators, which turn the
+    error into text for the client, so the stream itself still ends normally.
+    """
+    span = current_span()
+    if span is not None:
+        span.attributes["outcome"] = "error"
+    logger.error("generation failed: %s", error, exc_info=error)
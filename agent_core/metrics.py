@@ -0,0 +1,149 @@
+"""Process-wide counters, gauges and histograms shared by every agent in the process.
+
+``snapshot()`` returns them as JSON (``GET /stats``) and ``render()`` in the
+Prometheus text exposition format (``GET /metrics``).
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+REGISTRY: List["Counter"] = []
+
+# Latency buckets in seconds, from a cached replay up to a long pitch deck
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield dict(zip(self.labelnames, key)), value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.samples():
+            lines.append(f"{self.name}{_labels(labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Counter):
+    """Observations counted into cumulative ``le`` buckets, with their count and sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def inc(self, amount: float = 1.0, **labels):
+        raise TypeError("histograms are updated with observe()")
+
+    def value(self, **labels) -> float:
+        """Number of observations for these labels."""
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, count, total) in items:
+            cumulative, running = {}, 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                cumulative[_number(bound)] = running
+            yield dict(zip(self.labelnames, key)), {"count": count, "sum": total, "buckets": cumulative}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, value in self.samples():
+            for bound, count in value["buckets"].items():
+                lines.append(f"{self.name}_bucket{_labels(dict(labels, le=bound))} {count}")
+            lines.append(f"{self.name}_count{_labels(labels)} {value['count']}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(value['sum'])}")
+        return lines
+
+
+def snapshot() -> Dict[str, list]:
+    """Every metric's current samples, as plain JSON-able data."""
+    return {
+        metric.name: [{"labels": labels, "value": value} for labels, value in metric.samples()]
+        for metric in REGISTRY
+    }
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
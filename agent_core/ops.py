@@ -0,0 +1,104 @@
+"""Operational endpoints every agent (and the host) includes, and the event-loop lag probe."""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from . import metrics, sessions, sse, tracing, warmup
+from .responses import DisconnectAwareResponse
+
+router = APIRouter()
+
+LOOP_LAG = metrics.Histogram("event_loop_lag_seconds", "How late the event loop ran a scheduled wake-up",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+LOOP_LAG_LAST = metrics.Gauge("event_loop_lag_last_seconds", "Most recent event-loop lag sample")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+_monitor: Optional[asyncio.Task] = None
+
+
+async def _measure_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+def start_loop_monitor():
+    """Start sampling event-loop lag (once per process; later calls are no-ops)."""
+    global _monitor
+    if _monitor is None or _monitor.done():
+        _monitor = asyncio.ensure_future(_measure_loop_lag(LOOP_LAG_INTERVAL))
+
+
+async def stop_loop_monitor():
+    global _monitor
+    if _monitor is not None:
+        _monitor.cancel()
+        await asyncio.gather(_monitor, return_exceptions=True)
+        _monitor = None
+
+
+@router.get("/live")
+def live():
+    """200 while the process is serving, warm or not."""
+    return {"status": "live"}
+
+
+@router.get("/ready")
+def ready():
+    """503 until the provider connections are warm (see ``warmup``) and again once shutdown has begun."""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready() else 503)
+
+
+@router.get("/stats")
+def stats():
+    """Current counters (cache hits/misses, ...) for this process as JSON."""
+    return metrics.snapshot()
+
+
+@router.get("/metrics")
+def prometheus_metrics():
+    """Every metric in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/traces/{trace_id}")
+def trace(trace_id: str):
+    """The spans of one trace recorded by this process, oldest first."""
+    return {"trace_id": trace_id, "spans": tracing.spans_for(trace_id)}
+
+
+@router.get("/streams/{stream_id}")
+def resume_stream(stream_id: str, after: Optional[int] = None,
+                  last_event_id: Optional[str] = Header(default=None)):
+    """Resume an SSE stream after ``Last-Event-ID`` (or ``?after=<n>``) from its replay buffer."""
+    if after is not None:
+        last_event_id = f"{stream_id}:{after}"
+    events = sse.resume(stream_id, last_event_id)
+    if events is None:
+        raise HTTPException(status_code=404, detail="stream expired; start a new generation")
+    return DisconnectAwareResponse(events, media_type="text/event-stream", headers=sse.HEADERS)
+
+
+@router.get("/nodes/{node_id}")
+async def node(node_id: str):
+    """One stored canvas node (see ``sessions``)."""
+    found = await sessions.session_store.get(node_id) if sessions.session_store is not None else None
+    if found is None:
+        raise HTTPException(status_code=404, detail="unknown or expired node")
+    return sessions.node_json(found)
+
+
+@router.get("/sessions/{session}/nodes")
+async def session_nodes(session: str):
+    """The stored nodes of one canvas session, oldest first."""
+    nodes = await sessions.session_store.session_nodes(session) if sessions.session_store is not None else []
+    return {"session": session, "nodes": [sessions.node_json(found) for found in nodes]}
@@ -0,0 +1,263 @@
+"""Incremental parsers for each agent's output format.
+
+Every parser is fed raw content deltas as they stream and only ever looks at
+the new text plus the current unfinished line, so parsing a whole generation is
+linear in its length. ``feed()`` returns the typed events completed by that
+delta and ``close()`` flushes whatever is left when the stream ends.
+
+Items that do not match the format are never silently dropped: stray lines
+become ``{"type": "malformed", "line": ..., "reason": ...}`` events, and items
+with missing parts carry an ``errors`` list.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+Event = Dict[str, object]
+
+_MARKDOWN = re.compile(r"[*_`#]+")
+
+
+def _clean(line: str) -> str:
+    return _MARKDOWN.sub("", line).strip()
+
+
+def _malformed(line: str, reason: str) -> Event:
+    return {"type": "malformed", "line": line, "reason": reason}
+
+
+class LineParser:
+    """Base class: splits the stream into lines and hands each to ``parse_line``."""
+
+    def __init__(self):
+        self._pending = ""
+        self.items = 0
+        self.malformed = 0
+
+    def feed(self, text: str) -> List[Event]:
+        events: List[Event] = []
+        self._pending += text
+        while True:
+            newline = self._pending.find("\n")
+            if newline < 0:
+                break
+            line, self._pending = self._pending[:newline], self._pending[newline + 1:]
+            events.extend(self._count(self.parse_line(line)))
+        return events
+
+    def close(self) -> List[Event]:
+        events: List[Event] = []
+        if self._pending.strip():
+            events.extend(self._count(self.parse_line(self._pending)))
+        self._pending = ""
+        events.extend(self._count(self.finish()))
+        return events
+
+    def _count(self, events: List[Event]) -> List[Event]:
+        for event in events:
+            if event["type"] == "malformed":
+                self.malformed += 1
+            else:
+                self.items += 1
+        return events
+
+    def parse_line(self, line: str) -> List[Event]:
+        raise NotImplementedError
+
+    def finish(self) -> List[Event]:
+        return []
+
+
+class IdeaParser(LineParser):
+    """Brainstormer: ``1. [Idea in 6-8 words]`` per line."""
+
+    IDEA = re.compile(r"^(\d+)[.)]\s*(.+)$")
+
+    def parse_line(self, line: str) -> List[Event]:
+        text = _clean(line)
+        if not text:
+            return []
+        match = self.IDEA.match(text)
+        if not match:
+            return [_malformed(line, "expected a numbered idea")]
+        return [{"type": "idea", "index": int(match.group(1)), "text": match.group(2).strip()}]
+
+
+class CritiqueParser(LineParser):
+    """Critic: ``⚡ IDEA N: title`` blocks with Strengths, Challenges and a Recommendation."""
+
+    HEADER = re.compile(r"^\W*IDEA\s+(\d+)\s*[:.\-–—]?\s*(.*)$", re.IGNORECASE)
+    SECTION = re.compile(r"^\W*(strengths|challenges|recommendation)s?\s*:\s*(.*)$", re.IGNORECASE)
+    BULLET = re.compile(r"^[-•*]\s*(.+)$")
+
+    def __init__(self):
+        super().__init__()
+        self._block: Optional[dict] = None
+        self._section: Optional[str] = None
+        self._ended = False  # the recommendation paragraph is over: the block takes no more text
+
+    def parse_line(self, line: str) -> List[Event]:
+        text = _clean(line)
+        if not text:
+            if self._section == "recommendation" and self._block["recommendation"]:
+                self._ended = True
+            return []
+        header = self.HEADER.match(text)
+        if header:
+            events = self.finish()
+            self._block = {"index": int(header.group(1)), "title": header.group(2).strip(),
+                           "strengths": [], "challenges": [], "recommendation": ""}
+            self._section = None
+            self._ended = False
+            return events
+        if self._block is None:
+            return [_malformed(line, "text before the first IDEA block")]
+        section = self.SECTION.match(text)
+        if section:
+            self._section = section.group(1).lower()
+            self._ended = False
+            rest = section.group(2).strip()
+            return self._add(rest, line) if rest else []
+        return self._add(text, line)
+
+    def _add(self, text: str, line: str) -> List[Event]:
+        if self._section in ("strengths", "challenges"):
+            bullet = self.BULLET.match(line.strip())
+            self._block[self._section].append(bullet.group(1).strip() if bullet else text)
+        elif self._section == "recommendation":
+            if self._ended:
+                # e.g. the next block's header cut off by a truncated generation
+                return [_malformed(line, "text after the Recommendation paragraph")]
+            self._block["recommendation"] = f"{self._block['recommendation']} {text}".strip()
+        else:
+            return [_malformed(line, "text outside Strengths/Challenges/Recommendation")]
+        return []
+
+    def finish(self) -> List[Event]:
+        if self._block is None:
+            return []
+        block, self._block = self._block, None
+        errors = [f"missing {name}" for name in ("strengths", "challenges", "recommendation")
+                  if not block[name]]
+        event: Event = {"type": "critique", **block}
+        if errors:
+            event["errors"] = errors
+        return [event]
+
+
+class PhaseParser(LineParser):
+    """Roadmap: ``Phase X: Title :: description`` per line."""
+
+    PHASE = re.compile(r"^Phase\s+(\d+)\s*:\s*(.*)$", re.IGNORECASE)
+
+    def parse_line(self, line: str) -> List[Event]:
+        text = _clean(line)
+        if not text:
+            return []
+        match = self.PHASE.match(text)
+        if not match:
+            return [_malformed(line, "expected 'Phase X: Title :: description'")]
+        title, sep, description = match.group(2).partition("::")
+        event: Event = {"type": "phase", "index": int(match.group(1)),
+                        "title": title.strip(), "description": description.strip()}
+        if not sep:
+            event["errors"] = ["missing ' :: ' description separator"]
+        return [event]
+
+
+class TaskParser(LineParser):
+    """Tasks: ``[Category] Task Title (Effort: X-Yh | Difficulty: Level) - context``."""
+
+    CATEGORIES = {"🚀": "Quick Wins", "🎯": "Core Tasks", "📈": "Growth Goals"}
+    TASK = re.compile(
+        r"^(?:\[(?P<bracket>[^\]]+)\]|(?P<emoji>[^\w\s(\[]+))?\s*"
+        r"(?P<title>.+?)\s*"
+        r"\(\s*Effort:\s*(?P<lo>\d+(?:\.\d+)?)\s*(?:(?:-|–|to)\s*(?P<hi>\d+(?:\.\d+)?))?\s*h\w*\s*"
+        r"\|\s*Difficulty:\s*(?P<difficulty>\w+)\s*\)"
+        r"\s*(?:[-–—:]\s*(?P<context>.*))?$",
+        re.IGNORECASE,
+    )
+    LEVELS = ("Easy", "Medium", "Hard")
+
+    def parse_line(self, line: str) -> List[Event]:
+        text = _clean(line)
+        if not text:
+            return []
+        match = self.TASK.match(text)
+        if not match:
+            return [_malformed(line, "expected '[Category] Title (Effort: X-Yh | Difficulty: Level) - context'")]
+        low = float(match.group("lo"))
+        high = float(match.group("hi") or low)
+        emoji = (match.group("emoji") or "").strip()
+        category = match.group("bracket") or self.CATEGORIES.get(emoji.replace("\ufe0f", ""), emoji or None)
+        difficulty = match.group("difficulty").capitalize()
+        event: Event = {
+            "type": "task",
+            "category": category,
+            "title": match.group("title").strip(),
+            "effort_hours": {"min": low, "max": high},
+            "difficulty": difficulty,
+            "context": (match.group("context") or "").strip(),
+        }
+        errors = []
+        if high < low:
+            errors.append("effort range is reversed")
+        if difficulty not in self.LEVELS:
+            errors.append(f"unknown difficulty {difficulty!r}")
+        if errors:
+            event["errors"] = errors
+        return [event]
+
+
+class SlideParser(LineParser):
+    """Pitch deck: ``SLIDE N: TITLE`` followed by the slide's content lines."""
+
+    HEADER = re.compile(r"^SLIDE\s+(\d+)\s*[:.\-–—]\s*(.+)$", re.IGNORECASE)
+
+    def __init__(self):
+        super().__init__()
+        self._slide: Optional[dict] = None
+
+    def parse_line(self, line: str) -> List[Event]:
+        text = _clean(line)
+        header = self.HEADER.match(text)
+        if header:
+            events = self.finish()
+            self._slide = {"index": int(header.group(1)), "title": header.group(2).strip(), "lines": []}
+            return events
+        if not text:
+            return []
+        if self._slide is None:
+            return [_malformed(line, "text before the first SLIDE")]
+        self._slide["lines"].append(line.strip())
+        return []
+
+    def finish(self) -> List[Event]:
+        if self._slide is None:
+            return []
+        slide, self._slide = self._slide, None
+        event: Event = {"type": "slide", "index": slide["index"], "title": slide["title"],
+                        "content": "\n".join(slide["lines"])}
+        if not slide["lines"]:
+            event["errors"] = ["empty slide"]
+        return [event]
+
+
+async def ndjson_events(chunks: AsyncIterator[str], parser: LineParser,
+                        summary: Optional[Callable[[], Event]] = None) -> AsyncIterator[str]:
+    """Re-encode an agent's text stream as NDJSON typed events.
+
+    Ends with ``{"type": "done", "items": n, "malformed": m}``, plus whatever
+    ``summary()`` returns once the text stream has ended.
+    """
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    for event in parser.close():
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+    done: Event = {"type": "done", "items": parser.items, "malformed": parser.malformed}
+    if summary is not None:
+        done.update(summary())
+    yield json.dumps(done) + "\n"
@@ -0,0 +1,162 @@
+"""Server-side brainstorm -> critique + per-idea roadmap orchestration.
+
+``POST /pipeline`` runs the brainstormer and fans out on the server instead of
+in the browser: each idea's roadmap starts as soon as that idea's line has
+streamed, and the critic starts on the full brainstorm text the moment it is
+complete. Everything is multiplexed onto one NDJSON stream, one event per line:
+
+    {"stage": "brainstorm", "type": "delta", "text": "1. Voice-to-SQL"}
+    {"stage": "brainstorm", "type": "idea", "idea": 1, "text": "Voice-to-SQL query builder"}
+    {"stage": "roadmap", "type": "delta", "idea": 1, "text": "Phase 1: ..."}
+    {"stage": "critic", "type": "done"}
+    {"stage": "pipeline", "type": "done"}
+
+``type`` is one of ``delta``, ``idea``, ``done``, ``error`` (with ``message``) or
+``malformed`` (a brainstorm line that is not a numbered idea). ``delta`` text is
+coalesced by each agent's flush thresholds (see ``chunking``), as in the
+agents' own streams, rather than sent one event per provider token.
+
+Besides the pipeline's own admission slot, every stage waits for a slot from
+its agent's limiter (see ``admission``), so the fan-out is held to
+``<AGENT>_MAX_CONCURRENT`` like the agents' own endpoints.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from .admission import limiter_for
+from .budgets import Budgeted
+from .chunking import coalesce
+from .compression import CompressionMiddleware
+from .parsers import IdeaParser
+from .registry import load_agent
+from .responses import DisconnectAwareResponse, observed
+from .streaming import ChatRequest, stream_chat
+from .tracing import TraceMiddleware, span
+
+
+class PipelineRequest(BaseModel):
+    prompt: str
+    critic: bool = True
+    roadmaps: bool = True
+
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["traceparent"],
+)
+app.add_middleware(TraceMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+
+def _event(stage: str, type_: str, idea: Optional[int] = None, **fields) -> dict:
+    event = {"stage": stage, "type": type_}
+    if idea is not None:
+        event["idea"] = idea
+    event.update(fields)
+    return event
+
+
+@asynccontextmanager
+async def _admitted(agent: str):
+    """Hold a slot of ``agent``'s admission limiter, queueing for it however long the queue is."""
+    limiter = limiter_for(agent)
+    if limiter is None:
+        yield
+        return
+    async with limiter.claim(always_queue=True):
+        yield
+
+
+async def _run_stage(queue: asyncio.Queue, stage: str, chat: ChatRequest, idea: Optional[int] = None):
+    try:
+        budgeted = Budgeted(chat.agent, coalesce(chat.agent, stream_chat(chat)), marker=False)
+        async with _admitted(chat.agent):
+            with span(stage, agent=chat.agent, idea=idea):
+                async for content in budgeted:
+                    await queue.put(_event(stage, "delta", idea, text=content))
+        done = {"truncated": budgeted.exhausted} if budgeted.exhausted else {}
+        await queue.put(_event(stage, "done", idea, **done))
+    except Exception as e:
+        await queue.put(_event(stage, "error", idea, message=str(e)))
+    finally:
+        await queue.put(None)
+
+
+async def pipeline_events(request: PipelineRequest) -> AsyncIterator[dict]:
+    brainstormer, critic, roadmap = (load_agent(name) for name in ("brainstormer", "critic", "roadmap"))
+    queue: asyncio.Queue = asyncio.Queue()
+    tasks = []
+
+    def start(stage: str, chat: ChatRequest, idea: Optional[int] = None):
+        tasks.append(asyncio.ensure_future(_run_stage(queue, stage, chat, idea)))
+
+    async def brainstorm():
+        text, parser = "", IdeaParser()
+
+        async def handle(events):
+            for event in events:
+                if event["type"] != "idea":
+                    await queue.put({"stage": "brainstorm", **event})
+                    continue
+                await queue.put(_event("brainstorm", "idea", event["index"], text=event["text"]))
+                if request.roadmaps:
+                    start("roadmap", roadmap.build_request(event["text"]), event["index"])
+
+        try:
+            async with _admitted("brainstormer"):
+                with span("brainstorm", agent="brainstormer"):
+                    chunks = coalesce("brainstormer",
+                                      brainstormer.generate(brainstormer.build_request(request.prompt)))
+                    async for content in chunks:
+                        await queue.put(_event("brainstorm", "delta", text=content))
+                        text += content
+                        await handle(parser.feed(content))
+                    await handle(parser.close())
+            await queue.put(_event("brainstorm", "done"))
+            if request.critic:
+                start("critic", critic.build_request(text))
+        except Exception as e:
+            await queue.put(_event("brainstorm", "error", message=str(e)))
+        finally:
+            await queue.put(None)
+
+    tasks.append(asyncio.ensure_future(brainstorm()))
+    finished = 0
+    try:
+        # Every task puts exactly one None when it ends, and the brainstorm task
+        # starts its children before ending, so this sees every task finish.
+        while finished < len(tasks):
+            event = await queue.get()
+            if event is None:
+                finished += 1
+            else:
+                yield event
+        yield _event("pipeline", "done")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _ndjson(events: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for event in events:
+        yield json.dumps(event) + "\n"
+
+
+@app.post("/pipeline")
+async def run_pipeline(request: PipelineRequest):
+    return DisconnectAwareResponse(observed("pipeline", _ndjson(pipeline_events(request))),
+                                   media_type="application/x-ndjson", agent="pipeline")
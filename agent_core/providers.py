@@ -0,0 +1,146 @@
+"""Provider registry, the pooled async clients and the raw completion stream.
+
+Each provider gets exactly one ``AsyncOpenAI`` client per process, backed by an
+``httpx.AsyncClient`` whose connection limits and keep-alive settings come from
+the environment. Agents never build their own clients any more; they ask for
+one by provider name so all streams to the same provider share one pool.
+
+The ``openai`` SDK is only imported when the first client is built (see
+``warmup``, which does that at startup): it is the slowest import an agent has.
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, Dict
+
+import httpx
+
+from .budgets import TOKENS_SAVED, budget_for
+from .chat import ChatRequest
+from .metrics import Histogram
+from .tracing import current_span, span
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+UPSTREAM_TTFT = Histogram("upstream_ttft_seconds", "Time from the provider request to its first content delta",
+                          ("provider", "model"))
+UPSTREAM_SECONDS = Histogram("upstream_generation_seconds", "Total time of one upstream completion stream",
+                             ("provider", "model"))
+
+
+@dataclass(frozen=True)
+class Provider:
+    name: str
+    base_url: str
+    api_key_env: str
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    requests_per_minute: int = 0  # quotas enforced by ``ratelimit``; 0 is unlimited
+    tokens_per_minute: int = 0
+
+    @property
+    def api_key(self):
+        return os.getenv(self.api_key_env)
+
+
+def _provider_from_env(name: str, default_url: str, api_key_env: str,
+                       max_connections: int, max_keepalive: int, rpm: int, tpm: int) -> Provider:
+    # e.g. OPENROUTER_BASE_URL, OPENROUTER_MAX_CONNECTIONS, OPENROUTER_KEEPALIVE_EXPIRY, OPENROUTER_RPM
+    prefix = name.upper()
+    return Provider(
+        name=name,
+        base_url=os.getenv(f"{prefix}_BASE_URL", default_url),
+        api_key_env=api_key_env,
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", max_connections)),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", max_keepalive)),
+        keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY", 60.0)),
+        requests_per_minute=int(os.getenv(f"{prefix}_RPM", rpm)),
+        tokens_per_minute=int(os.getenv(f"{prefix}_TPM", tpm)),
+    )
+
+
+PROVIDERS: Dict[str, Provider] = {
+    "openrouter": _provider_from_env(
+        "openrouter", "https://openrouter.ai/api/v1", "OPENROUTER_API_KEY", 200, 50, 200, 400_000),
+    "cerebras": _provider_from_env(
+        "cerebras", "https://api.cerebras.ai/v1", "CEREBRAS_API_KEY", 100, 20, 30, 60_000),
+}
+
+_clients: Dict[str, AsyncOpenAI] = {}
+
+
+def get_client(name: str) -> AsyncOpenAI:
+    """Return the pooled client for ``name``, creating it on first use."""
+    client = _clients.get(name)
+    if client is None:
+        from openai import AsyncOpenAI
+
+        provider = PROVIDERS[name]
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=provider.max_connections,
+                max_keepalive_connections=provider.max_keepalive_connections,
+                keepalive_expiry=provider.keepalive_expiry,
+            ),
+        )
+        client = AsyncOpenAI(base_url=provider.base_url, api_key=provider.api_key,
+                             http_client=http_client)
+        _clients[name] = client
+    return client
+
+
+async def close_clients():
+    """Close every pooled client (called on application shutdown)."""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.close()
+
+
+async def stream_completion(chat: ChatRequest) -> AsyncIterator[str]:
+    """Yield the non-empty content deltas of one streamed provider completion.
+
+    The upstream response is always closed when the consumer stops iterating,
+    so cancelling the surrounding task releases the pooled connection; the
+    tokens that were not generated as a result are counted in ``tokens_saved_total``.
+    """
+    client = get_client(chat.provider)
+    labels = {"provider": chat.provider, "model": chat.model}
+    parent = current_span()  # usually the response's "stream" span, whose summary names the provider
+    with span("upstream", agent=chat.agent, **labels) as current:
+        start = time.perf_counter()
+        stream = await client.chat.completions.create(
+            model=chat.model,
+            messages=chat.messages(),
+            stream=True,
+            extra_headers={"traceparent": current.traceparent},
+            **chat.params,
+        )
+        deltas, finished = 0, False
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if deltas == 0:
+                        ttft = time.perf_counter() - start
+                        UPSTREAM_TTFT.observe(ttft, **labels)
+                        current.attributes["ttft_ms"] = round(ttft * 1000, 1)
+                        if parent is not None:
+                            parent.attributes.setdefault("provider", chat.provider)
+                    deltas += 1
+                    yield content
+            finished = True
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, **labels)
+        finally:
+            await stream.close()
+            if not finished:
+                # Closed early (client gone, budget spent, hedge lost): count what we did not pay for,
+                # taking one delta as roughly one token
+                cap = chat.params.get("max_tokens") or budget_for(chat.agent).tokens
+                if cap and cap > deltas:
+                    TOKENS_SAVED.inc(cap - deltas, agent=chat.agent, **labels)
@@ -0,0 +1,218 @@
+"""Token-bucket limiters sized to each provider's request and token quotas.
+
+Every upstream completion first takes one request and its estimated token cost
+(prompt plus ``max_tokens``, or the agent's token budget) from its provider's
+buckets, so all the agents sharing a provider in this process share its quota
+instead of each of them tripping the provider's own rate limit. Waiters are
+served by priority lane (``AgentSpec.priority``, lower first, or the lane set
+with ``priority_lane``, e.g. for batches) and in arrival order within a lane,
+so the task agent is not stuck behind a queue of 70B generations.
+
+A request that cannot get its quota within ``PROVIDER_QUOTA_MAX_WAIT`` seconds
+(``PROVIDER_QUOTA_BATCH_MAX_WAIT`` in the batch lane, which is paced rather than
+failed) fails with ``QuotaExhausted``, which the router treats like an
+unavailable route and fails over. When a provider answers 429 anyway, its buckets are held
+empty for the ``Retry-After`` it sent.
+
+Configuration (environment), per provider (``OPENROUTER_``, ``CEREBRAS_``):
+    <PROVIDER>_RPM    requests per minute, 0 for no limit
+    <PROVIDER>_TPM    tokens per minute, 0 for no limit
+and for all of them:
+    PROVIDER_QUOTA_MAX_WAIT        seconds a request may wait for its quota (default 10)
+    PROVIDER_QUOTA_BATCH_MAX_WAIT  the same for batch items (default 600)
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, List, Optional
+
+from .budgets import budget_for, estimate_tokens
+from .chat import ChatRequest
+from .metrics import LATENCY_BUCKETS, Counter, Gauge, Histogram
+from .providers import PROVIDERS
+from .registry import get_spec
+
+if TYPE_CHECKING:
+    from openai import RateLimitError
+
+MAX_WAIT = float(os.getenv("PROVIDER_QUOTA_MAX_WAIT", "10"))
+BATCH_MAX_WAIT = float(os.getenv("PROVIDER_QUOTA_BATCH_MAX_WAIT", "600"))
+BATCH_PRIORITY = 2  # offline work: behind every interactive agent
+SPECULATIVE_PRIORITY = 3  # speculative prefetch: only quota nobody else is waiting for
+
+_lane: ContextVar[Optional[int]] = ContextVar("agent_core_priority_lane", default=None)
+
+QUOTA_WAIT = Histogram("provider_quota_wait_seconds", "Time a provider request waited for its quota",
+                       ("provider",), buckets=LATENCY_BUCKETS)
+QUOTA_WAITING = Gauge("provider_quota_waiting", "Provider requests waiting for their quota", ("provider",))
+QUOTA_EXHAUSTED = Counter("provider_quota_exhausted_total",
+                          "Provider requests that gave up waiting for their quota", ("provider", "agent"))
+RATE_LIMITED = Counter("provider_rate_limited_total", "429 responses from a provider", ("provider",))
+
+
+class QuotaExhausted(RuntimeError):
+    """A provider's quota will not allow a request within its lane's maximum wait."""
+
+
+class TokenBucket:
+    """Holds up to ``per_minute`` units and refills at ``per_minute`` per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` can be taken (a cost above the capacity counts as the capacity)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+
+class ProviderQuota:
+    def __init__(self, provider: str, requests_per_minute: int, tokens_per_minute: int):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.blocked_until = 0.0
+        self._queue: List[list] = []  # heap of [priority, arrival, wake-up event]
+        self._arrivals = itertools.count()
+
+    @property
+    def limited(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _delay(self, tokens: int, now: float) -> float:
+        delay = max(0.0, self.blocked_until - now)
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay(1, now))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return delay
+
+    def _take(self, tokens: int):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    async def acquire(self, tokens: int, priority: int = 1, agent: str = ""):
+        """Wait until one request costing ``tokens`` fits the quota, for at most its lane's maximum wait."""
+        if not self.limited and self.blocked_until <= time.monotonic():
+            return
+        start = time.monotonic()
+        max_wait = BATCH_MAX_WAIT if priority == BATCH_PRIORITY else MAX_WAIT
+        deadline = start + max_wait
+        entry = [priority, next(self._arrivals), asyncio.Event()]
+        heapq.heappush(self._queue, entry)
+        QUOTA_WAITING.set(len(self._queue), provider=self.provider)
+        try:
+            while True:
+                now = time.monotonic()
+                head = self._queue[0] is entry
+                delay = self._delay(tokens, now) if head else None
+                if delay == 0:
+                    self._take(tokens)
+                    QUOTA_WAIT.observe(now - start, provider=self.provider)
+                    return
+                remaining = deadline - now
+                if remaining <= 0 or (delay is not None and delay > remaining):
+                    QUOTA_EXHAUSTED.inc(provider=self.provider, agent=agent)
+                    raise QuotaExhausted(f"{self.provider} quota exhausted; no capacity within {max_wait:g}s")
+                # The head sleeps until its quota has refilled; everyone else until they become the head
+                entry[2].clear()
+                try:
+                    await asyncio.wait_for(entry[2].wait(), remaining if delay is None else delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            if self._queue:
+                self._queue[0][2].set()
+            QUOTA_WAITING.set(len(self._queue), provider=self.provider)
+
+    def rate_limited(self, retry_after: Optional[float]):
+        """The provider answered 429: hold every bucket empty for ``retry_after`` seconds."""
+        RATE_LIMITED.inc(provider=self.provider)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + (retry_after or 1.0))
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.drain()
+
+
+_quotas: Dict[str, ProviderQuota] = {
+    name: ProviderQuota(name, provider.requests_per_minute, provider.tokens_per_minute)
+    for name, provider in PROVIDERS.items()
+}
+
+
+def quota_for(provider: str) -> ProviderQuota:
+    return _quotas[provider]
+
+
+def request_cost(chat: ChatRequest) -> int:
+    """Estimated tokens one completion of ``chat`` counts against a tokens-per-minute quota."""
+    prompt = estimate_tokens("".join(message["content"] for message in chat.messages()))
+    return prompt + (chat.params.get("max_tokens") or budget_for(chat.agent).tokens or 0)
+
+
+@contextmanager
+def priority_lane(priority: int):
+    """Run the block's provider requests in ``priority`` instead of their agent's lane."""
+    token = _lane.set(priority)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def priority_of(agent: str) -> int:
+    lane = _lane.get()
+    if lane is not None:
+        return lane
+    try:
+        return get_spec(agent).priority
+    except KeyError:
+        return 1
+
+
+def _retry_after(error: RateLimitError) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def limited(chat: ChatRequest, source: Callable[[ChatRequest], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Stream ``chat`` from ``source`` once its provider's quota allows the request."""
+    from openai import RateLimitError  # imported lazily, like the clients themselves (see providers)
+
+    quota = quota_for(chat.provider)
+    await quota.acquire(request_cost(chat), priority_of(chat.agent), chat.agent)
+    chunks = source(chat)
+    try:
+        async for content in chunks:
+            yield content
+    except RateLimitError as e:
+        quota.rate_limited(_retry_after(e))
+        raise
+    finally:
+        await chunks.aclose()
@@ -0,0 +1,70 @@
+"""The five agents, where they live on disk and which paths they serve."""
+from __future__ import annotations
+
+import importlib.util
+import os
+import sys
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    name: str
+    directory: str
+    route: str    # the public endpoint, e.g. /brainstorm
+    prefix: str   # mount point for the agent's own paths, e.g. /brainstormer/generate
+    port: int     # the port the agent used when each ran in its own uvicorn
+    budget_seconds: float = 60.0  # wall-clock cap on one response stream
+    budget_tokens: int = 1500     # (estimated) completion tokens cap on one response stream
+    max_concurrent: int = 8       # response streams generating at once
+    max_queued: int = 16          # requests waiting for a slot before new ones get a 429
+    priority: int = 1             # provider quota lane; lower is served first
+    flush_bytes: int = 256        # coalesce response fragments up to this many characters ...
+    flush_ms: float = 100.0       # ... or for at most this long
+    replicas: int = 1             # processes the gateway runs for this agent (see gateway)
+
+
+AGENTS: Tuple[AgentSpec, ...] = (
+    # The first call of every canvas session, and the one most worth scaling out
+    AgentSpec("brainstormer", "brainstormer-agent", "/brainstorm", "/brainstormer", 8001, 30.0, 400, 8, 16,
+              flush_bytes=64, flush_ms=25.0, replicas=2),
+    AgentSpec("critic", "critic-agent", "/criticize", "/critic", 8002, 90.0, 1500, 4, 8),
+    AgentSpec("roadmap", "roadmap-agent", "/roadmap", "/roadmap", 8003, 60.0, 1000, 6, 12),
+    # Cheap and fast on Cerebras: more slots, and first in line for the shared quotas
+    AgentSpec("tasks", "task-agent", "/tasks", "/task", 8004, 60.0, 1500, 12, 24, priority=0,
+              flush_bytes=128, flush_ms=50.0),
+    AgentSpec("pitchdeck", "pitch-deck-agent", "/pitchdeck", "/pitchdeck", 8005, 120.0, 2000, 4, 8,
+              flush_bytes=512, flush_ms=200.0),
+)
+
+_BY_NAME: Dict[str, AgentSpec] = {spec.name: spec for spec in AGENTS}
+
+
+def get_spec(name: str) -> AgentSpec:
+    return _BY_NAME[name]
+
+
+def load_agent(name: str) -> ModuleType:
+    """Import an agent's ``main.py`` under a unique module name.
+
+    Agent directories are not packages (and every entry point is called
+    ``main``), so they are loaded by path as ``agents.<name>``. Loading is
+    cached, so every caller in the process shares one module and one app.
+    """
+    module_name = f"agents.{name}"
+    module = sys.modules.get(module_name)
+    if module is None:
+        path = os.path.join(ROOT, get_spec(name).directory, "main.py")
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+    return module
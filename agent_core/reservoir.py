@@ -0,0 +1,169 @@
+"""Pre-generated answers, per persona, for requests that carry no prompt of their own.
+
+Most brainstorms are just a persona button press: the prompt is the persona
+tag and the canvas's placeholder label, so the answer depends on nothing but
+the persona. With ``RESERVOIR=1``, a background worker keeps a pool of
+complete, validated answers for each persona that nobody has been served yet,
+and such a request takes one from the pool instead of waiting for the model.
+Requests with a prompt of their own always generate live. An answer that has
+gone stale while it waited (``usable`` says no, e.g. a live request has since
+been given one of its ideas) is dropped on the way out.
+
+A persona's pool is refilled once it falls below ``RESERVOIR_LOW_WATER`` and
+until it holds ``RESERVOIR_DEPTH`` answers again, one generation at a time,
+and only while the agent has no live response streams (so refills never
+compete with a user for the agent's slots). Refills run in the lowest
+provider-quota lane, held to the agent's generation budget, and may reserve at
+most ``RESERVOIR_TOKENS`` estimated tokens per ``RESERVOIR_WINDOW``.
+
+Observable on ``/metrics``: ``reservoir_depth`` per persona, refills by outcome
+in ``reservoir_refills_total`` (its rate is the refill rate), the hit ratio
+as ``reservoir_requests_total{outcome="hit"}`` over all of it, and stale
+answers dropped in ``reservoir_discarded_total``.
+
+Configuration (environment):
+    RESERVOIR             "1" enables the pools (default "0")
+    RESERVOIR_DEPTH       answers kept per persona (default 8)
+    RESERVOIR_LOW_WATER   refill a pool once it holds fewer than this (default 3)
+    RESERVOIR_TOKENS      tokens the refills may spend per window (default 60000)
+    RESERVOIR_WINDOW      seconds of that window (default 3600)
+    RESERVOIR_POLL        seconds between checks while there is nothing to do (default 1.0)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from .admission import limiter_for
+from .budgets import Budgeted
+from .chat import ChatRequest
+from .metrics import Counter, Gauge
+from .ratelimit import SPECULATIVE_PRIORITY, priority_lane, request_cost
+from .tracing import span
+
+ENABLED = os.getenv("RESERVOIR", "0") == "1"
+DEPTH = int(os.getenv("RESERVOIR_DEPTH", "8"))
+LOW_WATER = int(os.getenv("RESERVOIR_LOW_WATER", "3"))
+TOKENS = int(os.getenv("RESERVOIR_TOKENS", "60000"))
+WINDOW = float(os.getenv("RESERVOIR_WINDOW", "3600"))
+POLL = float(os.getenv("RESERVOIR_POLL", "1.0"))
+
+RESERVOIR_DEPTH = Gauge("reservoir_depth", "Pre-generated answers waiting to be served", ("agent", "persona"))
+RESERVOIR_REFILLS = Counter("reservoir_refills_total", "Reservoir refill generations, by outcome",
+                            ("agent", "persona", "outcome"))
+RESERVOIR_REQUESTS = Counter("reservoir_requests_total",
+                             "Requests that asked the reservoir for an answer, by whether it had one",
+                             ("agent", "persona", "outcome"))
+RESERVOIR_DISCARDED = Counter("reservoir_discarded_total", "Pooled answers dropped as stale when taken",
+                              ("agent", "persona"))
+
+logger = logging.getLogger("agent_core.reservoir")
+
+
+class Reservoir:
+    """Pools of unserved answers for one agent, one pool per persona (``None`` is the default one).
+
+    ``build(persona)`` makes the request for a fresh answer, ``generate`` streams
+    it, and ``accept(persona, text)`` says whether a finished answer is fit to
+    pool, next to those already in ``pools[persona]``.
+    """
+
+    def __init__(self, agent: str, personas: Iterable[Optional[str]],
+                 build: Callable[[Optional[str]], ChatRequest],
+                 generate: Callable[[ChatRequest], AsyncIterator[str]],
+                 accept: Callable[[Optional[str], str], bool]):
+        self.agent = agent
+        self.build = build
+        self.generate = generate
+        self.accept = accept
+        self.pools: Dict[Optional[str], Deque[str]] = {persona: deque() for persona in personas}
+        self._filling = set(self.pools)  # pools below their low-water mark and not yet back to full depth
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        for persona in self.pools:
+            RESERVOIR_DEPTH.set(0, agent=agent, persona=persona or "default")
+
+    def start(self):
+        if ENABLED and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def take(self, persona: Optional[str], usable: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """An unserved answer for ``persona``, removed from its pool, or ``None`` if it has none.
+
+        Answers ``usable`` rejects are dropped on the way.
+        """
+        pool = self.pools.get(persona)
+        if pool is None:
+            return None
+        answer = None
+        while pool and answer is None:
+            answer = pool.popleft()
+            if usable is not None and not usable(answer):
+                RESERVOIR_DISCARDED.inc(agent=self.agent, persona=persona or "default")
+                answer = None
+        RESERVOIR_REQUESTS.inc(agent=self.agent, persona=persona or "default",
+                               outcome="miss" if answer is None else "hit")
+        self._update(persona)
+        return answer
+
+    def _update(self, persona: Optional[str]):
+        depth = len(self.pools[persona])
+        RESERVOIR_DEPTH.set(depth, agent=self.agent, persona=persona or "default")
+        if depth < LOW_WATER:
+            self._filling.add(persona)
+        elif depth >= DEPTH:
+            self._filling.discard(persona)
+
+    def _idle(self) -> bool:
+        limiter = limiter_for(self.agent)
+        return limiter is None or limiter.active == 0
+
+    def _reserve(self, cost: int) -> bool:
+        now = time.monotonic()
+        while self._spent and self._spent[0][0] < now - WINDOW:
+            self._spent.popleft()
+        if sum(tokens for _, tokens in self._spent) + cost > TOKENS:
+            return False
+        self._spent.append((now, cost))
+        return True
+
+    async def _run(self):
+        while True:
+            if not self._filling or not self._idle():
+                await asyncio.sleep(POLL)
+                continue
+            persona = min(self._filling, key=lambda p: len(self.pools[p]))  # the emptiest pool first
+            label = persona or "default"
+            chat = self.build(persona)
+            if not self._reserve(request_cost(chat)):
+                RESERVOIR_REFILLS.inc(agent=self.agent, persona=label, outcome="budget")
+                await asyncio.sleep(POLL)
+                continue
+            try:
+                with priority_lane(SPECULATIVE_PRIORITY), span("refill", agent=self.agent, persona=label):
+                    budgeted = Budgeted(self.agent, self.generate(chat), marker=False)
+                    text = "".join([content async for content in budgeted])
+            except Exception as e:
+                RESERVOIR_REFILLS.inc(agent=self.agent, persona=label, outcome="failed")
+                logger.warning("reservoir refill failed: %s", e, extra={"agent": self.agent, "persona": label})
+                await asyncio.sleep(POLL)
+                continue
+            if budgeted.exhausted or not self.accept(persona, text):
+                RESERVOIR_REFILLS.inc(agent=self.agent, persona=label, outcome="rejected")
+                continue
+            self.pools[persona].append(text)
+            RESERVOIR_REFILLS.inc(agent=self.agent, persona=label, outcome="ok")
+            self._update(persona)
@@ -0,0 +1,162 @@
+"""The streaming HTTP response every agent endpoint returns.
+
+``stream_response`` wraps an agent's chunk generator with the agent's
+generation budget (see ``budgets``), the per-stream instrumentation (in-flight
+gauge, TTFT, duration, chunk and character histograms, client cancellations, a
+``stream`` trace span, a summary log line) and picks raw text or structured NDJSON depending on
+whether a parser is given. Provider fragments are first coalesced into fewer,
+larger chunks (see ``chunking``).
+
+Responses watch for the client disconnecting while they stream, so an aborted
+fetch cancels the generation (and closes the provider stream) straight away
+instead of on the next chunk write. Before generating, a response waits for a
+slot from its agent's admission limiter (see ``admission``), or answers 429
+when the agent's queue is full.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+import anyio
+from fastapi.responses import StreamingResponse
+
+from .admission import Overloaded, limiter_for
+from .budgets import Budgeted
+from .chunking import coalesce
+from .logs import stream_summary
+from .metrics import SIZE_BUCKETS, Counter, Gauge, Histogram
+from .parsers import LineParser, ndjson_events
+from .sse import HEADERS as SSE_HEADERS, ReplayBuffer, open_stream
+from .tracing import span
+
+IN_FLIGHT = Gauge("streams_in_flight", "Response streams currently open", ("agent",))
+STREAM_TTFT = Histogram("stream_ttft_seconds", "Time from request to the first chunk sent to the client",
+                        ("agent",))
+STREAM_SECONDS = Histogram("stream_duration_seconds", "Total time to stream a response", ("agent",))
+STREAM_CHUNKS = Histogram("stream_chunks", "Chunks sent per response", ("agent",), buckets=SIZE_BUCKETS)
+STREAM_CHARS = Histogram("stream_chars", "Characters sent per response", ("agent",), buckets=SIZE_BUCKETS)
+CANCELLATIONS = Counter("stream_cancellations_total", "Streams abandoned by the client before the end",
+                        ("agent",))
+
+
+async def observed(agent: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Pass ``chunks`` through while recording the stream's metrics and span."""
+    start = time.perf_counter()
+    count = chars = 0
+    ttft = None
+    finished = False
+    IN_FLIGHT.inc(agent=agent)
+    with span("stream", agent=agent) as current:
+        try:
+            async for content in chunks:
+                if count == 0:
+                    ttft = time.perf_counter() - start
+                    STREAM_TTFT.observe(ttft, agent=agent)
+                count += 1
+                chars += len(content)
+                yield content
+            finished = True
+        except (asyncio.CancelledError, GeneratorExit):
+            CANCELLATIONS.inc(agent=agent)
+            current.attributes["cancelled"] = True
+            raise
+        finally:
+            IN_FLIGHT.dec(agent=agent)
+            if finished:
+                STREAM_SECONDS.observe(time.perf_counter() - start, agent=agent)
+                STREAM_CHUNKS.observe(count, agent=agent)
+                STREAM_CHARS.observe(chars, agent=agent)
+            current.attributes.update(chunks=count, chars=chars)
+            outcome = current.attributes.get("outcome") or (
+                "ok" if finished else "cancelled" if current.attributes.get("cancelled") else "error")
+            stream_summary(agent, outcome, provider=current.attributes.get("provider"),
+                           ttft_ms=None if ttft is None else round(ttft * 1000, 1),
+                           duration_ms=round((time.perf_counter() - start) * 1000, 1), chunks=count, chars=chars)
+
+
+class DisconnectAwareResponse(StreamingResponse):
+    """A ``StreamingResponse`` that always listens for ``http.disconnect``.
+
+    Starlette only does this for servers speaking ASGI < 2.4; with newer ones
+    (current uvicorn) a disconnect surfaces only when the next chunk is written,
+    which can be many seconds away while waiting on a slow first token.
+    """
+
+    def __init__(self, content, *args, agent: Optional[str] = None, replay: Optional[ReplayBuffer] = None,
+                 **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.agent = agent
+        self.replay = replay  # an SSE stream: its producer keeps the admission slot (see ``sse``)
+
+    async def __call__(self, scope, receive, send):
+        limiter = limiter_for(self.agent) if self.agent else None
+        claim = None
+        try:
+            if limiter is not None:
+                try:
+                    claim = limiter.claim()
+                except Overloaded as e:
+                    await e.response()(scope, receive, send)
+                    return
+            async with anyio.create_task_group() as group:
+                async def stream():
+                    try:
+                        if claim is None:
+                            await self.stream_response(send)
+                        else:
+                            async with claim:  # queued requests wait here, still watching for a disconnect
+                                if self.replay is not None:
+                                    self.replay.hold(claim.transfer())  # the generation outlives this connection
+                                await self.stream_response(send)
+                    except OSError:
+                        pass  # the client went away mid-write
+                    finally:
+                        if self.replay is not None and self.replay.task is None:
+                            self.replay.release()  # gone before it started generating: nothing to hold it for
+                        # Close the generator chain in the task that ran it, so its spans end where they
+                        # began (shielded: the group may already be cancelled)
+                        with anyio.CancelScope(shield=True):
+                            await self._close_body()
+                    group.cancel_scope.cancel()
+
+                group.start_soon(stream)
+                await self.listen_for_disconnect(receive)
+                group.cancel_scope.cancel()
+        finally:
+            if claim is not None:
+                claim.close()
+            await self._close_body()  # never started (overloaded, or gone while queued): still close it now
+        if self.background is not None:
+            await self.background()
+
+    async def _close_body(self):
+        """Close the generator chain now rather than whenever it is garbage collected."""
+        close = getattr(self.body_iterator, "aclose", None)
+        if close is not None:
+            await close()
+
+
+def stream_response(agent: str, chunks: AsyncIterator[str], parser: Optional[LineParser] = None,
+                    sse: bool = False, node_id: Optional[str] = None) -> StreamingResponse:
+    """Stream ``chunks`` as text, or as NDJSON events when ``parser`` is given.
+
+    With ``sse`` the same body is sent as resumable Server-Sent Events (see ``sse``).
+    ``node_id`` is sent as ``X-Node-Id``: the canvas node the response will be stored as.
+    """
+    headers = {"X-Node-Id": node_id} if node_id else {}
+    chunks = coalesce(agent, chunks)
+    if parser is not None:
+        budgeted = Budgeted(agent, chunks, marker=False)
+        body = ndjson_events(observed(agent, budgeted), parser,
+                             lambda: {"truncated": budgeted.exhausted} if budgeted.exhausted else {})
+        media_type = "application/x-ndjson"
+    else:
+        body = observed(agent, Budgeted(agent, chunks))
+        media_type = "text/plain"
+    if sse:
+        stream = open_stream(agent, body)
+        return DisconnectAwareResponse(stream.read(), media_type="text/event-stream", agent=agent, replay=stream,
+                                       headers={**SSE_HEADERS, **headers, "X-Stream-Id": stream.stream_id})
+    return DisconnectAwareResponse(body, media_type=media_type, agent=agent, headers=headers)
@@ -0,0 +1,242 @@
+"""Latency-aware routing of a generation across providers.
+
+A request names its preferred (provider, model) route plus optional
+``fallbacks``. For every route the router keeps an EWMA of time-to-first-token,
+an EWMA error rate, a window of recent TTFTs for the p95, and a circuit breaker
+that opens after consecutive failures and lets a single probe through once its
+cooldown has passed.
+
+A generation then goes like this:
+
+* routes with an open circuit are skipped, and a fallback is tried first only
+  when it has proven itself much faster (``ROUTER_SWITCH_RATIO``) or the
+  preferred route is failing;
+* if the first route has not produced a token by its p95 TTFT, a *hedged*
+  request is sent to the next route, and whichever produces a token first wins
+  while the other is cancelled;
+* a route that fails before its first token fails over to the next one; a
+  route that is out of provider quota (``ratelimit``) fails over the same way
+  without counting against its circuit breaker.
+  After the first token has been sent the stream is committed to its route.
+
+Configuration (environment):
+    ROUTER_HEDGE              "0" disables hedged requests (default "1")
+    ROUTER_HEDGE_DELAY        hedge deadline in seconds until a route has enough
+                              samples for a p95 (default 3.0)
+    ROUTER_HEDGE_MIN_DELAY    lower bound on the hedge deadline (default 0.25)
+    ROUTER_BREAKER_FAILURES   consecutive failures that open a circuit (default 5)
+    ROUTER_BREAKER_COOLDOWN   seconds an open circuit waits before a probe (default 30)
+    ROUTER_SWITCH_RATIO       how much faster a fallback must be to be preferred (default 0.5)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import replace
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from .chat import ChatRequest
+from .chunking import Pump
+from .metrics import Counter, Gauge
+from .providers import PROVIDERS
+from .ratelimit import QuotaExhausted
+
+Route = Tuple[str, str]  # (provider, model)
+
+HEDGE = os.getenv("ROUTER_HEDGE", "1") != "0"
+HEDGE_DELAY = float(os.getenv("ROUTER_HEDGE_DELAY", "3.0"))
+HEDGE_MIN_DELAY = float(os.getenv("ROUTER_HEDGE_MIN_DELAY", "0.25"))
+BREAKER_FAILURES = int(os.getenv("ROUTER_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("ROUTER_BREAKER_COOLDOWN", "30"))
+SWITCH_RATIO = float(os.getenv("ROUTER_SWITCH_RATIO", "0.5"))
+ALPHA = 0.2  # EWMA weight of the newest sample
+MIN_SAMPLES = 20  # TTFTs needed before the p95 is trusted as a hedge deadline
+
+TTFT_EWMA = Gauge("router_ttft_ewma_seconds", "EWMA time to first token per route", ("provider", "model"))
+ERROR_RATE = Gauge("router_error_rate", "EWMA error rate per route", ("provider", "model"))
+CIRCUIT = Gauge("router_circuit_open", "1 while a route's circuit breaker is open", ("provider", "model"))
+FAILOVERS = Counter("router_failovers_total", "Attempts that failed before their first token", ("agent",))
+HEDGES = Counter("router_hedges_total", "Hedged requests sent after the first token deadline", ("agent",))
+HEDGE_WINS = Counter("router_hedge_wins_total", "Hedged requests that beat the original", ("agent",))
+
+
+class NoRouteAvailable(RuntimeError):
+    """Every route for a request is behind an open circuit breaker."""
+
+
+class RouteStats:
+    def __init__(self, route: Route):
+        self.route = route
+        self.ttft: Optional[float] = None
+        self.error_rate = 0.0
+        self.recent: Deque[float] = deque(maxlen=200)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    def _labels(self):
+        return {"provider": self.route[0], "model": self.route[1]}
+
+    def p95(self) -> Optional[float]:
+        if len(self.recent) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def available(self, now: float) -> bool:
+        if self.opened_at is None:
+            return True
+        return now - self.opened_at >= BREAKER_COOLDOWN and not self.probing
+
+    def started(self):
+        if self.opened_at is not None:
+            self.probing = True  # half-open: this attempt is the single probe
+
+    def success(self, ttft: float):
+        self.ttft = ttft if self.ttft is None else ALPHA * ttft + (1 - ALPHA) * self.ttft
+        self.recent.append(ttft)
+        self.error_rate *= 1 - ALPHA
+        self.failures = 0
+        self.opened_at, self.probing = None, False
+        TTFT_EWMA.set(self.ttft, **self._labels())
+        ERROR_RATE.set(self.error_rate, **self._labels())
+        CIRCUIT.set(0, **self._labels())
+
+    def failure(self):
+        self.error_rate = ALPHA + (1 - ALPHA) * self.error_rate
+        self.failures += 1
+        self.probing = False
+        if self.failures >= BREAKER_FAILURES or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+            CIRCUIT.set(1, **self._labels())
+        ERROR_RATE.set(self.error_rate, **self._labels())
+
+    def release(self):
+        """An attempt that was cancelled says nothing about the route's health."""
+        self.probing = False
+
+
+_stats: Dict[Route, RouteStats] = {}
+
+
+def stats_for(route: Route) -> RouteStats:
+    stats = _stats.get(route)
+    if stats is None:
+        stats = _stats[route] = RouteStats(route)
+    return stats
+
+
+def plan(chat: ChatRequest) -> List[Route]:
+    """The routes to try for ``chat``, best first."""
+    now = time.monotonic()
+    primary: Route = (chat.provider, chat.model)
+    routes = [primary] + [route for route in chat.fallbacks
+                          if route != primary and PROVIDERS[route[0]].api_key]
+    routes = [route for route in routes if stats_for(route).available(now)]
+    if len(routes) > 1:
+        first = stats_for(routes[0])
+        for i, route in enumerate(routes[1:], 1):
+            other = stats_for(route)
+            faster = (first.ttft is not None and other.ttft is not None
+                      and other.ttft < first.ttft * SWITCH_RATIO)
+            if faster or first.error_rate > 0.5 > other.error_rate:
+                routes.insert(0, routes.pop(i))
+                break
+    return routes
+
+
+def hedge_delay(route: Route) -> float:
+    p95 = stats_for(route).p95()
+    return max(HEDGE_MIN_DELAY, HEDGE_DELAY if p95 is None else p95)
+
+
+async def _first(chunks: Pump):
+    try:
+        return True, await chunks.get()
+    except StopAsyncIteration:
+        return False, None
+
+
+async def _discard(task: asyncio.Future, chunks: Pump):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await chunks.aclose()
+
+
+async def routed(chat: ChatRequest, source: Callable[[ChatRequest], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Stream ``chat`` from the best available route, hedging and failing over as needed."""
+    pending = plan(chat)
+    if not pending:
+        raise NoRouteAvailable(f"every provider route for {chat.agent} is failing; try again shortly")
+
+    loop = asyncio.get_running_loop()
+    attempts: Dict[asyncio.Future, tuple] = {}
+
+    def launch():
+        route = pending.pop(0)
+        attempt = chat if route == (chat.provider, chat.model) else replace(
+            chat, provider=route[0], model=route[1])
+        chunks = Pump(source(attempt))  # each attempt runs in its own task; only waiting for it is raced
+        stats_for(route).started()
+        attempts[asyncio.ensure_future(_first(chunks))] = (route, chunks, loop.time())
+
+    launch()
+    first_route = next(iter(attempts.values()))[0]
+    hedged, error, winner = False, None, None
+    try:
+        while attempts and winner is None:
+            timeout = None
+            if HEDGE and not hedged and pending and len(attempts) == 1:
+                (route, _, started), = attempts.values()
+                timeout = max(0.0, started + hedge_delay(route) - loop.time())
+            done, _ = await asyncio.wait(list(attempts), timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                HEDGES.inc(agent=chat.agent)
+                hedged = True
+                launch()
+                continue
+            for task in done:
+                route, chunks, started = attempts.pop(task)
+                try:
+                    has_content, first = task.result()
+                except Exception as e:
+                    from openai import RateLimitError  # lazy, so importing the router stays cheap
+
+                    if isinstance(e, (QuotaExhausted, RateLimitError)):
+                        stats_for(route).release()  # out of quota, not unhealthy
+                    else:
+                        stats_for(route).failure()
+                    FAILOVERS.inc(agent=chat.agent)
+                    error = e
+                    await chunks.aclose()
+                    if not attempts and pending:
+                        launch()
+                    continue
+                stats_for(route).success(loop.time() - started)
+                winner = (route, chunks, has_content, first)
+                break
+    finally:
+        for task, (route, chunks, _) in list(attempts.items()):
+            stats_for(route).release()
+            await _discard(task, chunks)
+        attempts.clear()
+
+    if winner is None:
+        raise error if error is not None else NoRouteAvailable(f"no provider route answered for {chat.agent}")
+    route, chunks, has_content, first = winner
+    if hedged and route != first_route:
+        HEDGE_WINS.inc(agent=chat.agent)
+    try:
+        if not has_content:
+            return
+        yield first
+        async for content in chunks:
+            yield content
+    except Exception:
+        stats_for(route).failure()
+        raise
+    finally:
+        await chunks.aclose()
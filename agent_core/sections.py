@@ -0,0 +1,113 @@
+"""Sectioned generation: one answer written by several concurrent calls.
+
+Some answers are a fixed sequence of independent sections: the critic's
+``⚡ IDEA N`` blocks, the pitch deck's slides. Written by one call, the last
+section waits behind every token of the ones before it. ``in_order`` instead
+starts one request per section, at most ``SECTION_CONCURRENCY`` at a time
+(earlier sections first), and merges them back in canonical order: the
+earliest unfinished section streams live, and each later one is held until
+every section before it is done, then flushed at once and followed live.
+
+Each section is trimmed of leading and trailing blank space and the sections
+are joined with ``separator``, so the merged text reads like a single answer.
+If a section fails, the error is raised when the merge reaches it, after all
+the sections before it have been sent, just as a single call failing midway.
+
+Configuration (environment):
+    SECTION_CONCURRENCY  sections of one answer generating at once (default 4)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import AsyncIterator, Callable, List, Optional, Sequence
+
+from .chat import ChatRequest
+from .metrics import Counter
+from .tracing import span
+
+CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", "4"))
+
+SECTIONS = Counter("generated_sections_total", "Sections of sectioned answers, by outcome", ("agent", "outcome"))
+
+
+class _Section:
+    """The chunks one section has produced so far."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def fill(self, index: int, chat: ChatRequest, chunks: AsyncIterator[str], slots: asyncio.Semaphore):
+        try:
+            async with slots:
+                with span("section", agent=chat.agent, index=index):
+                    async for content in chunks:
+                        self.chunks.append(content)
+                        self._notify()
+            SECTIONS.inc(agent=chat.agent, outcome="ok")
+        except asyncio.CancelledError:
+            SECTIONS.inc(agent=chat.agent, outcome="cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+            SECTIONS.inc(agent=chat.agent, outcome="failed")
+        finally:
+            self.done = True
+            self._notify()
+            await chunks.aclose()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """The chunks produced so far, then the live tail."""
+        sent = 0
+        while True:
+            changed = self.changed
+            if sent < len(self.chunks):
+                sent += 1
+                yield self.chunks[sent - 1]
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await changed.wait()
+
+
+async def _trimmed(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """``chunks`` without leading or trailing whitespace, still streamed."""
+    held, started = "", False
+    async for content in chunks:
+        if not started:
+            content = content.lstrip()
+            started = bool(content)
+        body = content.rstrip()
+        if body:
+            yield held + body
+            held = content[len(body):]
+        else:
+            held += content
+
+
+async def in_order(chats: Sequence[ChatRequest], generate: Callable[[ChatRequest], AsyncIterator[str]],
+                   separator: str = "\n\n", concurrency: int = CONCURRENCY) -> AsyncIterator[str]:
+    """Generate one section per chat concurrently, yielding them in the order given."""
+    slots = asyncio.Semaphore(max(1, concurrency))
+    sections = [_Section() for _ in chats]
+    # Created in order, so the semaphore hands its slots to the earlier sections first
+    tasks = [asyncio.ensure_future(section.fill(index, chat, generate(chat), slots))
+             for index, (section, chat) in enumerate(zip(sections, chats), 1)]
+    try:
+        for index, section in enumerate(sections):
+            if index:
+                yield separator
+            async for content in _trimmed(section.follow()):
+                yield content
+    finally:
+        for task in tasks:
+            task.cancel()
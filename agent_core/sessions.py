@@ -0,0 +1,260 @@
+"""Server-side canvas graph: every generation is kept as a node the next request can point at.
+
+Each agent response gets a node id, sent as the ``X-Node-Id`` header, and once
+the stream has finished cleanly its text is stored under that id with the
+agent that wrote it, the nodes it was generated from and the client's
+``session``. A later request can then send ``"nodes": [...]`` instead of
+re-uploading that text, and the agent assembles its prompt on the server:
+
+    POST /criticize  {"nodes": ["3f9c..."]}                      # a whole brainstorm
+    POST /roadmap    {"nodes": ["3f9c...#2"]}                    # idea 2 of it
+    POST /pitchdeck  {"nodes": ["a81e...#1", "a81e...#2", ...]}  # roadmap phases
+
+``<id>#<n>`` picks item ``n`` of a node, as the canvas splits it: a numbered
+brainstorm line (without its number), a roadmap ``Phase n`` line (as
+``title\\n\\ndescription``), or a critique ``IDEA n`` / deck ``SLIDE n`` block.
+An unknown or expired id is a 404. ``prompt`` still works as before, on its
+own or as the instruction that goes with the referenced nodes.
+
+Nodes live in a memory LRU with a TTL and, with ``SESSION_STORE_PATH``, in a
+SQLite file too, which is what lets separately running agents (or several host
+workers) resolve each other's nodes. ``GET /nodes/{id}`` returns one node and
+``GET /sessions/{session}/nodes`` a session's nodes, oldest first.
+
+Configuration (environment):
+    SESSION_STORE        "0" disables node ids and references (default "1")
+    SESSION_STORE_NODES  nodes kept in memory (default 2048)
+    SESSION_STORE_TTL    seconds a node stays valid (default 86400)
+    SESSION_STORE_PATH   SQLite file; empty (the default) keeps nodes in-process only
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, List, Mapping, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from .metrics import Counter, Gauge
+from .tracing import current_span
+
+NODES_STORED = Counter("session_nodes_stored_total", "Generations stored as canvas nodes", ("agent",))
+NODE_LOOKUPS = Counter("session_node_lookups_total", "Node references resolved, by outcome", ("outcome",))
+NODES_IN_MEMORY = Gauge("session_nodes_in_memory", "Canvas nodes held in the memory tier")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    session TEXT,
+    agent TEXT NOT NULL,
+    text TEXT NOT NULL,
+    parents TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_session ON nodes (session, created);
+CREATE INDEX IF NOT EXISTS nodes_expires ON nodes (expires);
+"""
+
+_NUMBERED = re.compile(r"^(\d+)[.)]\s*(.+)$")
+_PHASE = re.compile(r"^Phase\s+(\d+)\s*:", re.IGNORECASE)
+_BLOCK = re.compile(r"^\W*(?:IDEA|SLIDE)\s+(\d+)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Node:
+    id: str
+    agent: str
+    text: str
+    parents: Tuple[str, ...] = ()
+    session: Optional[str] = None
+    created: float = 0.0
+
+    def item(self, index: int) -> Optional[str]:
+        """Item ``index`` of this node's text, as the canvas would split it out.
+
+        A text with IDEA/SLIDE blocks is only split into those blocks, so a
+        numbered list inside a block never stands in for one.
+        """
+        lines = self.text.split("\n")
+        starts = [number for number, line in enumerate(lines) if _BLOCK.match(line.strip())]
+        if starts:
+            for start, end in zip(starts, starts[1:] + [len(lines)]):
+                if int(_BLOCK.match(lines[start].strip()).group(1)) == index:
+                    return "\n".join(lines[start:end]).strip()
+            return None
+        for line in lines:
+            text = line.strip()
+            phase = _PHASE.match(text)
+            if phase and int(phase.group(1)) == index:
+                title, _, description = text.partition("::")
+                return f"{title.strip()}\n\n{description.strip()}".strip()
+            numbered = _NUMBERED.match(text)
+            if numbered and int(numbered.group(1)) == index:
+                return numbered.group(2).strip()
+        return None
+
+
+class SessionStore:
+    def __init__(self, memory_nodes: int = 2048, ttl: float = 86400.0, path: Optional[str] = None):
+        self.memory_nodes = memory_nodes
+        self.ttl = ttl
+        self.path = path
+        self._memory: "OrderedDict[str, Tuple[Node, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    # -- disk tier (runs in a worker thread) ---------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def _row_node(row) -> Node:
+        node_id, session, agent, text, parents, created = row
+        return Node(node_id, agent, text, tuple(json.loads(parents)), session, created)
+
+    def _disk_get(self, node_id: str, now: float) -> Optional[Tuple[Node, float]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT id, session, agent, text, parents, created, expires FROM nodes WHERE id = ? AND expires > ?",
+                (node_id, now)).fetchone()
+        return None if row is None else (self._row_node(row[:6]), row[6])
+
+    def _disk_put(self, node: Node, expires: float, now: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (node.id, node.session, node.agent, node.text, json.dumps(node.parents), node.created, expires))
+            db.execute("DELETE FROM nodes WHERE expires <= ?", (now,))
+            db.commit()
+
+    def _disk_session(self, session: str, now: float) -> List[Node]:
+        with self._db_lock:
+            rows = self._connect().execute(
+                "SELECT id, session, agent, text, parents, created FROM nodes WHERE session = ? AND expires > ? "
+                "ORDER BY created", (session, now)).fetchall()
+        return [self._row_node(row) for row in rows]
+
+    # -- public API -----------------------------------------------------------
+
+    def _remember(self, node: Node, expires: float):
+        self._memory[node.id] = (node, expires)
+        self._memory.move_to_end(node.id)
+        while len(self._memory) > self.memory_nodes:
+            self._memory.popitem(last=False)
+        NODES_IN_MEMORY.set(len(self._memory))
+
+    async def put(self, node: Node):
+        now = time.time()
+        self._remember(node, now + self.ttl)
+        if self.path:
+            await asyncio.to_thread(self._disk_put, node, now + self.ttl, now)
+        NODES_STORED.inc(agent=node.agent)
+
+    async def get(self, node_id: str) -> Optional[Node]:
+        now = time.time()
+        entry = self._memory.get(node_id)
+        if entry is not None:
+            if entry[1] > now:
+                self._memory.move_to_end(node_id)
+                return entry[0]
+            del self._memory[node_id]
+        if self.path:
+            entry = await asyncio.to_thread(self._disk_get, node_id, now)
+            if entry is not None:
+                self._remember(*entry)
+                return entry[0]
+        return None
+
+    async def session_nodes(self, session: str) -> List[Node]:
+        """The live nodes of ``session``, oldest first."""
+        now = time.time()
+        if self.path:
+            return await asyncio.to_thread(self._disk_session, session, now)
+        return sorted((node for node, expires in self._memory.values() if node.session == session and expires > now),
+                      key=lambda node: node.created)
+
+    async def resolve(self, reference: str) -> Tuple[Node, str]:
+        """The node ``reference`` (``<id>`` or ``<id>#<n>``) points into, and the text it picks; a 404 if none."""
+        node_id, _, item = reference.partition("#")
+        node = await self.get(node_id)
+        text = None
+        if node is not None:
+            text = node.item(int(item)) if item.isdigit() else node.text if not item else None
+        NODE_LOOKUPS.inc(outcome="missing" if text is None else "ok")
+        if text is None:
+            raise HTTPException(status_code=404, detail=f"unknown or expired node {reference!r}")
+        return node, text
+
+
+def _from_env() -> Optional[SessionStore]:
+    if os.getenv("SESSION_STORE", "1") == "0":
+        return None
+    return SessionStore(
+        memory_nodes=int(os.getenv("SESSION_STORE_NODES", "2048")),
+        ttl=float(os.getenv("SESSION_STORE_TTL", "86400")),
+        path=os.getenv("SESSION_STORE_PATH") or None,
+    )
+
+
+session_store = _from_env()
+
+
+def new_node_id() -> Optional[str]:
+    """An id for the node a response is about to become (``None`` with the store disabled)."""
+    return os.urandom(12).hex() if session_store is not None else None
+
+
+async def node_prompt(prompt: str, references: Sequence[str], template: str = "{context}\n\n{prompt}",
+                      frames: Optional[Mapping[str, str]] = None) -> str:
+    """``prompt`` with the text of the referenced nodes filled into ``template`` (just ``prompt`` without any).
+
+    ``frames`` maps the agent that wrote a node to how its text is introduced,
+    e.g. ``"Based on this roadmap:\n\n{text}"``; consecutive references to the
+    same agent's nodes share one frame, and other agents' text goes in as is.
+    """
+    if not references:
+        return prompt
+    if session_store is None:
+        raise HTTPException(status_code=400, detail="node references need the session store (SESSION_STORE=1)")
+    resolved = [await session_store.resolve(reference) for reference in references]
+    groups: List[Tuple[str, List[str]]] = []
+    for node, text in resolved:
+        if groups and groups[-1][0] == node.agent:
+            groups[-1][1].append(text)
+        else:
+            groups.append((node.agent, [text]))
+    texts = [(frames or {}).get(agent, "{text}").format(text="\n\n".join(group)) for agent, group in groups]
+    return template.format(context="\n\n".join(texts), prompt=prompt).strip()
+
+
+async def recorded(chunks: AsyncIterator[str], node_id: Optional[str], agent: str,
+                   parents: Sequence[str] = (), session: Optional[str] = None) -> AsyncIterator[str]:
+    """Pass ``chunks`` through, then store them as node ``node_id`` if the generation completed."""
+    parts = []
+    async for content in chunks:
+        parts.append(content)
+        yield content
+    # Only reached when the stream was read to the end; an agent that turned an error into text marks its span
+    span = current_span()
+    if node_id is None or not parts or (span is not None and span.attributes.get("outcome") == "error"):
+        return
+    await session_store.put(Node(node_id, agent, "".join(parts), tuple(parents), session, time.time()))
+
+
+def node_json(node: Node) -> dict:
+    return {**asdict(node), "parents": list(node.parents)}
@@ -0,0 +1,134 @@
+"""Single-flight coalescing of identical in-flight generations.
+
+The first request for a fingerprint starts one upstream stream in a background
+task (a *flight*); identical requests that arrive while it is running subscribe
+to it instead of opening their own. Every subscriber first receives the chunks
+already produced and then the live tail.
+
+The flight never waits on its subscribers. Each one has its own bounded queue;
+if a slow client lets it fill up, that subscriber stops being fed and later
+catches up from the flight's chunk history, so it cannot stall the others. When
+the last subscriber goes away the upstream stream is cancelled.
+
+Configuration (environment):
+    SINGLE_FLIGHT         "0" disables coalescing (default "1")
+    SINGLE_FLIGHT_BUFFER  chunks buffered per subscriber (default 64)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from .chat import ChatRequest
+from .metrics import Counter, Gauge
+
+COALESCED = Counter("singleflight_coalesced_total",
+                    "Requests served by subscribing to an identical in-flight generation", ("agent",))
+LAGGING = Counter("singleflight_lagging_total",
+                  "Times a subscriber's buffer filled up and it fell back to the chunk history", ("agent",))
+FLIGHTS = Gauge("singleflight_flights", "Upstream generations currently shared by single-flight", ("agent",))
+
+_END = object()
+
+
+class _Subscriber:
+    def __init__(self, buffer: int):
+        self.queue: asyncio.Queue = asyncio.Queue(buffer)
+        self.cursor = 0  # chunks of the flight's history delivered so far
+        self.lagging = True  # a new subscriber starts by catching up from the history
+
+
+class _Flight:
+    def __init__(self, key: str, chat: ChatRequest, source: Callable[[], AsyncIterator[str]]):
+        self.key = key
+        self.chat = chat
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers: Set[_Subscriber] = set()
+        self.task = asyncio.ensure_future(self._run(source))
+
+    def _push(self, item):
+        for sub in self.subscribers:
+            if sub.lagging:
+                continue
+            try:
+                sub.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                sub.lagging = True
+                LAGGING.inc(agent=self.chat.agent)
+
+    async def _run(self, source: Callable[[], AsyncIterator[str]]):
+        try:
+            async for content in source():
+                self.chunks.append(content)
+                self._push(content)
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("shared generation was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            if _flights.get(self.key) is self:
+                del _flights[self.key]
+            FLIGHTS.dec(agent=self.chat.agent)
+            self._push(_END)
+
+    async def subscribe(self, buffer: int) -> AsyncIterator[str]:
+        sub = _Subscriber(buffer)
+        self.subscribers.add(sub)
+        try:
+            while True:
+                if sub.lagging and sub.queue.empty():
+                    while sub.cursor < len(self.chunks):
+                        sub.cursor += 1
+                        yield self.chunks[sub.cursor - 1]
+                    # Caught up; nothing can be appended between this check and the flag
+                    sub.lagging = False
+                    if self.done:
+                        break
+                    continue
+                item = await sub.queue.get()
+                if item is _END:
+                    break
+                sub.cursor += 1
+                yield item
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers.discard(sub)
+            if not self.subscribers and not self.done:
+                # Nobody is listening any more: release the upstream, and make
+                # sure a request arriving meanwhile starts a fresh flight
+                if _flights.get(self.key) is self:
+                    del _flights[self.key]
+                self.task.cancel()
+
+
+_flights: Dict[str, _Flight] = {}
+ENABLED = os.getenv("SINGLE_FLIGHT", "1") != "0"
+BUFFER = int(os.getenv("SINGLE_FLIGHT_BUFFER", "64"))
+
+
+async def coalesced(chat: ChatRequest, source: Callable[[ChatRequest], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Stream ``source(chat)``, sharing one upstream stream among identical concurrent requests.
+
+    Only requests that may be cached are coalesced; ones that opt out (the
+    brainstormer's deliberately random generations) always get their own stream.
+    """
+    if not ENABLED or not chat.cache:
+        async for content in source(chat):
+            yield content
+        return
+
+    key = chat.fingerprint()
+    flight = _flights.get(key)
+    if flight is None:
+        flight = _flights[key] = _Flight(key, chat, lambda: source(chat))
+        FLIGHTS.inc(agent=chat.agent)
+    else:
+        COALESCED.inc(agent=chat.agent)
+    async for content in flight.subscribe(BUFFER):
+        yield content
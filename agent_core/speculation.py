@@ -0,0 +1,224 @@
+"""Speculative prefetch of the generations a brainstorm usually leads to.
+
+Users nearly always expand one of a brainstorm's ideas into a roadmap, and the
+frontend critiques the whole brainstorm as soon as it has arrived. With
+``"speculate": true`` on a brainstorm request, the server starts those
+generations in the background once the brainstorm stream has completed: one
+roadmap per idea (the idea text exactly as the frontend's focused node sends
+it) and, with ``SPECULATE_CRITIC=1``, the critique of the full text. A later
+request with the same fingerprint claims the speculation in ``stream_chat``:
+it gets what has been generated so far and then follows the rest live, instead
+of starting over. A speculation that fails or is cut off by its budget is never
+served as is: a claim that has not sent anything yet generates normally in its
+own lane, and one that has already sent part of it ends with an error.
+
+Speculative generations run in the lowest provider-quota lane, so they only
+use quota that interactive and batch requests leave, and are held to their
+agent's generation budget. Each session may reserve at most
+``SPECULATE_SESSION_TOKENS`` estimated tokens per ``SPECULATE_WINDOW``. A
+speculation nobody claims within ``SPECULATE_TTL`` seconds is dropped and its
+tokens are counted as wasted. The hit rate is ``speculative_hits_total`` over
+``speculative_generations_total{outcome="started"}``.
+
+Claims are matched within one process: with one process per agent, a roadmap
+request only benefits once the speculation has finished and reached the
+response cache's disk tier.
+
+Configuration (environment):
+    SPECULATE                 "0" disables speculation (default "1")
+    SPECULATE_CRITIC          "1" also speculates the critique (default "0")
+    SPECULATE_SESSION_TOKENS  tokens a session may speculate per window (default 6000)
+    SPECULATE_WINDOW          seconds of that window (default 3600)
+    SPECULATE_TTL             seconds an unclaimed speculation is kept (default 600)
+    SPECULATE_MAX_ACTIVE      speculations generating at once (default 16)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from .budgets import Budgeted, estimate_tokens
+from .chat import ChatRequest
+from .metrics import Counter, Gauge
+from .ratelimit import SPECULATIVE_PRIORITY, priority_lane, request_cost
+from .registry import load_agent
+from .tracing import span
+
+ENABLED = os.getenv("SPECULATE", "1") != "0"
+CRITIC = os.getenv("SPECULATE_CRITIC", "0") == "1"
+SESSION_TOKENS = int(os.getenv("SPECULATE_SESSION_TOKENS", "6000"))
+WINDOW = float(os.getenv("SPECULATE_WINDOW", "3600"))
+TTL = float(os.getenv("SPECULATE_TTL", "600"))
+MAX_ACTIVE = int(os.getenv("SPECULATE_MAX_ACTIVE", "16"))
+
+SPECULATIONS = Counter("speculative_generations_total", "Speculative generations, by outcome",
+                       ("agent", "outcome"))
+SPECULATIVE_HITS = Counter("speculative_hits_total",
+                           "Requests served from a speculative generation, by its state when claimed",
+                           ("agent", "state"))
+SPECULATIVE_WASTED = Counter("speculative_wasted_tokens_total",
+                             "Estimated tokens of speculative generations nobody claimed", ("agent",))
+SPECULATIVE_ACTIVE = Gauge("speculative_active", "Speculative generations currently running", ("agent",))
+
+# What the frontend turns a brainstorm line into when an idea is focused
+_IDEA_LINE = re.compile(r"^\d+\.\s*")
+
+_speculating: ContextVar[bool] = ContextVar("speculating", default=False)
+
+
+class SpeculationFailed(ConnectionAbortedError):
+    """A claimed speculation failed or was truncated after part of it had been sent."""
+
+
+class _Speculation:
+    """One background generation and the chunks it has produced so far."""
+
+    def __init__(self, key: str, chat: ChatRequest, generate: Callable[[ChatRequest], AsyncIterator[str]]):
+        self.key = key
+        self.chat = chat
+        self.chunks: List[str] = []
+        self.done = False
+        self.failed = False  # errored, cancelled or cut off by its budget: not to be served
+        self.claimed = False
+        self.changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run(generate))
+        self._expiry = asyncio.get_running_loop().call_later(TTL, self._expire)
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def _run(self, generate: Callable[[ChatRequest], AsyncIterator[str]]):
+        agent = self.chat.agent
+        _speculating.set(True)  # so this generation does not claim itself
+        SPECULATIVE_ACTIVE.inc(agent=agent)
+        try:
+            with priority_lane(SPECULATIVE_PRIORITY), span("speculate", agent=agent):
+                budgeted = Budgeted(agent, generate(self.chat), marker=False)
+                async for content in budgeted:
+                    self.chunks.append(content)
+                    self._notify()
+            if budgeted.exhausted:
+                self.failed = True
+                SPECULATIONS.inc(agent=agent, outcome="truncated")
+                self._drop()
+        except asyncio.CancelledError:
+            self.failed = True
+            raise
+        except Exception:
+            self.failed = True
+            SPECULATIONS.inc(agent=agent, outcome="failed")
+            self._drop()  # later requests generate normally instead
+        finally:
+            self.done = True
+            SPECULATIVE_ACTIVE.dec(agent=agent)
+            self._notify()
+
+    def _drop(self):
+        self._expiry.cancel()
+        if _speculations.get(self.key) is self:
+            del _speculations[self.key]
+
+    def _expire(self):
+        if self.claimed and not self.done:
+            self._expiry = asyncio.get_running_loop().call_later(TTL, self._expire)
+            return
+        self._drop()
+        if not self.claimed:
+            self.task.cancel()
+            spent = estimate_tokens("".join(message["content"] for message in self.chat.messages()))
+            SPECULATIVE_WASTED.inc(spent + estimate_tokens("".join(self.chunks)), agent=self.chat.agent)
+
+    async def follow(self) -> AsyncIterator[str]:
+        """The chunks produced so far, then the live tail."""
+        sent = 0
+        while True:
+            changed = self.changed
+            if sent < len(self.chunks):
+                sent += 1
+                yield self.chunks[sent - 1]
+            elif self.done:
+                if self.failed:
+                    raise SpeculationFailed("speculative generation failed")
+                return
+            else:
+                await changed.wait()
+
+
+_speculations: Dict[str, _Speculation] = {}
+_reserved: Dict[str, Deque[Tuple[float, int]]] = {}
+
+
+def _reserve(session: str, cost: int) -> bool:
+    """Take ``cost`` tokens from ``session``'s speculation allowance for the current window."""
+    now = time.monotonic()
+    spent = _reserved.setdefault(session, deque())
+    while spent and spent[0][0] < now - WINDOW:
+        spent.popleft()
+    if sum(tokens for _, tokens in spent) + cost > SESSION_TOKENS:
+        return False
+    spent.append((now, cost))
+    return True
+
+
+def speculate(session: str, text: str, generate: Callable[[ChatRequest], AsyncIterator[str]]) -> int:
+    """Start the follow-up generations for brainstorm ``text``; return how many were started."""
+    if not ENABLED:
+        return 0
+    ideas = [_IDEA_LINE.sub("", line.strip()).strip() for line in text.split("\n") if line.strip()[:1].isdigit()]
+    if not ideas:
+        return 0
+    roadmap = load_agent("roadmap")
+    chats = [roadmap.build_request(idea) for idea in ideas if idea]
+    if CRITIC:
+        chats.append(load_agent("critic").build_request(text))
+    started = 0
+    for chat in chats:
+        key = chat.fingerprint()
+        if key in _speculations:
+            continue
+        if sum(not s.done for s in _speculations.values()) >= MAX_ACTIVE or not _reserve(session, request_cost(chat)):
+            SPECULATIONS.inc(agent=chat.agent, outcome="skipped")
+            continue
+        _speculations[key] = _Speculation(key, chat, generate)
+        SPECULATIONS.inc(agent=chat.agent, outcome="started")
+        started += 1
+    return started
+
+
+async def speculating(chunks: AsyncIterator[str], session: str,
+                      generate: Callable[[ChatRequest], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Pass a brainstorm's ``chunks`` through, then speculate on it if it completed."""
+    text = ""
+    async for content in chunks:
+        text += content
+        yield content
+    speculate(session, text, generate)
+
+
+async def claimed(chat: ChatRequest, source: Callable[[ChatRequest], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Stream ``chat`` from a matching speculative generation, or from ``source(chat)``."""
+    speculation: Optional[_Speculation] = None
+    if _speculations and chat.cache and not _speculating.get():
+        speculation = _speculations.get(chat.fingerprint())
+    if speculation is not None and not (speculation.done and speculation.failed):
+        if not speculation.claimed:
+            speculation.claimed = True
+            SPECULATIVE_HITS.inc(agent=chat.agent, state="finished" if speculation.done else "running")
+        sent = False
+        try:
+            async for content in speculation.follow():
+                sent = True
+                yield content
+            return
+        except SpeculationFailed:
+            if sent:
+                raise
+        # Nothing sent yet: generate it as this request, in its own lane
+    async for content in source(chat):
+        yield content
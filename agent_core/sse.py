@@ -0,0 +1,193 @@
+"""Resumable Server-Sent Events transport for agent streams.
+
+With ``"sse": true`` in the request body an agent answers ``text/event-stream``
+instead of plain text or NDJSON. Every chunk becomes one event whose id is
+``<stream id>:<sequence number>``:
+
+    retry: 2000
+
+    id: 9f2c4e1a7b3d5c60:1
+    event: delta
+    data: 1. Voice-to-SQL query builder
+
+    : ping
+
+    id: 9f2c4e1a7b3d5c60:2
+    event: done
+    data:
+
+The generation runs in a background producer that writes into a per-stream
+ring buffer, independent of the client connection. When the connection drops,
+the client reconnects to ``GET /streams/{stream id}`` with ``Last-Event-ID`` (or
+``?after=<n>``) and gets everything after that event, then the live tail,
+without a new upstream call. A stream nobody is reading is cancelled after
+``SSE_GRACE`` seconds, and a finished stream is kept for that long too. The
+producer holds the admission slot its first response was given until the
+generation ends, however often the client reconnects in between, so resumes
+are never admitted themselves.
+Comment heartbeats every ``SSE_HEARTBEAT`` seconds keep idle connections open
+through nginx while a 70B model is still thinking.
+
+Configuration (environment):
+    SSE_BUFFER_EVENTS  events kept per stream for resuming (default 2048)
+    SSE_GRACE          seconds a stream is kept without a reader (default 30)
+    SSE_HEARTBEAT      seconds of silence before a heartbeat (default 15)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from .metrics import Counter, Gauge
+
+BUFFER_EVENTS = int(os.getenv("SSE_BUFFER_EVENTS", "2048"))
+GRACE = float(os.getenv("SSE_GRACE", "30"))
+HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+RETRY_MS = 2000
+
+HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: pass events through as they are written
+}
+
+SSE_STREAMS = Gauge("sse_streams", "SSE streams held for resuming", ("agent",))
+SSE_RESUMES = Counter("sse_resumes_total", "Reconnections that resumed an SSE stream", ("agent", "outcome"))
+SSE_ABANDONED = Counter("sse_abandoned_total", "SSE generations cancelled after nobody resumed them",
+                        ("agent",))
+
+
+def _event(stream_id: str, seq: int, kind: str, data: str) -> str:
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"id: {stream_id}:{seq}\nevent: {kind}\n{lines}\n"
+
+
+class ReplayBuffer:
+    """The events of one stream, produced in the background and replayable from any event id."""
+
+    def __init__(self, stream_id: str, agent: str, chunks: AsyncIterator[str]):
+        self.stream_id = stream_id
+        self.agent = agent
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=BUFFER_EVENTS)
+        self.seq = 0
+        self.finished = False
+        self.readers = 0
+        self.changed = asyncio.Event()
+        self._chunks = chunks
+        self._expiry: Optional[asyncio.TimerHandle] = None
+        self._slot = None  # the admission claim the generation holds (see ``hold``)
+        self.task: Optional[asyncio.Future] = None
+        self._schedule_expiry()
+
+    def _append(self, kind: str, data: str):
+        self.seq += 1
+        self.events.append((self.seq, _event(self.stream_id, self.seq, kind, data)))
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def _produce(self, chunks: AsyncIterator[str]):
+        try:
+            async for content in chunks:
+                self._append("delta", content)
+            self._append("done", "")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._append("error", str(e) or type(e).__name__)
+        finally:
+            self.finished = True
+            try:
+                close = getattr(chunks, "aclose", None)
+                if close is not None:
+                    await close()
+            finally:
+                self.release()
+            if self.readers == 0:
+                self._schedule_expiry()
+
+    def hold(self, slot):
+        """Keep admission ``slot`` until the generation ends, not just while its first reader is connected."""
+        self._slot = slot
+
+    def release(self):
+        """Give back the admission slot now, if the stream holds one."""
+        if self._slot is not None:
+            self._slot.close()
+            self._slot = None
+
+    def _schedule_expiry(self):
+        if self._expiry is not None:
+            self._expiry.cancel()
+        self._expiry = asyncio.get_running_loop().call_later(GRACE, self._expire)
+
+    def _expire(self):
+        if self.readers:
+            return
+        if self.task is None:
+            self.release()
+            asyncio.ensure_future(self._chunks.aclose())  # never admitted, e.g. answered with a 429
+        elif not self.finished:
+            SSE_ABANDONED.inc(agent=self.agent)
+            self.task.cancel()
+        if _streams.pop(self.stream_id, None) is not None:
+            SSE_STREAMS.dec(agent=self.agent)
+
+    async def read(self, after: int = 0) -> AsyncIterator[str]:
+        """Yield the events after sequence number ``after``, then follow the stream to its end."""
+        self.readers += 1
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        if self.task is None:
+            # Started by the first reader, i.e. once the response has been admitted
+            self.task = asyncio.ensure_future(self._produce(self._chunks))
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if self.events and after < self.events[0][0] - 1:
+                # Older events have left the ring buffer; the client has to start over
+                yield _event(self.stream_id, after, "reset", "resume point no longer buffered")
+                return
+            while True:
+                changed = self.changed
+                pending = [(seq, text) for seq, text in self.events if seq > after]
+                if pending:
+                    after = pending[-1][0]
+                    yield "".join(text for _, text in pending)
+                elif self.finished:
+                    return
+                else:
+                    try:
+                        await asyncio.wait_for(changed.wait(), HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield ": ping\n\n"
+        finally:
+            self.readers -= 1
+            if self.readers == 0:
+                self._schedule_expiry()
+
+
+_streams: Dict[str, ReplayBuffer] = {}
+
+
+def open_stream(agent: str, chunks: AsyncIterator[str]) -> ReplayBuffer:
+    """Register a resumable stream of ``chunks``; it starts producing when it is first read."""
+    stream_id = os.urandom(8).hex()
+    buffer = _streams[stream_id] = ReplayBuffer(stream_id, agent, chunks)
+    SSE_STREAMS.inc(agent=agent)
+    return buffer
+
+
+def resume(stream_id: str, last_event_id: Optional[str]) -> Optional[AsyncIterator[str]]:
+    """Events after ``last_event_id`` of a buffered stream, or ``None`` if it is gone."""
+    buffer = _streams.get(stream_id)
+    if buffer is None:
+        SSE_RESUMES.inc(agent="", outcome="expired")
+        return None
+    after = 0
+    if last_event_id:
+        sid, _, seq = last_event_id.rpartition(":")
+        if sid == stream_id and seq.isdigit():
+            after = int(seq)
+    SSE_RESUMES.inc(agent=buffer.agent, outcome="resumed")
+    return buffer.read(after)
@@ -0,0 +1,36 @@
+"""The streaming entry point every agent calls.
+
+``stream_chat`` layers the shared behaviour over the raw provider stream in
+``providers.stream_completion``: a request that was speculatively prefetched
+is served from that generation (``speculation``), identical in-flight
+requests are coalesced onto one stream (``singleflight``), which is served from the response cache
+when possible (``cache``) and otherwise from the best provider route
+(``router``), within that provider's shared quota (``ratelimit``).
+"""
+from __future__ import annotations
+
+from typing import AsyncIterator
+
+from .cache import cached
+from .chat import ChatRequest
+from .providers import stream_completion
+from .ratelimit import limited
+from .router import routed
+from .singleflight import coalesced
+from .speculation import claimed
+
+__all__ = ["ChatRequest", "stream_chat"]
+
+
+def _provider_stream(chat: ChatRequest) -> AsyncIterator[str]:
+    return routed(chat, lambda attempt: limited(attempt, stream_completion))
+
+
+def _shared_stream(chat: ChatRequest) -> AsyncIterator[str]:
+    return coalesced(chat, lambda request: cached(request, _provider_stream))
+
+
+async def stream_chat(chat: ChatRequest) -> AsyncIterator[str]:
+    """Yield the content deltas for ``chat``, from a speculation, a shared flight, the cache or the provider."""
+    async for content in claimed(chat, _shared_stream):
+        yield content
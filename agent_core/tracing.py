@@ -0,0 +1,111 @@
+"""Lightweight trace spans propagated through W3C ``traceparent`` headers.
+
+``TraceMiddleware`` continues the trace named by an incoming ``traceparent``
+header (or starts one), opens a server span for the request and returns the
+span's ``traceparent`` on the response, so a client can pass it to the next
+agent it calls and a brainstorm -> critic -> roadmap flow shares one trace id.
+Code inside a request opens child spans with ``span()``; provider calls send
+the current ``traceparent`` upstream.
+
+Finished spans are kept in a bounded in-process buffer served by
+``GET /traces/{trace_id}``.
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+RECENT: Deque["Span"] = deque(maxlen=int(os.getenv("TRACE_BUFFER_SPANS", "4096")))
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: os.urandom(8).hex())
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    end: Optional[float] = None
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start": self.start,
+            "duration_ms": None if self.end is None else round((self.end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("agent_core_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Run the block in a child span of the current one (or of ``traceparent``)."""
+    parent = _current.get()
+    match = _TRACEPARENT.match(traceparent or "")
+    if match:
+        trace_id, parent_id = match.groups()
+    elif parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+    current = Span(name, trace_id, parent_id=parent_id, attributes=dict(attributes))
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.end = time.time()
+        _current.reset(token)
+        RECENT.append(current)
+
+
+def spans_for(trace_id: str) -> List[dict]:
+    return [s.as_dict() for s in list(RECENT) if s.trace_id == trace_id]
+
+
+class TraceMiddleware:
+    """ASGI middleware opening a server span per HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or ())
+        incoming = headers.get(b"traceparent", b"").decode("latin-1")
+        with span(f"{scope['method']} {scope['path']}", incoming) as server:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    server.attributes["status"] = message["status"]
+                    message = dict(message, headers=[*message.get("headers", ()),
+                                                     (b"traceparent", server.traceparent.encode())])
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
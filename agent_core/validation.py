@@ -0,0 +1,168 @@
+"""Validation of numbered-list output line by line, while it streams.
+
+``PhraseMatcher`` is an Aho-Corasick automaton over word tokens, built once
+from a list of forbidden phrases, that finds any of them in a line in one pass
+regardless of how many phrases there are. Tokens are lower-cased and lightly
+stemmed (a trailing plural "s" is dropped), so "Note-taking apps" also catches
+"note taking app", and phrases only match on whole words.
+
+``LineValidator`` checks one list item against a persona's matcher and a
+word-count range and counts every line checked and every violation per agent
+and persona, so violation rates can be read off ``/metrics``:
+
+    output_violations_total / output_lines_checked_total
+"""
+from __future__ import annotations
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metrics import Counter
+
+LINES_CHECKED = Counter("output_lines_checked_total", "Output lines validated while streaming",
+                        ("agent", "persona"))
+VIOLATIONS = Counter("output_violations_total", "Output lines that failed validation, by kind",
+                     ("agent", "persona", "kind"))
+EARLY_ABORTS = Counter("output_early_aborts_total",
+                       "Upstream streams closed early because the rest of the output was already rejected",
+                       ("agent", "persona"))
+
+Violation = Tuple[str, str]  # (kind, detail), e.g. ("forbidden", "mental health")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_FORBIDDEN_ITEM = re.compile(r"❌\s*([^❌\n]+)")
+_PARENTHESES = re.compile(r"\([^)]*\)")
+
+
+def tokens(text: str) -> List[str]:
+    return [token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+            for token in _TOKEN.findall(text.lower())]
+
+
+def forbidden_phrases(text: str) -> List[str]:
+    """The phrases of every ``❌ item`` in a prompt.
+
+    Alternatives separated by "/" share the last one's trailing words when the
+    others are single words ("Recipe/vegan/cooking apps" forbids recipe apps,
+    vegan apps and cooking apps); otherwise each alternative stands alone.
+    Single words are never forbidden on their own: a bare "therapy" or
+    "writing" (from "Mental health/meditation/therapy" or "Freelance
+    design/writing") would reject far more ideas than the prompt means to.
+    """
+    phrases: List[str] = []
+    for item in _FORBIDDEN_ITEM.findall(text):
+        parts = [part.strip() for part in _PARENTHESES.sub("", item).split("/") if part.strip()]
+        last = parts[-1].split() if parts else []
+        shared = " ".join(last[1:]) if len(last) > 1 and all(len(p.split()) == 1 for p in parts[:-1]) else ""
+        for i, part in enumerate(parts):
+            phrase = f"{part} {shared}" if shared and i < len(parts) - 1 else part
+            if len(phrase.split()) > 1:
+                phrases.append(phrase)
+    return phrases
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over word tokens."""
+
+    def __init__(self, phrases: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]  # the longest phrase ending at each state
+        for phrase in phrases:
+            self._add(phrase)
+        self._link()
+
+    def _add(self, phrase: str):
+        words = tokens(phrase)
+        if not words:
+            return
+        state = 0
+        for word in words:
+            following = self._goto[state].get(word)
+            if following is None:
+                following = self._goto[state][word] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = following
+        self._output[state] = phrase.strip().lower()
+
+    def _link(self):
+        # Breadth-first, so every state's failure target is settled before its children's
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[child] = target if target != child else 0
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+
+    def find(self, text: str) -> Optional[str]:
+        """The first forbidden phrase in ``text``, or ``None``."""
+        return self.find_tokens(tokens(text))
+
+    def find_tokens(self, words: List[str]) -> Optional[str]:
+        state = 0
+        for word in words:
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            if self._output[state] is not None:
+                return self._output[state]
+        return None
+
+    def __len__(self) -> int:
+        return sum(output is not None for output in self._output)
+
+
+class LineValidator:
+    """Checks list items for one agent and persona, counting what it finds."""
+
+    def __init__(self, agent: str, persona: str, matcher: PhraseMatcher, min_words: int, max_words: int):
+        self.agent = agent
+        self.persona = persona
+        self.matcher = matcher
+        self.min_words = min_words
+        self.max_words = max_words
+
+    def check(self, item: str) -> Optional[Violation]:
+        """Validate one complete item (without its number)."""
+        LINES_CHECKED.inc(agent=self.agent, persona=self.persona)
+        violation = self._violation(tokens(item), len(item.split()), complete=True)
+        if violation is not None:
+            self.note(violation[0])
+        return violation
+
+    def check_partial(self, text: str) -> Optional[Violation]:
+        """A violation an unfinished item already has, whatever else it goes on to say.
+
+        The last word may still be cut off, so it is left out. A violation found
+        here is counted, since the item will not be checked again.
+        """
+        words = text.split()[:-1]
+        violation = self._violation(tokens(" ".join(words)), len(words), complete=False)
+        if violation is not None:
+            LINES_CHECKED.inc(agent=self.agent, persona=self.persona)
+            self.note(violation[0])
+        return violation
+
+    def _violation(self, words: List[str], count: int, complete: bool) -> Optional[Violation]:
+        phrase = self.matcher.find_tokens(words)
+        if phrase is not None:
+            return ("forbidden", phrase)
+        if count > self.max_words or (complete and count < self.min_words):
+            return ("words", str(count))
+        return None
+
+    def note(self, kind: str):
+        """Count a violation the caller found itself (e.g. in the numbering)."""
+        VIOLATIONS.inc(agent=self.agent, persona=self.persona, kind=kind)
+
+    def aborted(self):
+        EARLY_ABORTS.inc(agent=self.agent, persona=self.persona)
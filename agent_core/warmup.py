@@ -0,0 +1,152 @@
+"""Warm start: provider connections are opened before the first user request, and ``/ready`` says when.
+
+Importing an agent no longer loads the OpenAI SDK, which was about half of its
+import time, so the process starts serving sooner. The startup phase then does
+the work the first user request used to pay for, in the background:
+
+* the SDK is imported in a worker thread, so ``/live`` keeps answering;
+* every configured provider (one whose API key is set) gets its pooled client,
+  and ``WARMUP_CONNECTIONS`` concurrent ``GET /models`` calls open that many
+  keep-alive connections (TCP and TLS) and run the client's lazy set-up. The
+  call costs no tokens and doubles as the provider's probe.
+
+A provider answers the probe with any HTTP response except a 401, a 403 or a
+5xx; one that does not is probed again every ``WARMUP_RETRY`` seconds.
+
+``GET /live`` answers 200 whenever the process is serving. ``GET /ready``
+answers 503 until every configured provider has answered its probe, and again
+once shutdown has begun, so load balancers and start-up scripts only send
+traffic to a warm process. One provider being down must not keep the process
+out of rotation, though: every agent can fail over to the other provider (see
+``router``), so after ``WARMUP_MAX_WAIT`` seconds the process is ready as soon
+as at least one provider is warm. The lagging ones are still probed in the
+background and listed under ``degraded`` in the ``/ready`` body until they
+answer. See ``provider_warm`` and ``warmup_seconds``.
+
+Configuration (environment):
+    WARMUP              "0" skips the probes; /ready answers once the app has started (default "1")
+    WARMUP_CONNECTIONS  connections opened to each provider (default 4)
+    WARMUP_TIMEOUT      seconds one probe may take (default 5.0)
+    WARMUP_RETRY        seconds before a provider that failed its probe is probed again (default 2.0)
+    WARMUP_MAX_WAIT     seconds to wait for every provider before one warm provider is enough (default 30)
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from .metrics import Gauge
+from .providers import PROVIDERS, Provider, get_client
+
+ENABLED = os.getenv("WARMUP", "1") != "0"
+CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "5.0"))
+RETRY = float(os.getenv("WARMUP_RETRY", "2.0"))
+MAX_WAIT = float(os.getenv("WARMUP_MAX_WAIT", "30"))
+
+PROVIDER_WARM = Gauge("provider_warm", "1 once a provider's connections are open and it answered its probe",
+                      ("provider",))
+WARMUP_SECONDS = Gauge("warmup_seconds", "Seconds from process start until it was ready")
+
+logger = logging.getLogger("agent_core.warmup")
+
+_STARTED = time.monotonic()
+_providers: Dict[str, str] = {}  # configured provider -> "warming" | "ready" | why its last probe failed
+_task: Optional[asyncio.Task] = None
+_ready = False
+_ready_after: Optional[float] = None
+
+
+def configured() -> Dict[str, Provider]:
+    """The providers this process can call: those with an API key."""
+    return {name: provider for name, provider in PROVIDERS.items() if provider.api_key}
+
+
+async def _probe(name: str) -> Optional[str]:
+    """Open the provider's connections; ``None`` if it answered, else why not."""
+    from openai import APIStatusError
+
+    client = get_client(name).with_options(timeout=TIMEOUT, max_retries=0)  # shares the pooled connections
+    results = await asyncio.gather(*(client.models.list() for _ in range(max(1, CONNECTIONS))),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, APIStatusError) and result.status_code < 500 and result.status_code not in (401, 403):
+            continue  # e.g. a provider without /models: reachable all the same
+        if isinstance(result, BaseException):
+            return f"{type(result).__name__}: {result}"
+    return None
+
+
+async def _warm_provider(name: str):
+    while True:
+        failure = await _probe(name)
+        if failure is None:
+            _providers[name] = "ready"
+            PROVIDER_WARM.set(1, provider=name)
+            return
+        _providers[name] = failure
+        logger.warning("provider probe failed; retrying", extra={"provider": name, "error": failure})
+        await asyncio.sleep(RETRY)
+
+
+async def _warm():
+    global _ready, _ready_after
+    probes = []
+    if ENABLED and _providers:
+        await asyncio.to_thread(importlib.import_module, "openai")
+        probes = [asyncio.ensure_future(_warm_provider(name)) for name in _providers]
+        _, pending = await asyncio.wait(probes, timeout=MAX_WAIT)
+        if len(pending) == len(probes):
+            # Nothing to fail over to yet: wait for the first provider that answers
+            _, pending = await asyncio.wait(probes, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            logger.warning("ready with degraded providers", extra={"providers": _degraded()})
+    _ready = True
+    _ready_after = time.monotonic() - _STARTED
+    WARMUP_SECONDS.set(_ready_after)
+    try:
+        await asyncio.gather(*probes)  # the lagging providers keep being probed
+    finally:
+        for probe in probes:
+            probe.cancel()
+
+
+def _degraded():
+    return sorted(name for name, state in _providers.items() if state != "ready")
+
+
+def start_warmup():
+    """Start warming the configured providers (once per process; later calls are no-ops)."""
+    global _task
+    if _task is None:
+        for name in configured():
+            _providers[name] = "warming"
+            PROVIDER_WARM.set(0, provider=name)
+        _task = asyncio.ensure_future(_warm())
+
+
+async def stop_warmup():
+    """Report not ready from now on (called when shutdown begins)."""
+    global _task, _ready
+    _ready = False
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+def ready() -> bool:
+    return _ready
+
+
+def status() -> dict:
+    body = {"status": "ready" if _ready else "warming", "providers": dict(_providers)}
+    if _ready:
+        body["startup_seconds"] = round(_ready_after, 3)
+        if _degraded():
+            body["degraded"] = _degraded()
+    return body
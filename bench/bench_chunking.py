@@ -0,0 +1,115 @@
+"""Socket writes, HTTP chunks and wire bytes per stream with and without coalescing.
+
+Starts the fake provider and one agent three times (coalescing off, coalescing
+on, coalescing plus gzip) and streams the same prompts through each, reading
+the raw HTTP/1.1 response off the socket so the chunk framing and compressed
+size are what actually crossed the wire. Socket writes are counted as the TCP
+segments sent on the host (``/proc/net/snmp`` OutSegs; Linux only, shown as
+"-" elsewhere): uvicorn disables Nagle, so each send() of a chunk is one
+segment on loopback. The count includes the fake provider's leg, which is the
+same in every configuration, so only the difference between rows matters.
+
+    python bench/bench_chunking.py --agent critic --tokens-per-sec 400
+"""
+import argparse
+import json
+import socket
+import time
+from urllib.parse import urlsplit
+
+from harness import AGENTS, percentile, provider_env, start_agent, start_fake_provider, stop
+
+CONFIGS = (
+    ("per-token", {"COALESCE": "0"}, None),
+    ("coalesced", {"COALESCE": "1"}, None),
+    ("coalesced+gzip", {"COALESCE": "1", "STREAM_COMPRESSION": "gzip"}, "gzip"),
+)
+
+
+def tcp_segments_sent():
+    try:
+        with open("/proc/net/snmp") as f:
+            header, values = [line.split() for line in f if line.startswith("Tcp:")][:2]
+        return int(values[header.index("OutSegs")])
+    except (OSError, ValueError):
+        return None
+
+
+def read_response(sock):
+    """Read one ``Connection: close`` response; return (wire bytes, chunks, seconds to first chunk)."""
+    start = time.perf_counter()
+    raw, ttfc = b"", None
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        raw += data
+        if ttfc is None and b"\r\n\r\n" in raw and len(raw) > raw.index(b"\r\n\r\n") + 4:
+            ttfc = time.perf_counter() - start
+    body = raw[raw.index(b"\r\n\r\n") + 4:]
+    chunks = 0
+    while body:
+        size_line, _, body = body.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        chunks += 1
+        body = body[size + 2:]
+    return len(raw), chunks, ttfc
+
+
+def one_stream(url, route, prompt, encoding):
+    parts = urlsplit(url)
+    payload = json.dumps({"prompt": prompt}).encode()
+    request = (f"POST {route} HTTP/1.1\r\nHost: {parts.netloc}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(payload)}\r\nConnection: close\r\n"
+               + (f"Accept-Encoding: {encoding}\r\n" if encoding else "") + "\r\n").encode() + payload
+    with socket.create_connection((parts.hostname, parts.port)) as sock:
+        sock.sendall(request)
+        return read_response(sock)
+
+
+def bench(agent, provider_url, extra_env, encoding, args):
+    env = provider_env(provider_url)
+    env.update(extra_env)
+    proc, url = start_agent(agent, provider_url, env=env)
+    try:
+        one_stream(url, AGENTS[agent][1], "warm-up", encoding)
+        before = tcp_segments_sent()
+        results = [one_stream(url, AGENTS[agent][1], f"chunking bench {time.time()} {i}", encoding)
+                   for i in range(args.requests)]
+        after = tcp_segments_sent()
+    finally:
+        stop(proc)
+    return {
+        "segments": None if before is None else (after - before) / args.requests,
+        "chunks": sum(r[1] for r in results) / len(results),
+        "bytes": sum(r[0] for r in results) / len(results),
+        "ttfc_p50": percentile([r[2] for r in results if r[2] is not None], 50),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent", default="critic", choices=sorted(AGENTS))
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--ttft-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-sec", type=float, default=400)
+    parser.add_argument("--tokens", type=int, default=300)
+    args = parser.parse_args()
+
+    provider, provider_url = start_fake_provider(args.ttft_ms, args.tokens_per_sec, args.tokens)
+    try:
+        print(f"{args.agent}: {args.tokens} tokens at {args.tokens_per_sec:.0f} tok/s, "
+              f"{args.requests} sequential streams")
+        print(f"{'':>15} {'segments/stream':>16} {'chunks':>8} {'wire bytes':>11} {'ttfc p50':>9}")
+        for name, extra_env, encoding in CONFIGS:
+            r = bench(args.agent, provider_url, extra_env, encoding, args)
+            segments = "-" if r["segments"] is None else f"{r['segments']:.1f}"
+            print(f"{name:>15} {segments:>16} {r['chunks']:>8.1f} {r['bytes']:>11.0f} {r['ttfc_p50']:>9.3f}")
+    finally:
+        stop(provider)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Tail latency and error rate of an agent behind the provider router.
+
+Runs two fake providers, a primary with a slow tail and/or injected errors and
+a healthy secondary, and drives one agent with and without hedged requests:
+
+    python bench/bench_router.py --agent critic --slow-fraction 0.1 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from harness import AGENTS, percentile, provider_env, start_agent, start_fake_provider, stop
+
+
+async def one_stream(client, url, prompt):
+    start = time.perf_counter()
+    ttft, text = None, ""
+    async with client.stream("POST", url, json={"prompt": prompt}) as response:
+        async for chunk in response.aiter_text():
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            text += chunk
+    return ttft, text.startswith("Error")
+
+
+async def drive(url, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=300) as client:
+        async def run(i):
+            async with semaphore:
+                return await one_stream(client, url, f"router bench {time.time()} {i}")
+        return await asyncio.gather(*(run(i) for i in range(requests)))
+
+
+def bench(agent, primary_url, secondary_url, hedge, args):
+    env = provider_env(primary_url, secondary_url)
+    if agent == "tasks":  # Cerebras is the task agent's primary
+        env = provider_env(secondary_url, primary_url)
+    env.update({"ROUTER_HEDGE": "1" if hedge else "0", "ROUTER_HEDGE_DELAY": str(args.hedge_delay)})
+    proc, url = start_agent(agent, primary_url, env=env)
+    try:
+        results = asyncio.run(drive(url + AGENTS[agent][1], args.requests, args.concurrency))
+    finally:
+        stop(proc)
+    ttfts = [r[0] for r in results if r[0] is not None]
+    return {
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "ttft_p99": percentile(ttfts, 99),
+        "errors": sum(1 for r in results if r[1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent", default="critic", choices=sorted(AGENTS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--slow-ttft-ms", type=float, default=4000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hedge-delay", type=float, default=1.0,
+                        help="hedge deadline before the router has a p95 (seconds)")
+    args = parser.parse_args()
+
+    primary, primary_url = start_fake_provider(
+        args.ttft_ms, 200, 60, extra_args=("--slow-fraction", str(args.slow_fraction),
+                                          "--slow-ttft-ms", str(args.slow_ttft_ms),
+                                          "--error-rate", str(args.error_rate)))
+    secondary, secondary_url = start_fake_provider(args.ttft_ms, 200, 60)
+    try:
+        print(f"primary: ttft={args.ttft_ms}ms, {args.slow_fraction:.0%} at {args.slow_ttft_ms}ms, "
+              f"{args.error_rate:.0%} errors; {args.requests} requests, {args.concurrency} concurrent")
+        print(f"{'':>10} {'ttft p50':>9} {'ttft p95':>9} {'ttft p99':>9} {'errors':>7}")
+        for hedge in (False, True):
+            r = bench(args.agent, primary_url, secondary_url, hedge, args)
+            print(f"{'hedged' if hedge else 'unhedged':>10} {r['ttft_p50']:>9.3f} {r['ttft_p95']:>9.3f} "
+                  f"{r['ttft_p99']:>9.3f} {r['errors']:>7}")
+    finally:
+        stop(primary, secondary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""End-to-end latency of sectioned generation against the single-call path.
+
+Starts the fake provider and the critic or pitch deck agent, and streams the
+same prompts with ``"sectioned": false`` and ``"sectioned": true``. Reports
+time to first chunk, the time the last section (``⚡ IDEA 3`` / ``SLIDE 8``)
+started arriving, and time to the end of the stream. The fake provider answers
+a per-idea or per-slide-group call with just that section, so a section costs
+the same number of tokens either way.
+
+    python bench/bench_sections.py --agent pitchdeck --tokens-per-sec 40
+"""
+import argparse
+import re
+import statistics
+import time
+
+import httpx
+
+import canned
+from harness import AGENTS, percentile, provider_env, start_agent, start_fake_provider, stop
+
+LAST_SECTION = {"critic": re.compile(r"IDEA 3\b"), "pitchdeck": re.compile(r"SLIDE 8\b")}
+
+
+def prompt_for(agent: str, i: int) -> str:
+    if agent == "critic":
+        return canned.brainstorm()  # random, so no two requests share a flight
+    return f"Business idea: {canned.single_idea()}\nRoadmap: four phases, request {i}"
+
+
+def one_stream(client: httpx.Client, url: str, agent: str, prompt: str, sectioned: bool):
+    start = time.perf_counter()
+    text, first, last_section = "", None, None
+    with client.stream("POST", url + AGENTS[agent][1], json={"prompt": prompt, "sectioned": sectioned}) as response:
+        response.raise_for_status()
+        for content in response.iter_text():
+            if first is None:
+                first = time.perf_counter() - start
+            text += content
+            if last_section is None and LAST_SECTION[agent].search(text):
+                last_section = time.perf_counter() - start
+    return first, last_section, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent", default="critic", choices=sorted(LAST_SECTION))
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=40)
+    parser.add_argument("--concurrency", type=int, default=4, help="SECTION_CONCURRENCY")
+    args = parser.parse_args()
+
+    provider, provider_url = start_fake_provider(args.ttft_ms, args.tokens_per_sec, 4000)
+    env = provider_env(provider_url)
+    env.update(SECTION_CONCURRENCY=str(args.concurrency))
+    agent, url = start_agent(args.agent, provider_url, env=env)
+    try:
+        print(f"{args.agent}: ttft {args.ttft_ms:.0f} ms, {args.tokens_per_sec:.0f} tok/s, "
+              f"{args.requests} sequential streams, section concurrency {args.concurrency}")
+        print(f"{'':>10} {'ttfc p50':>9} {'last section p50':>17} {'end p50':>8} {'end p95':>8}")
+        with httpx.Client(timeout=None) as client:
+            one_stream(client, url, args.agent, prompt_for(args.agent, -1), False)  # warm-up
+            totals = {}
+            for name, sectioned in (("single", False), ("sectioned", True)):
+                results = [one_stream(client, url, args.agent, prompt_for(args.agent, i), sectioned)
+                           for i in range(args.requests)]
+                ends = [r[2] for r in results]
+                totals[name] = statistics.median(ends)
+                print(f"{name:>10} {percentile([r[0] for r in results], 50):>9.3f} "
+                      f"{percentile([r[1] for r in results if r[1] is not None], 50):>17.3f} "
+                      f"{percentile(ends, 50):>8.3f} {percentile(ends, 95):>8.3f}")
+        print(f"end-to-end speed-up: {totals['single'] / totals['sectioned']:.2f}x")
+    finally:
+        stop(agent, provider)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Cold-start time and resident memory: five uvicorn processes vs. the agent host.
+
+The five-process layout is started the way the old ``start.sh`` did it (one
+uvicorn per agent with ``sleep 2`` between them), and also all at once, to show
+both the scripted delay and the real readiness time. Every layout is timed
+until ``GET /ready`` answers (provider connections warm). RSS is summed over each layout's process tree.
+
+    python bench/bench_startup.py --workers 1
+"""
+import argparse
+import os
+import sys
+import time
+
+from harness import (AGENT_SPECS, free_port, provider_env, spawn, start_fake_provider,
+                     start_host, stop, wait_http)
+
+LEGACY_SLEEPS = (2, 2, 2, 2, 3)
+
+
+def tree_rss_kb(root_pid: int) -> int:
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, ()))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def start_five(env, scripted: bool):
+    start = time.perf_counter()
+    procs, urls = [], []
+    for spec, pause in zip(AGENT_SPECS, LEGACY_SLEEPS):
+        port = free_port()
+        procs.append(spawn([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                            "--port", str(port), "--log-level", "warning"],
+                           env=env, cwd=os.path.join(os.path.dirname(__file__), "..", spec.directory)))
+        urls.append(f"http://127.0.0.1:{port}/ready")
+        if scripted:
+            time.sleep(pause)
+    for url in urls:
+        wait_http(url)
+    return procs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait before sampling RSS")
+    args = parser.parse_args()
+
+    fake, provider_url = start_fake_provider()
+    env = provider_env(provider_url)
+    rows = []
+    try:
+        for label, scripted in (("5 x uvicorn, start.sh sleeps", True), ("5 x uvicorn, parallel", False)):
+            procs, seconds = start_five(env, scripted)
+            time.sleep(args.settle)
+            rows.append((label, seconds, sum(tree_rss_kb(p.pid) for p in procs)))
+            stop(*procs)
+        proc, _, seconds = start_host(env, args.workers)
+        time.sleep(args.settle)
+        rows.append((f"agent host, {args.workers} worker(s)", seconds, tree_rss_kb(proc.pid)))
+        stop(proc)
+    finally:
+        stop(fake)
+
+    print(f"{'layout':<32} {'ready s':>8} {'RSS MiB':>8}")
+    for label, seconds, rss in rows:
+        print(f"{label:<32} {seconds:>8.2f} {rss / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
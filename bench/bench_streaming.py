@@ -0,0 +1,105 @@
+"""TTFT and throughput of one agent at increasing stream concurrency.
+
+Starts the local fake provider and one agent, then opens 1, 10 and 100
+concurrent streams against it. ``--baseline REV`` also runs the agent as it was
+at git revision REV (its hard-coded provider URL rewritten to the fake) so the
+blocking and non-blocking cores can be compared side by side.
+
+    python bench/bench_streaming.py --agent critic --baseline 90704c5
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from harness import AGENTS, ROOT, percentile, start_agent, start_fake_provider, stop
+
+
+async def one_stream(client, url, prompt):
+    start = time.perf_counter()
+    ttft, chars = None, 0
+    async with client.stream("POST", url, json={"prompt": prompt}) as response:
+        async for text in response.aiter_text():
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chars += len(text)
+    return ttft, time.perf_counter() - start, chars
+
+
+async def run_level(url, concurrency):
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(one_stream(client, url, f"bench idea {i}") for i in range(concurrency)))
+        wall = time.perf_counter() - start
+    ttfts = [r[0] for r in results]
+    chars = sum(r[2] for r in results)
+    return {
+        "concurrency": concurrency,
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "ttft_max": max(ttfts),
+        "wall": wall,
+        "streams_per_s": concurrency / wall,
+        "chars_per_s": chars / wall,
+    }
+
+
+def baseline_dir(rev, directory, provider_url):
+    source = subprocess.check_output(["git", "show", f"{rev}:{directory}/main.py"], cwd=ROOT, text=True)
+    for url in ("https://openrouter.ai/api/v1", "https://api.cerebras.ai/v1"):
+        source = source.replace(url, provider_url)
+    path = tempfile.mkdtemp(prefix="bench-baseline-")
+    with open(os.path.join(path, "main.py"), "w") as f:
+        f.write(source)
+    return path
+
+
+def report(label, rows):
+    print(f"\n{label}")
+    print(f"{'streams':>8} {'ttft p50':>9} {'ttft p95':>9} {'ttft max':>9} {'wall s':>7} {'streams/s':>10} {'chars/s':>9}")
+    for r in rows:
+        print(f"{r['concurrency']:>8} {r['ttft_p50']:>9.3f} {r['ttft_p95']:>9.3f} {r['ttft_max']:>9.3f} "
+              f"{r['wall']:>7.2f} {r['streams_per_s']:>10.1f} {r['chars_per_s']:>9.0f}")
+
+
+def bench(agent, provider_url, levels, agent_dir=None):
+    # Older revisions may predate /ready
+    proc, url = start_agent(agent, provider_url, agent_dir=agent_dir, ready_path="/" if agent_dir else "/ready")
+    try:
+        route = url + AGENTS[agent][1]
+        return [asyncio.run(run_level(route, n)) for n in levels]
+    finally:
+        stop(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent", default="critic", choices=sorted(AGENTS))
+    parser.add_argument("--levels", default="1,10,100")
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--baseline", metavar="REV", help="also benchmark the agent at this git revision")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.levels.split(",")]
+
+    fake, provider_url = start_fake_provider(args.ttft_ms, args.tokens_per_sec, args.tokens, output="tokens")
+    try:
+        print(f"fake provider: ttft={args.ttft_ms}ms, {args.tokens_per_sec} tok/s, {args.tokens} tokens/stream")
+        if args.baseline:
+            legacy = baseline_dir(args.baseline, AGENTS[args.agent][0], provider_url)
+            report(f"{args.agent} @ {args.baseline} (blocking client)",
+                   bench(args.agent, provider_url, levels, agent_dir=legacy))
+        report(f"{args.agent} (async core)", bench(args.agent, provider_url, levels))
+    finally:
+        stop(fake)
+
+
+if __name__ == "__main__":
+    main()
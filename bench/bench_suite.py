@@ -0,0 +1,162 @@
+"""Load test of every agent endpoint and the brainstorm -> criticize chain.
+
+Starts the fake provider (canned output in each agent's format) and the agent
+host, then drives each scenario at every concurrency level and reports TTFT,
+inter-chunk latency, end-to-end time (p50/p95/p99) and throughput. Results can
+be saved as a named baseline and later runs compared against it:
+
+    python bench/bench_suite.py --levels 1,10,50 --save before
+    python bench/bench_suite.py --levels 1,10,50 --compare before
+
+Baselines live in ``bench/baselines/<name>.json``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from harness import AGENT_SPECS, percentile, provider_env, start_fake_provider, start_host, stop
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+PROMPTS = {
+    "brainstormer": "[PERSONA: hackathon]\nMy New Business Idea",
+    "critic": "1. Voice-to-SQL query builder\n2. Smart contract audit CLI\n3. Terminal theme marketplace",
+    "roadmap": "Voice-to-SQL query builder",
+    "tasks": "Phase 1: Foundation & Market Validation",
+    "pitchdeck": "Idea: Voice-to-SQL query builder\nRoadmap: Phase 1: MVP\nCritique: strong demand",
+}
+CHAIN = "brainstorm->criticize"
+
+
+class Sample:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.gaps = []
+        self.chars = 0
+        self._last = None
+        self.total = None
+        self.text = ""
+
+    def chunk(self, text: str):
+        now = time.perf_counter()
+        if self.ttft is None:
+            self.ttft = now - self.start
+        else:
+            self.gaps.append(now - self._last)
+        self._last = now
+        self.chars += len(text)
+        self.text += text
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+        return self
+
+
+async def stream(client, url, prompt, sample=None):
+    sample = sample or Sample()
+    async with client.stream("POST", url, json={"prompt": f"{prompt}\n[bench {time.time_ns()}]"}) as response:
+        async for text in response.aiter_text():
+            sample.chunk(text)
+    return sample
+
+
+async def chain(client, base):
+    """Brainstorm, then criticize its ideas; timed end to end like the frontend does it."""
+    sample = await stream(client, base + "/brainstorm", PROMPTS["brainstormer"])
+    return (await stream(client, base + "/criticize", sample.text, sample)).finish()
+
+
+async def run_scenario(base, name, route, concurrency, rounds):
+    async with httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=concurrency + 10)) as client:
+        async def one():
+            if name == CHAIN:
+                return await chain(client, base)
+            return (await stream(client, base + route, PROMPTS[name])).finish()
+
+        await one()  # warm the connection pools; not measured
+        start = time.perf_counter()
+        samples = []
+        for _ in range(rounds):
+            samples += await asyncio.gather(*(one() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    ttfts = [s.ttft for s in samples if s.ttft is not None]
+    gaps = [g for s in samples for g in s.gaps]
+    totals = [s.total for s in samples]
+    row = {"scenario": name, "concurrency": concurrency, "streams": len(samples),
+           "streams_per_s": len(samples) / wall, "chars_per_s": sum(s.chars for s in samples) / wall}
+    for label, values in (("ttft", ttfts), ("gap", gaps), ("total", totals)):
+        for pct in (50, 95, 99):
+            row[f"{label}_p{pct}"] = percentile(values, pct)
+    return row
+
+
+COLUMNS = ("ttft_p50", "ttft_p95", "ttft_p99", "gap_p50", "gap_p99", "total_p50", "total_p99",
+           "streams_per_s", "chars_per_s")
+
+
+def report(rows, baseline=None):
+    previous = {(r["scenario"], r["concurrency"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'scenario':<22} {'conc':>4} " + " ".join(f"{c:>13}" for c in COLUMNS))
+    for row in rows:
+        cells = []
+        old = previous.get((row["scenario"], row["concurrency"]))
+        for column in COLUMNS:
+            value = row[column]
+            cell = f"{value:.1f}" if column.endswith("_per_s") else f"{value * 1000:.0f}ms"
+            if old and old.get(column):
+                cell += f" {(value - old[column]) / old[column]:+.0%}"
+            cells.append(f"{cell:>13}")
+        print(f"{row['scenario']:<22} {row['concurrency']:>4} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,10,50")
+    parser.add_argument("--rounds", type=int, default=2, help="batches of <level> streams per scenario")
+    parser.add_argument("--scenarios", default=",".join([spec.name for spec in AGENT_SPECS] + [CHAIN]))
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--replay", metavar="PATH", help="serve recorded sessions from the fake provider")
+    parser.add_argument("--save", metavar="NAME", help="save the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="show changes against baseline NAME")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.levels.split(",")]
+    routes = {spec.name: spec.route for spec in AGENT_SPECS}
+
+    extra = ("--replay", os.path.abspath(args.replay)) if args.replay else ()
+    fake, provider_url = start_fake_provider(args.ttft_ms, args.tokens_per_sec, args.tokens, extra)
+    env = provider_env(provider_url)
+    # Keep benchmark ideas out of the real idea memory
+    env.update({"IDEA_MEMORY_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-ideas-"), "ideas.sqlite3")})
+    host, base, _ = start_host(env)
+    rows = []
+    try:
+        for name in args.scenarios.split(","):
+            for level in levels:
+                rows.append(asyncio.run(run_scenario(base, name, routes.get(name), level, args.rounds)))
+    finally:
+        stop(host, fake)
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINES, f"{args.compare}.json")) as f:
+            baseline = json.load(f)
+    print(f"fake provider: ttft={args.ttft_ms}ms, {args.tokens_per_sec} tok/s, <= {args.tokens} tokens/stream")
+    report(rows, baseline)
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(os.path.join(BASELINES, f"{args.save}.json"), "w") as f:
+            json.dump({"config": vars(args), "results": rows}, f, indent=2)
+        print(f"saved baseline {args.save!r}")
+
+
+if __name__ == "__main__":
+    main()
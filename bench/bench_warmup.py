@@ -0,0 +1,77 @@
+"""First-request latency of a freshly started agent, with and without the warm start.
+
+Starts the agent again for every run, against the fake provider, once with
+``WARMUP=0`` (the first request builds the provider client and opens its
+connection itself) and once with the warm-up (``/ready`` waits for the pooled
+connections and the provider probe). Reports time until ``/live`` and
+``/ready`` answer, time to first chunk of the first request, and of a second
+request on the same process for reference. The fake provider is plain HTTP on
+localhost, so a real provider's TLS handshakes come on top of the cold numbers.
+
+    python bench/bench_warmup.py --agent brainstormer --runs 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import httpx
+
+import canned
+from harness import (AGENTS, free_port, percentile, provider_env, spawn, start_fake_provider, stop,
+                     wait_http)
+
+
+def ttfc(client: httpx.Client, url: str, prompt: str) -> float:
+    start = time.perf_counter()
+    with client.stream("POST", url, json={"prompt": prompt}) as response:
+        response.raise_for_status()
+        for _ in response.iter_raw():
+            return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+def one_run(agent: str, env: dict):
+    directory, route = AGENTS[agent]
+    port = free_port()
+    start = time.perf_counter()
+    proc = spawn([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                  "--port", str(port), "--log-level", "warning"],
+                 env=env, cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", directory))
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_http(url + "/live", interval=0.005)
+        live = time.perf_counter() - start
+        wait_http(url + "/ready", interval=0.005)
+        ready = time.perf_counter() - start
+        with httpx.Client(timeout=None) as client:
+            first = ttfc(client, url + route, canned.single_idea())
+            second = ttfc(client, url + route, canned.single_idea())
+        return live, ready, first, second
+    finally:
+        stop(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent", default="brainstormer", choices=sorted(AGENTS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ttft-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    provider, provider_url = start_fake_provider(args.ttft_ms, 200, 400)
+    try:
+        print(f"{args.agent}: fake provider ttft {args.ttft_ms:.0f} ms, {args.runs} fresh starts each, medians")
+        print(f"{'':>6} {'live s':>7} {'ready s':>8} {'1st ttfc':>9} {'2nd ttfc':>9}")
+        for name, warmup in (("cold", "0"), ("warm", "1")):
+            env = provider_env(provider_url)
+            env.update(IDEA_MEMORY="0", WARMUP=warmup)
+            results = [one_run(args.agent, env) for _ in range(args.runs)]
+            print(f"{name:>6} " + " ".join(f"{percentile([r[i] for r in results], 50):>{w}.3f}"
+                                           for i, w in enumerate((7, 8, 9, 9))))
+    finally:
+        stop(provider)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Canned generations in each agent's output format, for the fake provider.
+
+The agent is recognised from its system prompt, and every answer is filled in
+at random so repeated requests differ (the brainstormer's idea memory would
+otherwise reject them all) while still parsing cleanly with ``agent_core.parsers``.
+"""
+import random
+import re
+
+_ADJECTIVES = ["Voice-driven", "Realtime", "Collaborative", "Privacy-first", "Offline", "Gamified",
+               "Serverless", "Decentralized", "Automated", "Visual", "Low-code", "Crowdsourced"]
+_THINGS = ["invoice reconciler", "API changelog tracker", "lab notebook", "menu translator",
+           "contract summarizer", "parking spot finder", "test flake detector", "quote builder",
+           "greenhouse monitor", "podcast clipper", "shift swap board", "warranty vault"]
+_AUDIENCES = ["freelancers", "small clinics", "indie game studios", "food trucks", "landlords",
+              "robotics clubs", "wedding planners", "open-source maintainers", "dentists", "farmers"]
+_POINTS = ["Clear demand from an underserved niche", "Cheap to build with existing APIs",
+           "Recurring revenue from day one", "Strong word-of-mouth loop", "Defensible data over time",
+           "Crowded market with loud incumbents", "Needs trust before customers pay",
+           "Sales cycle may be slow", "Distribution is the hard part", "Regulation varies by region"]
+
+
+def _idea() -> str:
+    return f"{random.choice(_ADJECTIVES)} {random.choice(_THINGS)} for {random.choice(_AUDIENCES)}"
+
+
+def brainstorm() -> str:
+    return "\n".join(f"{i}. {_idea()}" for i in (1, 2, 3))
+
+
+def single_idea(index: int = 1) -> str:
+    return f"{index}. {_idea()}"
+
+
+def critique(ideas=(1, 2, 3)) -> str:
+    blocks = []
+    for i in ideas:
+        strengths, challenges = random.sample(_POINTS[:5], 3), random.sample(_POINTS[5:], 3)
+        blocks.append(
+            f"⚡ IDEA {i}: {_idea()}\n\n💪 Strengths:\n" + "\n".join(f"- {s}" for s in strengths)
+            + "\n\n⚠️ Challenges:\n" + "\n".join(f"- {c}" for c in challenges)
+            + "\n\n💡 Recommendation:\nValidate with ten paying pilot customers before building more.")
+    return "\n\n\n".join(blocks)
+
+
+def roadmap() -> str:
+    titles = ["Foundation & Validation", "Core Product Build", "Launch & Feedback Loop", "Scale & Monetize"]
+    return "\n".join(
+        f"Phase {i}: {title} :: Ship the {random.choice(_THINGS)} milestone for the first cohort. "
+        f"Success metric: {random.randint(20, 500)} active users with {random.randint(40, 80)}% retention."
+        for i, title in enumerate(titles, 1))
+
+
+def tasks() -> str:
+    rows = [("🚀", "Set up project repository", "0.5-1", "Easy"),
+            ("🚀", "Configure linting tools", "1-2", "Easy"),
+            ("🎯", "Design database schema", "2-4", "Medium"),
+            ("🎯", "Implement authentication flow", "3-5", "Hard"),
+            ("🎯", "Build API endpoints", "2-3", "Medium"),
+            ("📈", "Add analytics tracking", "1-2", "Easy")]
+    return "\n".join(f"{emoji} {title} (Effort: {effort}h | Difficulty: {level}) - Keeps the "
+                     f"{random.choice(_THINGS)} on schedule" for emoji, title, effort, level in rows)
+
+
+def pitch_deck(slides=range(1, 9)) -> str:
+    titles = ["PROBLEM", "SOLUTION", "MARKET OPPORTUNITY", "PRODUCT/TECHNOLOGY", "BUSINESS MODEL",
+              "GO-TO-MARKET STRATEGY", "COMPETITIVE ADVANTAGE", "FUNDING & MILESTONES"]
+    return "\n\n".join(
+        f"SLIDE {i}: {titles[i - 1]}\n- {random.choice(_POINTS)}\n- Built for {random.choice(_AUDIENCES)}"
+        for i in slides)
+
+
+def for_messages(messages) -> str:
+    """The canned answer for a chat, chosen by the agent its system prompt belongs to."""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if "idea generator" in system:
+        regenerate = re.search(r"replace idea (\d+)", user)
+        return single_idea(int(regenerate.group(1))) if regenerate else brainstorm()
+    if "constructive critic" in system:
+        single = re.match(r"IDEA (\d+):", user)  # sectioned mode: one idea per call
+        return critique((int(single.group(1)),)) if single else critique()
+    if "roadmap architect" in system:
+        return roadmap()
+    if "project architect" in system:
+        return tasks()
+    if "pitch deck" in system:
+        group = re.search(r"Write ONLY (.+), in the required format", user)  # sectioned mode: a slide group
+        return pitch_deck([int(n) for n in re.findall(r"SLIDE (\d+)", group.group(1))]) if group else pitch_deck()
+    return brainstorm()
@@ -0,0 +1,178 @@
+"""A local stand-in for an OpenAI-compatible streaming provider.
+
+Speaks just enough of ``POST /v1/chat/completions`` (server-sent events) and
+``GET /v1/models`` (the agents' warm-up probe) for the agents' async clients, with a configurable time-to-first-token and token
+rate, so streaming performance can be measured without spending real tokens.
+A fraction of requests can be made slow (``--slow-fraction``/``--slow-ttft-ms``)
+or fail outright (``--error-rate``) to exercise the provider router.
+
+Output is either canned text in the calling agent's format (``--output canned``,
+see ``canned.py``) or numbered filler tokens (``--output tokens``). Real
+sessions can be captured and served back with their original timing:
+
+    python bench/fake_provider.py --port 9100 --ttft-ms 300 --tokens-per-sec 80
+    python bench/fake_provider.py --record sessions.jsonl --upstream https://openrouter.ai/api/v1
+    python bench/fake_provider.py --replay sessions.jsonl --replay-speed 2
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+import canned
+
+TTFT_MS = float(os.getenv("FAKE_TTFT_MS", "300"))
+TOKENS_PER_SEC = float(os.getenv("FAKE_TOKENS_PER_SEC", "80"))
+TOKENS = int(os.getenv("FAKE_TOKENS", "120"))
+SLOW_FRACTION = float(os.getenv("FAKE_SLOW_FRACTION", "0"))
+SLOW_TTFT_MS = float(os.getenv("FAKE_SLOW_TTFT_MS", "5000"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+OUTPUT = os.getenv("FAKE_OUTPUT", "canned")
+RECORD_PATH = os.getenv("FAKE_RECORD")
+UPSTREAM = os.getenv("FAKE_UPSTREAM")
+REPLAY_PATH = os.getenv("FAKE_REPLAY")
+REPLAY_SPEED = float(os.getenv("FAKE_REPLAY_SPEED", "1"))
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+_SESSION_NOISE = re.compile(r"\[Session: [^\]]*\]")
+_recordings = {}
+
+app = FastAPI()
+
+
+def _chunk(model: str, content=None, finish_reason=None) -> str:
+    delta = {"content": content} if content is not None else {}
+    payload = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def session_key(body: dict) -> str:
+    """Recording key: model and messages, minus the brainstormer's per-request seeds."""
+    messages = [dict(m, content=_SESSION_NOISE.sub("", m.get("content", ""))) for m in body.get("messages", [])]
+    material = json.dumps([body.get("model"), messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _tokens(body: dict, limit: int):
+    if OUTPUT == "tokens":
+        return [f"tok{i} " for i in range(limit)]
+    return _TOKEN.findall(canned.for_messages(body.get("messages", [])))[:limit]
+
+
+async def _stream(model: str, tokens):
+    slow = random.random() < SLOW_FRACTION
+    await asyncio.sleep((SLOW_TTFT_MS if slow else TTFT_MS) / 1000)
+    interval = 1 / TOKENS_PER_SEC if TOKENS_PER_SEC > 0 else 0
+    for token in tokens:
+        yield _chunk(model, token)
+        if interval:
+            await asyncio.sleep(interval)
+    yield _chunk(model, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+async def _replay(model: str, recorded):
+    previous = 0.0
+    for offset, content in recorded:
+        await asyncio.sleep(max(0.0, offset - previous) / REPLAY_SPEED)
+        previous = offset
+        yield _chunk(model, content)
+    yield _chunk(model, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+async def _record(body: dict, authorization: str):
+    """Relay one request to the real upstream, saving each delta with its offset."""
+    start, recorded = time.perf_counter(), []
+    headers = {"Authorization": authorization} if authorization else {}
+    async with httpx.AsyncClient(timeout=300) as client:
+        async with client.stream("POST", UPSTREAM.rstrip("/") + "/chat/completions",
+                                 json=body, headers=headers) as response:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                yield line + "\n\n"
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                choices = json.loads(line[6:]).get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    recorded.append((round(time.perf_counter() - start, 4), content))
+    if recorded:
+        with open(RECORD_PATH, "a") as f:
+            f.write(json.dumps({"key": session_key(body), "model": body.get("model"),
+                                "chunks": recorded}, ensure_ascii=False) + "\n")
+
+
+def _load_recordings(path: str):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                _recordings.setdefault(entry["key"], []).append(entry["chunks"])
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model", "created": 0, "owned_by": "bench"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake-model")
+    if not body.get("stream"):
+        return JSONResponse({"error": {"message": "only stream=true is supported"}}, status_code=400)
+    if RECORD_PATH and UPSTREAM:
+        return StreamingResponse(_record(body, request.headers.get("authorization", "")),
+                                 media_type="text/event-stream")
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"message": "injected upstream failure"}}, status_code=503)
+    recordings = _recordings.get(session_key(body))
+    if recordings:
+        return StreamingResponse(_replay(model, random.choice(recordings)), media_type="text/event-stream")
+    tokens = _tokens(body, min(TOKENS, body.get("max_tokens") or TOKENS))
+    return StreamingResponse(_stream(model, tokens), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=TTFT_MS)
+    parser.add_argument("--tokens-per-sec", type=float, default=TOKENS_PER_SEC)
+    parser.add_argument("--tokens", type=int, default=TOKENS, help="cap on tokens per stream")
+    parser.add_argument("--slow-fraction", type=float, default=SLOW_FRACTION)
+    parser.add_argument("--slow-ttft-ms", type=float, default=SLOW_TTFT_MS)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--output", choices=("canned", "tokens"), default=OUTPUT)
+    parser.add_argument("--record", metavar="PATH", default=RECORD_PATH,
+                        help="relay to --upstream and append every session to PATH")
+    parser.add_argument("--upstream", default=UPSTREAM, help="real provider base URL to record from")
+    parser.add_argument("--replay", metavar="PATH", default=REPLAY_PATH,
+                        help="serve sessions recorded in PATH (others fall back to --output)")
+    parser.add_argument("--replay-speed", type=float, default=REPLAY_SPEED)
+    args = parser.parse_args()
+    TTFT_MS, TOKENS_PER_SEC, TOKENS = args.ttft_ms, args.tokens_per_sec, args.tokens
+    SLOW_FRACTION, SLOW_TTFT_MS, ERROR_RATE = args.slow_fraction, args.slow_ttft_ms, args.error_rate
+    OUTPUT, RECORD_PATH, UPSTREAM = args.output, args.record, args.upstream
+    REPLAY_SPEED = args.replay_speed
+    if args.replay:
+        _load_recordings(args.replay)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
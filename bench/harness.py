@@ -0,0 +1,110 @@
+"""Process and timing helpers shared by the benchmark scripts."""
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent_core.registry import AGENTS as AGENT_SPECS  # noqa: E402
+
+# name: (directory, route)
+AGENTS = {spec.name: (spec.directory, spec.route) for spec in AGENT_SPECS}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def provider_env(provider_url: str, cerebras_url=None) -> dict:
+    """Environment that points every provider at a local fake (optionally one each)."""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "OPENROUTER_BASE_URL": provider_url,
+        "CEREBRAS_BASE_URL": cerebras_url or provider_url,
+        "OPENROUTER_API_KEY": "fake",
+        "CEREBRAS_API_KEY": "fake",
+        # The fake provider has no quotas, and the benchmarks measure the runtime rather than the limits
+        "OPENROUTER_RPM": "0", "OPENROUTER_TPM": "0", "CEREBRAS_RPM": "0", "CEREBRAS_TPM": "0",
+        "ADMISSION": "0",
+        # Every stream is generated: no cache replays (nor a persistent cache file) or coalesced followers
+        "RESPONSE_CACHE": "0", "SINGLE_FLIGHT": "0",
+    })
+    return env
+
+
+def spawn(args, env=None, cwd=None) -> subprocess.Popen:
+    return subprocess.Popen(args, env=env, cwd=cwd or ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_http(url: str, timeout: float = 30.0, interval: float = 0.02) -> float:
+    """Poll ``url`` until it answers 200; return the seconds it took."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        with contextlib.suppress(httpx.HTTPError):
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - start
+        time.sleep(interval)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def start_fake_provider(ttft_ms=300, tokens_per_sec=80, tokens=120, extra_args=(), output="canned"):
+    port = free_port()
+    proc = spawn([sys.executable, "bench/fake_provider.py", "--port", str(port),
+                  "--ttft-ms", str(ttft_ms), "--tokens-per-sec", str(tokens_per_sec),
+                  "--tokens", str(tokens), "--output", output, *extra_args])
+    url = f"http://127.0.0.1:{port}"
+    wait_http(f"{url}/docs")
+    return proc, f"{url}/v1"
+
+
+def start_agent(agent: str, provider_url: str, agent_dir=None, env=None, ready_path: str = "/ready"):
+    directory, _ = AGENTS[agent]
+    port = free_port()
+    proc = spawn([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                  "--port", str(port), "--log-level", "warning"],
+                 env=env or provider_env(provider_url),
+                 cwd=agent_dir or os.path.join(ROOT, directory))
+    url = f"http://127.0.0.1:{port}"
+    wait_http(url + ready_path)
+    return proc, url
+
+
+def start_host(env, workers: int = 1):
+    """Start ``agent_core.host``; return the process, its URL and seconds until ready."""
+    port = free_port()
+    env = dict(env, AGENT_HOST_PORT=str(port), AGENT_HOST_BIND="127.0.0.1",
+               AGENT_HOST_WORKERS=str(workers), AGENT_HOST_LOG_LEVEL="warning")
+    start = time.perf_counter()
+    proc = spawn([sys.executable, "-m", "agent_core.host"], env=env)
+    url = f"http://127.0.0.1:{port}"
+    wait_http(url + "/ready")
+    return proc, url, time.perf_counter() - start
+
+
+def stop(*procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
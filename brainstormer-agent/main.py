@@ -1,16 +1,39 @@
+import logging
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from pydantic import BaseModel
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
 import random
 import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import List, Optional
+from agent_core import ChatRequest, CompressionMiddleware, IdeaParser, TraceMiddleware, idea_memory, lifespan, ops_router, stream_chat, stream_failed, stream_response
+from agent_core.batch import BatchItem, BatchRequest, batch_response
+from agent_core.idea_memory import IDEA_DUPLICATES, signature, similarity
+from agent_core.reservoir import Reservoir
+from agent_core.sessions import new_node_id, node_prompt, recorded
+from agent_core.speculation import speculating
+from agent_core.validation import LineValidator, PhraseMatcher, forbidden_phrases
 
 class AgentRequest(BaseModel):
-    prompt: str
-
-app = FastAPI()
+    prompt: str = ""
+    structured: bool = False  # stream typed NDJSON events instead of raw text
+    sse: bool = False  # send the stream as resumable Server-Sent Events
+    speculate: bool = False  # prefetch the ideas' roadmaps in the background once the brainstorm is done
+    session: Optional[str] = None  # the canvas session: its node, and whose speculation allowance to use (default: the client address)
+    nodes: List[str] = []  # canvas node ids (or "<id>#<n>" items) to use as context (see agent_core.sessions)
+
+@asynccontextmanager
+async def brainstormer_lifespan(app):
+    if idea_memory is not None:
+        await idea_memory.load()  # so the very first prompt already gets its exclusions
+    async with lifespan(app):
+        reservoir.start()
+        yield
+        await reservoir.stop()
+
+app = FastAPI(lifespan=brainstormer_lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,14 +41,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent", "X-Stream-Id", "X-Node-Id"],
 )
+app.add_middleware(TraceMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.include_router(ops_router)
 
 @app.get("/")
 def root():
     return {"status": "ok", "agent": "Brainstormer Agent", "message": "Agent is running"}
 
-client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY"))
-
 # Persona-specific prompts
 STUDENT_PROMPT = """You are an EXPERT startup idea generator for COLLEGE STUDENTS with limited time, money, and experience.
 
@@ -202,79 +227,299 @@ Generate 3 COMPLETELY UNIQUE ideas that:
 
 BE BOLD. BE CREATIVE. BE SPECIFIC. AVOID THE OBVIOUS."""
 
-# This is the generic async generator function that yields the AI's response chunks
-async def stream_generator(prompt: str, model_identifier: str, system_prompt: str):
-    try:
-        # Add multiple sources of randomness to force unique generations
-        random_seed = int(time.time() * 1000000) % 1000000
-        random_variation = random.randint(1000, 9999)
-        
-        # Add variety triggers to force different thinking patterns
-        variety_triggers = [
-            "Think outside the box and avoid common startup ideas.",
-            "Be extremely creative and unique with these ideas.",
-            "Generate ideas from unusual angles and niches.",
-            "Focus on underserved markets and novel solutions.",
-            "Explore emerging trends and unconventional approaches.",
-            "Think of ideas that would surprise people.",
-            "Combine unexpected industries or technologies.",
-            "Avoid any ideas you've mentioned before - be completely fresh.",
-            "Challenge yourself to think of ideas nobody else would suggest.",
-            "Mix unusual combinations of industries and technologies.",
-        ]
-        
-        random_trigger = random.choice(variety_triggers)
-        
-        # Add explicit anti-repetition instruction
-        anti_repeat_note = "CRITICAL: Do NOT generate any of these ideas: AI Mental Health Chatbot, Blockchain Carbon Credit, GitHub Code Review Bot, Virtual Event Planning, Student Podcast, Campus Events, Resume Templates, Canva Templates."
-        
-        # Create highly varied prompt
-        varied_prompt = f"{prompt}\n\n{random_trigger}\n\n{anti_repeat_note}\n\n[Session: {random_seed}-{random_variation}]"
-        
-        stream = client.chat.completions.create(
-            model=model_identifier,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": varied_prompt},
-            ],
-            stream=True,
+MODEL = "meta-llama/llama-3.3-70b-instruct"
+FALLBACK_MODEL = "llama-3.3-70b"  # Same model on Cerebras, used when OpenRouter is slow or failing
+
+# Brainstorms are deliberately random, so they bypass the response cache unless opted in
+CACHE_BRAINSTORMS = os.getenv("BRAINSTORMER_CACHE", "0") == "1"
+
+VARIETY_TRIGGERS = [
+    "Think outside the box and avoid common startup ideas.",
+    "Be extremely creative and unique with these ideas.",
+    "Generate ideas from unusual angles and niches.",
+    "Focus on underserved markets and novel solutions.",
+    "Explore emerging trends and unconventional approaches.",
+    "Think of ideas that would surprise people.",
+    "Combine unexpected industries or technologies.",
+    "Avoid any ideas you've mentioned before - be completely fresh.",
+    "Challenge yourself to think of ideas nobody else would suggest.",
+    "Mix unusual combinations of industries and technologies.",
+]
+
+# Explicit anti-repetition instruction
+ANTI_REPEAT_NOTE = "CRITICAL: Do NOT generate any of these ideas: AI Mental Health Chatbot, Blockchain Carbon Credit, GitHub Code Review Bot, Virtual Event Planning, Student Podcast, Campus Events, Resume Templates, Canva Templates."
+
+# How many fresh ideas to request for one line before accepting a near-duplicate or invalid one
+REGENERATION_ATTEMPTS = 2
+
+PERSONA_PROMPTS = {
+    'student': STUDENT_PROMPT,
+    'entrepreneur': ENTREPRENEUR_PROMPT,
+    'hackathon': HACKATHON_PROMPT,
+}
+
+# Every idea line is checked for its numbering, length and the persona's forbidden list as it streams
+VALIDATE_IDEAS = os.getenv("BRAINSTORMER_VALIDATE", "1") != "0"
+IDEA_COUNT = 3
+# The prompts ask for 6-8 words; one word either side is still a usable idea and cheaper than a regeneration
+IDEA_WORDS = (int(os.getenv("BRAINSTORMER_MIN_WORDS", "5")), int(os.getenv("BRAINSTORMER_MAX_WORDS", "9")))
+ANTI_REPEAT_IDEAS = ANTI_REPEAT_NOTE.split(":", 1)[1].rstrip(".").split(",")
+
+# One forbidden-phrase automaton per persona, compiled once at startup
+VALIDATORS = {
+    persona: LineValidator("brainstormer", persona or "default",
+                           PhraseMatcher(forbidden_phrases(prompt) + ANTI_REPEAT_IDEAS), *IDEA_WORDS)
+    for persona, prompt in [*PERSONA_PROMPTS.items(), (None, DEFAULT_PROMPT)]
+}
+
+def parse_persona(prompt: str):
+    """Split an optional leading [PERSONA: ...] tag off the prompt."""
+    if prompt.startswith('[PERSONA:'):
+        persona_end = prompt.find(']')
+        return prompt[9:persona_end].strip().lower(), prompt[persona_end+1:].strip()
+    return None, prompt
+
+def tagged(item: BatchItem) -> str:
+    """A batch item's prompt, with its persona (if any) as the usual [PERSONA: ...] tag."""
+    return f"[PERSONA: {item.persona}]\n{item.prompt}" if item.persona else item.prompt
+
+def known_persona(persona):
+    """The persona whose prompt, validator and idea memory a tagged request uses (None for the default)."""
+    return persona if persona in PERSONA_PROMPTS else None
+
+def select_system_prompt(persona):
+    return PERSONA_PROMPTS.get(persona, DEFAULT_PROMPT)
+
+def persona_of(chat: ChatRequest):
+    """The persona a built request was made for: ``known_persona`` of its tag, read back off its system prompt."""
+    for persona, system_prompt in PERSONA_PROMPTS.items():
+        if chat.system_prompt == system_prompt:
+            return persona
+    return None
+
+def build_request(prompt: str) -> ChatRequest:
+    """Turn a (possibly persona-tagged) prompt into this agent's provider request."""
+    persona, user_prompt = parse_persona(prompt)
+    persona = known_persona(persona)
+    
+    # Add multiple sources of randomness to force unique generations
+    random_seed = int(time.time() * 1000000) % 1000000
+    random_variation = random.randint(1000, 9999)
+    
+    # Add a variety trigger to force different thinking patterns
+    random_trigger = random.choice(VARIETY_TRIGGERS)
+    
+    # Feed back what this persona was recently given, so the model steers clear of it
+    recent_ideas = idea_memory.recent(persona) if idea_memory is not None else []
+    exclusions = ""
+    if recent_ideas:
+        exclusions = "\n\nAlready suggested recently - do NOT repeat or rephrase any of these: " + "; ".join(recent_ideas)
+    
+    # Create highly varied prompt
+    varied_prompt = f"{user_prompt}\n\n{random_trigger}\n\n{ANTI_REPEAT_NOTE}{exclusions}\n\n[Session: {random_seed}-{random_variation}]"
+    
+    return ChatRequest(
+        agent="brainstormer",
+        model=MODEL,
+        fallbacks=(("cerebras", FALLBACK_MODEL),),
+        system_prompt=select_system_prompt(persona),
+        prompt=varied_prompt,
+        params=dict(
             temperature=1.0,  # Maximum creativity (2.0 causes instability)
             max_tokens=200,
             top_p=0.92,  # Slightly lower for more focused diversity
             frequency_penalty=2.0,  # ABSOLUTE MAXIMUM - penalizes repeating tokens
             presence_penalty=2.0,  # ABSOLUTE MAXIMUM - penalizes repeating topics
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
+        ),
+        stable_prompt=user_prompt,  # cache on the user's prompt, not the per-request seeds
+        cache=CACHE_BRAINSTORMS,
+    )
+
+async def regenerate_idea(chat: ChatRequest, index: int, exclusions):
+    """Ask for a single replacement idea numbered ``index`` that avoids ``exclusions``."""
+    avoid = "\n".join(f"- {idea}" for idea in exclusions)
+    retry = replace(
+        chat,
+        prompt=f"Give exactly ONE new idea to replace idea {index}. It must be unlike every one of these:\n{avoid}\n\n"
+               f"Output only this line:\n{index}. [Idea in 6-8 words]",
+        params={**chat.params, "max_tokens": 40},
+        stable_prompt=None,
+        cache=False,
+    )
+    text = "".join([content async for content in stream_chat(retry)])
+    for event in IdeaParser().feed(text + "\n"):
+        if event["type"] == "idea":
+            return event["text"]
+    return None
+
+async def checked_idea(chat: ChatRequest, persona, line: str, event: dict, expected: int, violation=None,
+                       remember=True) -> str:
+    """Return idea ``line`` as idea number ``expected``, regenerated if it is invalid or was already given.
+
+    ``violation`` is one already found while the line was still streaming; with
+    ``remember`` the settled idea goes into the persona's memory.
+    """
+    validator = VALIDATORS[persona] if VALIDATE_IDEAS else None
+    index, idea = event["index"], event["text"]
+    if validator is not None and index != expected:
+        validator.note("numbering")
+        index = expected
+    original = idea
+    for attempt in range(REGENERATION_ATTEMPTS + 1):
+        if violation is None and validator is not None:
+            violation = validator.check(idea)
+        match = idea_memory.find_similar(persona, idea) if violation is None and idea_memory is not None else None
+        if match is not None:
+            IDEA_DUPLICATES.inc(persona=persona or "default")
+        if (violation is None and match is None) or attempt == REGENERATION_ATTEMPTS:
+            break
+        # Steer the replacement away from whatever was wrong with this one
+        flagged = match[0] if match is not None else violation[1] if violation[0] == "forbidden" else idea
+        recent = idea_memory.recent(persona) if idea_memory is not None else []
+        idea = await regenerate_idea(chat, index, list(dict.fromkeys([flagged, *recent]))) or idea
+        violation = None
+    if remember and idea_memory is not None:
+        await idea_memory.remember(persona, idea)
+    return line if idea == original and index == event["index"] else f"{index}. {idea}"
+
+async def generate(chat: ChatRequest, remember=True):
+    """Stream the brainstorm, checking every idea line as soon as it is complete.
+
+    Ideas are released a whole line at a time so that one breaking the format or
+    the persona's forbidden list, or repeating an idea the persona was already
+    given, can be regenerated on its own before the client ever sees it. Once the
+    last idea is settled, including when it is already invalid half-way through,
+    the upstream stream is closed instead of being read to the end.
+
+    With ``remember=False`` (reservoir refills) the ideas are checked against the
+    memory but only remembered once they are actually served.
+    """
+    if idea_memory is None and not VALIDATE_IDEAS:
+        async for content in stream_chat(chat):
+            yield content
+        return
+    if idea_memory is not None:
+        await idea_memory.load()
+    persona = persona_of(chat)
+    validator = VALIDATORS[persona] if VALIDATE_IDEAS else None
+    ideas = 0
+
+    async def settle(line: str, violation=None):
+        """The text to send for one line, or None to drop it."""
+        nonlocal ideas
+        events = IdeaParser().parse_line(line)
+        if events and events[0]["type"] == "idea":
+            ideas += 1
+            return await checked_idea(chat, persona, line, events[0], ideas, violation, remember)
+        if events and validator is not None:
+            validator.note("numbering")  # preamble or commentary rather than an idea
+            return None
+        return line
+
+    upstream = stream_chat(chat)
+    pending = ""
+    try:
+        async for content in upstream:
+            pending += content
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                text = await settle(line)
+                if text is not None:
+                    yield text + "\n"
+                if validator is not None and ideas >= IDEA_COUNT:
+                    return
+            if validator is not None and ideas == IDEA_COUNT - 1:
+                events = IdeaParser().parse_line(pending)
+                violation = validator.check_partial(events[0]["text"]) if events and events[0]["type"] == "idea" else None
+                if violation is not None:
+                    validator.aborted()
+                    yield await settle(pending, violation)
+                    return
+        if pending:
+            text = await settle(pending)
+            if text is not None:
+                yield text
+    finally:
+        await upstream.aclose()
+
+def complete_brainstorm(text: str) -> bool:
+    """Whether ``text`` is exactly IDEA_COUNT ideas, numbered in order, and nothing else."""
+    parser = IdeaParser()
+    events = parser.feed(text + "\n") + parser.close()
+    return [event.get("index") for event in events] == list(range(1, IDEA_COUNT + 1))
+
+def idea_texts(text: str):
+    return [event["text"] for event in IdeaParser().feed(text + "\n") if event["type"] == "idea"]
+
+def unseen(persona, text: str) -> bool:
+    """Whether none of ``text``'s ideas is one the persona has already been given."""
+    return idea_memory is None or not any(idea_memory.find_similar(persona, idea) for idea in idea_texts(text))
+
+def poolable(persona, text: str) -> bool:
+    """A refill fit to pool: a complete brainstorm sharing no idea with the persona's memory or its pool."""
+    if not complete_brainstorm(text) or not unseen(persona, text):
+        return False
+    if idea_memory is None:
+        return True
+    pooled = [signature(idea) for answer in reservoir.pools[persona] for idea in idea_texts(answer)]
+    for idea in idea_texts(text):
+        sig = signature(idea)
+        if sig is not None and any(other is not None and similarity(sig, other) >= idea_memory.threshold
+                                   for other in pooled):
+            return False
+    return True
+
+# A persona button press sends just the tag and the canvas's placeholder label; those can be served pre-generated
+GENERIC_PROMPTS = {"", "my new business idea"}
+
+reservoir = Reservoir(
+    "brainstormer",
+    [*PERSONA_PROMPTS, None],
+    lambda persona: build_request(f"[PERSONA: {persona}]\n" if persona else ""),
+    lambda chat: generate(chat, remember=False),  # remembered by ``served`` instead, if ever served
+    poolable,
+)
+
+async def served(persona, text: str):
+    """Serve a reservoir answer, then remember its ideas for the persona like a live brainstorm's."""
+    yield text
+    if idea_memory is not None:
+        for event in IdeaParser().feed(text + "\n"):
+            if event["type"] == "idea":
+                await idea_memory.remember(persona, event["text"])
+
+logger = logging.getLogger("brainstormer")
+
+# This is the generic async generator function that yields the AI's response chunks
+async def stream_generator(chat: ChatRequest):
+    try:
+        async for content in generate(chat):
+            yield content
     except Exception as e:
-        print(f"An error occurred: {e}")
+        stream_failed(logger, e)
         yield f"Error: {e}"
 
 @app.post("/generate")
 @app.post("/brainstorm")
-async def generate_response(request: AgentRequest):
-    # Extract persona from prompt if present
-    persona = None
-    user_prompt = request.prompt
-    
-    if request.prompt.startswith('[PERSONA:'):
-        # Extract persona tag
-        persona_end = request.prompt.find(']')
-        persona = request.prompt[9:persona_end].strip().lower()
-        user_prompt = request.prompt[persona_end+1:].strip()
-    
-    model = "meta-llama/llama-3.3-70b-instruct"
-    
-    # Select system prompt based on persona
-    if persona == 'student':
-        system_prompt = STUDENT_PROMPT
-    elif persona == 'entrepreneur':
-        system_prompt = ENTREPRENEUR_PROMPT
-    elif persona == 'hackathon':
-        system_prompt = HACKATHON_PROMPT
-    else:
-        system_prompt = DEFAULT_PROMPT
-    
-    return StreamingResponse(stream_generator(user_prompt, model, system_prompt), media_type='text/plain')
+async def generate_response(request: AgentRequest, http_request: Request):
+    prompt = await node_prompt(request.prompt, request.nodes, "{prompt}\n\n{context}")  # keeps a persona tag first
+    chat = build_request(prompt)
+    persona, user_prompt = parse_persona(prompt)
+    persona = known_persona(persona)
+    answer = None
+    if user_prompt.lower() in GENERIC_PROMPTS:
+        answer = reservoir.take(persona, lambda text: unseen(persona, text))  # else generate live
+    body = served(persona, answer) if answer is not None else stream_generator(chat)
+    if request.speculate:
+        session = request.session or (http_request.client.host if http_request.client else "anonymous")
+        body = speculating(body, session, stream_chat)
+    node_id = new_node_id()
+    body = recorded(body, node_id, chat.agent, request.nodes, request.session)
+    return stream_response(chat.agent, body, IdeaParser() if request.structured else None, sse=request.sse,
+                           node_id=node_id)
+
+@app.post("/batch")
+@app.post("/brainstorm/batch")
+async def generate_batch(request: BatchRequest):
+    """Brainstorm for many (optionally persona-tagged) prompts; NDJSON results in completion order."""
+    return batch_response("brainstormer", request, lambda item: generate(build_request(tagged(item))), IdeaParser)
@@ -1,15 +1,24 @@
+import logging
 import os
+import re
+from typing import List, Optional
+
 from fastapi import FastAPI
 from pydantic import BaseModel
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from agent_core import ChatRequest, CompressionMiddleware, CritiqueParser, TraceMiddleware, in_order, lifespan, ops_router, stream_chat, stream_failed, stream_response
+from agent_core.sessions import new_node_id, node_prompt, recorded
 # Updated: 2025-10-05 16:20 - Added /criticize endpoint
 
 class AgentRequest(BaseModel):
-    prompt: str
+    prompt: str = ""
+    structured: bool = False  # stream typed NDJSON events instead of raw text
+    sse: bool = False  # send the stream as resumable Server-Sent Events
+    sectioned: Optional[bool] = None  # critique each idea in its own concurrent call (default: CRITIC_SECTIONED)
+    nodes: List[str] = []  # canvas node ids (or "<id>#<n>" items) to use as context (see agent_core.sessions)
+    session: Optional[str] = None  # the canvas session the response's node belongs to
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,39 +26,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent", "X-Stream-Id", "X-Node-Id"],
 )
+app.add_middleware(TraceMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.include_router(ops_router)
 
 @app.get("/")
 def root():
     return {"status": "ok", "agent": "Critic Agent", "message": "Agent is running"}
 
-client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY"))
-
-# This is the generic async generator function that yields the AI's response chunks
-async def stream_generator(prompt: str, model_identifier: str, system_prompt: str):
-    try:
-        stream = client.chat.completions.create(
-            model=model_identifier,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            stream=True, # <-- THIS ENABLES STREAMING
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        yield f"Error: {e}"
+MODEL = "meta-llama/llama-3.3-70b-instruct"  # Using Meta Llama 3.3 70B for analytical critique
+FALLBACK_MODEL = "llama-3.3-70b"  # Same model on Cerebras, used when OpenRouter is slow or failing
 
-@app.post("/generate")
-@app.post("/criticize")
-async def generate_response(request: AgentRequest):
-    # Set the specific model and prompt for THIS agent
-    model = "meta-llama/llama-3.3-70b-instruct"  # Using Meta Llama 3.3 70B for analytical critique
-    system_prompt = """You are a constructive critic with deep business acumen and strategic thinking.
+SYSTEM_PROMPT = """You are a constructive critic with deep business acumen and strategic thinking.
 
 You will receive 3 business ideas. Analyze ALL 3 IDEAS and provide critique for each one in SEPARATE BLOCKS.
 
@@ -108,6 +98,84 @@ CRITICAL: Format your response EXACTLY like this (NO === separators needed):
 [One powerful strategic suggestion for this specific idea]
 
 Be honest but constructive. Focus on actionable insights, not just problems."""
-    
-    # Return a StreamingResponse that calls the generator
-    return StreamingResponse(stream_generator(request.prompt, model, system_prompt), media_type='text/plain')
\ No newline at end of file
+
+# Sectioned mode: one call per idea, all running at once, merged back in idea order
+SECTIONED = os.getenv("CRITIC_SECTIONED", "0") == "1"
+
+IDEA_PROMPT = """You are a constructive critic with deep business acumen and strategic thinking.
+
+You will receive ONE business idea, numbered as it was in a list of ideas. Provide:
+1. 💪 Key Strengths (2-3 bullet points of what makes this compelling)
+2. ⚠️ Critical Challenges (2-3 realistic obstacles or risks)
+3. 💡 Strategic Recommendation (one actionable insight to strengthen the idea)
+
+CRITICAL: Format your response EXACTLY like this, with the idea's own number and nothing before or after the block:
+
+⚡ IDEA [number]: [Brief title of the idea]
+
+💪 Strengths:
+- [strength 1]
+- [strength 2]
+- [strength 3]
+
+⚠️ Challenges:
+- [challenge 1]
+- [challenge 2]
+- [challenge 3]
+
+💡 Recommendation:
+[One powerful strategic suggestion for this specific idea]
+
+Be honest but constructive. Focus on actionable insights, not just problems."""
+
+_IDEA_LINE = re.compile(r"^\s*(\d+)[.)]\s*(.+)$")
+
+def build_request(prompt: str) -> ChatRequest:
+    """Turn a user prompt into this agent's provider request."""
+    return ChatRequest(
+        agent="critic",
+        model=MODEL,
+        fallbacks=(("cerebras", FALLBACK_MODEL),),
+        system_prompt=SYSTEM_PROMPT,
+        prompt=prompt,
+    )
+
+def build_idea_requests(prompt: str) -> List[ChatRequest]:
+    """One request per numbered idea in a brainstorm, or none if it holds fewer than two."""
+    ideas = [match.groups() for match in map(_IDEA_LINE.match, prompt.split("\n")) if match]
+    if len(ideas) < 2:
+        return []
+    return [
+        ChatRequest(
+            agent="critic",
+            model=MODEL,
+            fallbacks=(("cerebras", FALLBACK_MODEL),),
+            system_prompt=IDEA_PROMPT,
+            prompt=f"IDEA {number}: {idea.strip()}",
+        )
+        for number, idea in ideas
+    ]
+
+logger = logging.getLogger("critic")
+
+# This is the generic async generator function that yields the AI's response chunks
+async def stream_generator(chat: ChatRequest, sections: List[ChatRequest] = ()):
+    try:
+        chunks = in_order(sections, stream_chat, separator="\n\n\n") if sections else stream_chat(chat)
+        async for content in chunks:
+            yield content
+    except Exception as e:
+        stream_failed(logger, e)
+        yield f"Error: {e}"
+
+@app.post("/generate")
+@app.post("/criticize")
+async def generate_response(request: AgentRequest):
+    prompt = await node_prompt(request.prompt, request.nodes)
+    chat = build_request(prompt)
+    sectioned = SECTIONED if request.sectioned is None else request.sectioned
+    sections = build_idea_requests(prompt) if sectioned else []
+    node_id = new_node_id()
+    body = recorded(stream_generator(chat, sections), node_id, chat.agent, request.nodes, request.session)
+    return stream_response(chat.agent, body, CritiqueParser() if request.structured else None,
+                           sse=request.sse, node_id=node_id)
@@ -1,64 +1,50 @@
+import logging
+import math
 import os
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
 from fastapi import FastAPI
 from pydantic import BaseModel
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from agent_core import ChatRequest, CompressionMiddleware, SlideParser, TraceMiddleware, in_order, lifespan, ops_router, stream_chat, stream_failed, stream_response
+from agent_core.compaction import count_tokens, fit_context
+from agent_core.sessions import new_node_id, node_prompt, recorded
 # Updated: 2025-10-05 16:20 - Added /pitchdeck endpoint
 
 # 1. Define the request model
 class AgentRequest(BaseModel):
-    prompt: str
+    prompt: str = ""
+    structured: bool = False  # stream typed NDJSON events instead of raw text
+    sse: bool = False  # send the stream as resumable Server-Sent Events
+    sectioned: Optional[bool] = None  # write slide groups in concurrent calls (default: PITCHDECK_SECTIONED)
+    nodes: List[str] = []  # canvas node ids (or "<id>#<n>" items) to use as context (see agent_core.sessions)
+    session: Optional[str] = None  # the canvas session the response's node belongs to
 
 # 2. Initialize the FastAPI app and add middleware
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent", "X-Stream-Id", "X-Node-Id"],
 )
+app.add_middleware(TraceMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.include_router(ops_router)
 
 @app.get("/")
 def root():
     return {"status": "ok", "agent": "Pitch Deck Agent", "message": "Agent is running"}
 
-# 3. Initialize the API client for Meta Llama (pitch decks need persuasive storytelling!)
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
+# 3. Configure the model and prompt (pitch decks need persuasive storytelling!)
+# Using Llama 3.3 70B for persuasive investor storytelling
+MODEL = "meta-llama/llama-3.3-70b-instruct"
+FALLBACK_MODEL = "llama-3.3-70b"  # Same model on Cerebras, used when OpenRouter is slow or failing
 
-# 4. Define the async stream generator
-async def stream_generator(prompt: str, model: str, system_prompt: str):
-    try:
-        stream = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,  # Pitch decks need more content
-            temperature=0.8,  # Higher creativity for compelling storytelling
-            stream=True
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        print(f"Error in stream_generator: {e}")
-        yield "An error occurred while generating the pitch deck."
-
-# 5. Define the API endpoint
-@app.post("/generate")
-@app.post("/pitchdeck")
-async def generate_response(request: AgentRequest):
-    # Using Llama 3.3 70B for persuasive investor storytelling
-    model = "meta-llama/llama-3.3-70b-instruct"
-    
-    system_prompt = """You are an expert pitch deck creator with experience helping startups, students, and entrepreneurs raise funding.
+SYSTEM_PROMPT = """You are an expert pitch deck creator with experience helping startups, students, and entrepreneurs raise funding.
 
 CRITICAL: Analyze the provided business idea, roadmap, and critique CAREFULLY. Your pitch deck must be 100% RELEVANT to the specific business context provided.
 
@@ -109,8 +95,92 @@ FORMAT RULES:
 - Keep it concise but impactful
 
 READ THE PROVIDED CONTEXT CAREFULLY AND GENERATE A PITCH DECK THAT IS 100% RELEVANT TO IT."""
-    
-    return StreamingResponse(
-        stream_generator(request.prompt, model, system_prompt), 
-        media_type='text/plain'
+
+# Token budget for one request: the context is compacted above CONTEXT_TOKENS, and
+# the deck gets whatever TOTAL_TOKENS leaves after the prompt (MIN..MAX_COMPLETION)
+CONTEXT_TOKENS = int(os.getenv("PITCHDECK_CONTEXT_TOKENS", "1200"))
+TOTAL_TOKENS = int(os.getenv("PITCHDECK_TOTAL_TOKENS", "3600"))
+MIN_COMPLETION_TOKENS = 900  # eight short slides
+MAX_COMPLETION_TOKENS = 2000  # Pitch decks need more content
+SYSTEM_TOKENS = count_tokens(SYSTEM_PROMPT)
+
+# Sectioned mode: each group of slides in its own call, all running at once, merged back in slide order
+SECTIONED = os.getenv("PITCHDECK_SECTIONED", "0") == "1"
+SLIDES = ("PROBLEM", "SOLUTION", "MARKET OPPORTUNITY", "PRODUCT/TECHNOLOGY", "BUSINESS MODEL",
+          "GO-TO-MARKET STRATEGY", "COMPETITIVE ADVANTAGE", "FUNDING & MILESTONES")
+
+def _slide_groups(spec: str) -> List[Tuple[int, ...]]:
+    """Parse e.g. "1-2,3-4,5-6,7-8" into slide number groups."""
+    groups = []
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        groups.append(tuple(range(int(first), int(last or first) + 1)))
+    return groups
+
+SLIDE_GROUPS = _slide_groups(os.getenv("PITCHDECK_SLIDE_GROUPS", "1-2,3-4,5-6,7-8"))
+
+logger = logging.getLogger("pitchdeck")
+
+# Referenced nodes are introduced by the agent that wrote them; roadmaps the way the canvas frames its own
+NODE_FRAMES = {
+    "brainstormer": "Business idea:\n\n{text}",
+    "critic": "Critique of the idea:\n\n{text}",
+    "roadmap": "Based on this roadmap:\n\n{text}",
+    "tasks": "Execution tasks:\n\n{text}",
+    "pitchdeck": "Earlier pitch deck draft:\n\n{text}",
+}
+
+def build_request(prompt: str) -> ChatRequest:
+    """Turn the idea/roadmap/critique context into this agent's provider request."""
+    context = fit_context(prompt, CONTEXT_TOKENS)
+    remaining = TOTAL_TOKENS - SYSTEM_TOKENS - context.tokens_after
+    max_tokens = max(MIN_COMPLETION_TOKENS, min(MAX_COMPLETION_TOKENS, remaining))
+    logger.info("pitch deck prompt: %d context tokens -> %d (compaction level %d), system %d, max_tokens %d",
+                context.tokens_before, context.tokens_after, context.level, SYSTEM_TOKENS, max_tokens)
+    return ChatRequest(
+        agent="pitchdeck",
+        model=MODEL,
+        fallbacks=(("cerebras", FALLBACK_MODEL),),
+        system_prompt=SYSTEM_PROMPT,
+        prompt=context.text,
+        params=dict(
+            max_tokens=max_tokens,
+            temperature=0.8,  # Higher creativity for compelling storytelling
+        ),
     )
+
+def build_group_requests(chat: ChatRequest) -> List[ChatRequest]:
+    """Split a deck request into one request per slide group, sharing the deck's token budget."""
+    requests = []
+    for group in SLIDE_GROUPS:
+        slides = " and ".join(f"SLIDE {number}: {SLIDES[number - 1]}" for number in group)
+        requests.append(replace(
+            chat,
+            prompt=f"{chat.prompt}\n\nWrite ONLY {slides}, in the required format, with nothing before or after them.",
+            params=dict(chat.params, max_tokens=math.ceil(chat.params["max_tokens"] * len(group) / len(SLIDES))),
+        ))
+    return requests
+
+# 4. Define the async stream generator (Meta Llama via the shared OpenRouter pool)
+async def stream_generator(chat: ChatRequest, sections: List[ChatRequest] = ()):
+    try:
+        chunks = in_order(sections, stream_chat) if sections else stream_chat(chat)
+        async for content in chunks:
+            yield content
+    except Exception as e:
+        stream_failed(logger, e)
+        yield "An error occurred while generating the pitch deck."
+
+# 5. Define the API endpoint
+@app.post("/generate")
+@app.post("/pitchdeck")
+async def generate_response(request: AgentRequest):
+    prompt = await node_prompt(request.prompt or "Create a compelling investor pitch deck.", request.nodes,
+                               frames=NODE_FRAMES)
+    chat = build_request(prompt)
+    sectioned = SECTIONED if request.sectioned is None else request.sectioned
+    sections = build_group_requests(chat) if sectioned else []
+    node_id = new_node_id()
+    body = recorded(stream_generator(chat, sections), node_id, chat.agent, request.nodes, request.session)
+    return stream_response(chat.agent, body, SlideParser() if request.structured else None,
+                           sse=request.sse, node_id=node_id)
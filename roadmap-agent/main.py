@@ -1,15 +1,22 @@
-import os
+import logging
+from typing import List, Optional
+
 from fastapi import FastAPI
 from pydantic import BaseModel
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from agent_core import ChatRequest, CompressionMiddleware, PhaseParser, TraceMiddleware, lifespan, ops_router, stream_chat, stream_failed, stream_response
+from agent_core.batch import BatchRequest, batch_response
+from agent_core.sessions import new_node_id, node_prompt, recorded
 # Updated: 2025-10-05 16:20 - Added /roadmap endpoint
 
 class AgentRequest(BaseModel):
-    prompt: str
+    prompt: str = ""
+    structured: bool = False  # stream typed NDJSON events instead of raw text
+    sse: bool = False  # send the stream as resumable Server-Sent Events
+    nodes: List[str] = []  # canvas node ids (or "<id>#<n>" items) to use as context (see agent_core.sessions)
+    session: Optional[str] = None  # the canvas session the response's node belongs to
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,39 +24,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent", "X-Stream-Id", "X-Node-Id"],
 )
+app.add_middleware(TraceMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.include_router(ops_router)
 
 @app.get("/")
 def root():
     return {"status": "ok", "agent": "Roadmap Agent", "message": "Agent is running"}
 
-client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY"))
+MODEL = "meta-llama/llama-3.3-70b-instruct"  # Using Meta Llama 3.3 70B for strategic planning
+FALLBACK_MODEL = "llama-3.3-70b"  # Same model on Cerebras, used when OpenRouter is slow or failing
 
-# This is the same generic async generator function
-async def stream_generator(prompt: str, model_identifier: str, system_prompt: str):
-    try:
-        stream = client.chat.completions.create(
-            model=model_identifier,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            stream=True, # <-- THIS ENABLES STREAMING
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        yield f"Error: {e}"
-
-@app.post("/generate")
-@app.post("/roadmap")
-async def generate_response(request: AgentRequest):
-    # Set the specific model and prompt for THIS agent
-    model = "meta-llama/llama-3.3-70b-instruct"  # Using Meta Llama 3.3 70B for strategic planning
-    system_prompt = """You are a strategic roadmap architect specializing in executable implementation plans.
+SYSTEM_PROMPT = """You are a strategic roadmap architect specializing in executable implementation plans.
 
 Given a project or idea, create a 3-4 phase roadmap where each phase:
 - Has a clear, inspiring title
@@ -65,6 +53,39 @@ Phase 1: Foundation & Market Validation :: Build MVP with core features (user au
 Phase 2: Feature Enhancement & Feedback Loop :: Implement top 3 user-requested features based on feedback. Add analytics tracking. Target: 200 active users with NPS > 40.
 
 Make it actionable, specific, and inspiring. DO NOT include any intro or conclusion text."""
-    
-    # Return a StreamingResponse that calls the generator
-    return StreamingResponse(stream_generator(request.prompt, model, system_prompt), media_type='text/plain')
\ No newline at end of file
+
+def build_request(prompt: str) -> ChatRequest:
+    """Turn a user prompt into this agent's provider request."""
+    return ChatRequest(
+        agent="roadmap",
+        model=MODEL,
+        fallbacks=(("cerebras", FALLBACK_MODEL),),
+        system_prompt=SYSTEM_PROMPT,
+        prompt=prompt,
+    )
+
+logger = logging.getLogger("roadmap")
+
+# This is the same generic async generator function
+async def stream_generator(chat: ChatRequest):
+    try:
+        async for content in stream_chat(chat):
+            yield content
+    except Exception as e:
+        stream_failed(logger, e)
+        yield f"Error: {e}"
+
+@app.post("/generate")
+@app.post("/roadmap")
+async def generate_response(request: AgentRequest):
+    chat = build_request(await node_prompt(request.prompt, request.nodes))
+    node_id = new_node_id()
+    body = recorded(stream_generator(chat), node_id, chat.agent, request.nodes, request.session)
+    return stream_response(chat.agent, body, PhaseParser() if request.structured else None,
+                           sse=request.sse, node_id=node_id)
+
+@app.post("/batch")
+@app.post("/roadmap/batch")
+async def generate_batch(request: BatchRequest):
+    """Roadmaps for many prompts; NDJSON results in completion order (personas do not apply here)."""
+    return batch_response("roadmap", request, lambda item: stream_chat(build_request(item.prompt)), PhaseParser)
@@ -1,96 +1,46 @@
-import os
-import traceback
+import logging
+from typing import List, Optional
+
 from fastapi import FastAPI
 from pydantic import BaseModel
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from agent_core import ChatRequest, CompressionMiddleware, TaskParser, TraceMiddleware, lifespan, ops_router, stream_chat, stream_failed, stream_response
+from agent_core.sessions import new_node_id, node_prompt, recorded
 # Updated: 2025-10-05 16:20 - Added /tasks endpoint
 
 # 1. Define the request model
 class AgentRequest(BaseModel):
-    prompt: str
+    prompt: str = ""
+    structured: bool = False  # stream typed NDJSON events instead of raw text
+    sse: bool = False  # send the stream as resumable Server-Sent Events
+    nodes: List[str] = []  # canvas node ids (or "<id>#<n>" items) to use as context (see agent_core.sessions)
+    session: Optional[str] = None  # the canvas session the response's node belongs to
 
 # 2. Initialize the FastAPI app and add middleware
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent", "X-Stream-Id", "X-Node-Id"],
 )
+app.add_middleware(TraceMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.include_router(ops_router)
 
 @app.get("/")
 def root():
     return {"status": "ok", "agent": "Task Agent", "message": "Agent is running"}
 
-# 3. Initialize Cerebras API client (blazing fast for structured output!)
-# This demonstrates multi-provider orchestration: Llama for creativity, Cerebras for speed
-cerebras_client = OpenAI(
-    base_url="https://api.cerebras.ai/v1",
-    api_key=os.getenv("CEREBRAS_API_KEY")
-)
+# 3. Configure the model and prompt for THIS agent
+# Using Cerebras for ultra-fast structured output generation
+# Cerebras inference is 20x faster than traditional GPU inference!
+MODEL = "llama3.1-8b"  # Cerebras-optimized Llama model
+FALLBACK_MODEL = "meta-llama/llama-3.3-70b-instruct"  # OpenRouter route if Cerebras is slow or failing
 
-# Fallback to OpenRouter if Cerebras fails
-openrouter_client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
-)
-
-# 4. Define the async stream generator with fallback
-async def stream_generator(prompt: str, model: str, system_prompt: str, use_cerebras: bool = True):
-    try:
-        if use_cerebras:
-            print(f"[TASK AGENT] Attempting Cerebras API with model: {model}")
-            client = cerebras_client
-        else:
-            print(f"[TASK AGENT] Using OpenRouter fallback with model: {model}")
-            client = openrouter_client
-            
-        stream = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True,
-            max_tokens=1500,
-            temperature=0.7
-        )
-        
-        has_content = False
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                has_content = True
-                yield content
-        
-        if not has_content:
-            print("[TASK AGENT] WARNING: Stream completed but no content received")
-            yield "No tasks generated. Please try again."
-            
-    except Exception as e:
-        error_details = traceback.format_exc()
-        print(f"[TASK AGENT] ERROR in stream_generator: {e}")
-        print(f"[TASK AGENT] Full traceback:\n{error_details}")
-        
-        # Try fallback to OpenRouter if Cerebras failed
-        if use_cerebras:
-            print("[TASK AGENT] Cerebras failed, trying OpenRouter fallback...")
-            async for content in stream_generator(prompt, "meta-llama/llama-3.3-70b-instruct", system_prompt, use_cerebras=False):
-                yield content
-        else:
-            yield f"Error: Unable to generate tasks. Please check API configuration.\n\nDetails: {str(e)}"
-
-# 5. Define the API endpoint
-@app.post("/generate")
-@app.post("/tasks")
-async def generate_response(request: AgentRequest):
-    # Using Cerebras for ultra-fast structured output generation
-    # Cerebras inference is 20x faster than traditional GPU inference!
-    model = "llama3.1-8b"  # Cerebras-optimized Llama model
-    system_prompt = """You are a strategic project architect with expertise in task breakdown and execution planning.
+SYSTEM_PROMPT = """You are a strategic project architect with expertise in task breakdown and execution planning.
 
 Given a project phase or goal, create a comprehensive, professional task breakdown with:
 - Clear, action-oriented task titles
@@ -116,4 +66,44 @@ Example:
 📈 Set up error monitoring (Effort: 2-3h | Difficulty: Medium) - Production debugging infrastructure
 
 Provide 5-7 tasks total. Be specific, actionable, and inspiring. Use realistic time ranges based on typical developer experience."""
-    return StreamingResponse(stream_generator(request.prompt, model, system_prompt), media_type='text/plain')
\ No newline at end of file
+
+def build_request(prompt: str) -> ChatRequest:
+    """Turn a user prompt into this agent's (Cerebras) provider request."""
+    return ChatRequest(
+        agent="tasks",
+        provider="cerebras",
+        model=MODEL,
+        fallbacks=(("openrouter", FALLBACK_MODEL),),
+        system_prompt=SYSTEM_PROMPT,
+        prompt=prompt,
+        params=dict(max_tokens=1500, temperature=0.7),
+    )
+
+logger = logging.getLogger("tasks")
+
+# 4. Define the async stream generator
+# The shared provider router fails over (or hedges) to OpenRouter when Cerebras misbehaves.
+async def stream_generator(chat: ChatRequest):
+    try:
+        has_content = False
+        async for content in stream_chat(chat):
+            has_content = True
+            yield content
+        
+        if not has_content:
+            logger.warning("stream completed without content")
+            yield "No tasks generated. Please try again."
+            
+    except Exception as e:
+        stream_failed(logger, e)  # the traceback is formatted by the log writer thread, not here
+        yield f"Error: Unable to generate tasks. Please check API configuration.\n\nDetails: {str(e)}"
+
+# 5. Define the API endpoint
+@app.post("/generate")
+@app.post("/tasks")
+async def generate_response(request: AgentRequest):
+    chat = build_request(await node_prompt(request.prompt, request.nodes))
+    node_id = new_node_id()
+    body = recorded(stream_generator(chat), node_id, chat.agent, request.nodes, request.session)
+    return stream_response(chat.agent, body, TaskParser() if request.structured else None,
+                           sse=request.sse, node_id=node_id)
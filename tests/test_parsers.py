@@ -0,0 +1,47 @@
+from agent_core.parsers import CritiqueParser
+
+BLOCK = """⚡ IDEA 1: Peer tutoring marketplace
+
+💪 Strengths:
+- Clear demand every exam season
+- Low cost to supply
+
+⚠️ Challenges:
+- Quality control
+
+💡 Recommendation:
+Start with one campus and
+prove retention before building more.
+"""
+
+
+def parse(text: str, step: int = 7):
+    parser = CritiqueParser()
+    events = []
+    for i in range(0, len(text), step):
+        events.extend(parser.feed(text[i:i + step]))
+    return events + parser.close(), parser
+
+
+def test_wrapped_recommendation_is_one_paragraph():
+    events, parser = parse(BLOCK)
+    critique, = events
+    assert critique["type"] == "critique"
+    assert critique["recommendation"] == "Start with one campus and prove retention before building more."
+    assert critique["strengths"] == ["Clear demand every exam season", "Low cost to supply"]
+    assert "errors" not in critique
+    assert (parser.items, parser.malformed) == (1, 0)
+
+
+def test_truncated_next_block_is_malformed():
+    events, parser = parse(BLOCK + "\n\n⚡")
+    malformed, critique = events  # the block itself is only complete at the end of the stream
+    assert critique["recommendation"] == "Start with one campus and prove retention before building more."
+    assert malformed == {"type": "malformed", "line": "⚡", "reason": "text after the Recommendation paragraph"}
+    assert (parser.items, parser.malformed) == (1, 1)
+
+
+def test_next_block_after_recommendation():
+    events, _ = parse(BLOCK + "\n\n" + BLOCK.replace("IDEA 1", "IDEA 2"))
+    assert [event["index"] for event in events] == [1, 2]
+    assert all("errors" not in event and event["recommendation"].endswith("more.") for event in events)
@@ -0,0 +1,39 @@
+import asyncio
+from collections import deque
+
+import pytest
+
+from agent_core.idea_memory import IdeaMemory
+from agent_core.registry import load_agent
+
+FIRST = "1. Peer tutoring marketplace for exam season\n2. Dorm food swap app for students\n3. Textbook rental tracker for campus clubs"
+SECOND = "1. Campus bike repair booking for commuters\n2. Thesis formatting checker for graduate students\n3. Lab equipment sharing board for researchers"
+
+
+@pytest.fixture
+def brainstormer(monkeypatch):
+    module = load_agent("brainstormer")
+    monkeypatch.setattr(module, "idea_memory", IdeaMemory())
+    monkeypatch.setattr(module.reservoir, "pools", {persona: deque() for persona in module.reservoir.pools})
+    return module
+
+
+def test_refill_sharing_an_idea_with_the_pool_is_rejected(brainstormer):
+    assert brainstormer.poolable("student", FIRST)
+    brainstormer.reservoir.pools["student"].append(FIRST)
+    overlapping = SECOND.replace("Campus bike repair booking for commuters", "Exam season peer tutoring marketplace")
+    assert not brainstormer.poolable("student", overlapping)
+    assert brainstormer.poolable("student", SECOND)
+    assert brainstormer.poolable("entrepreneur", overlapping)  # pools are per persona
+
+
+def test_stale_answer_is_dropped_when_taken(brainstormer):
+    pool = brainstormer.reservoir.pools["student"]
+    pool.extend([FIRST, SECOND])
+    asyncio.run(brainstormer.idea_memory.remember("student", "Dorm food swap app for students"))
+
+    def usable(text):
+        return brainstormer.unseen("student", text)
+
+    assert brainstormer.reservoir.take("student", usable) == SECOND
+    assert brainstormer.reservoir.take("student", usable) is None
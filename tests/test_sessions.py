@@ -0,0 +1,49 @@
+import asyncio
+
+from agent_core import sessions
+from agent_core.sessions import Node, SessionStore, node_prompt
+
+CRITIQUE = """⚡ IDEA 1: Peer tutoring marketplace
+
+💪 Strengths:
+1. Clear demand every exam season
+2. Low cost to supply
+
+⚡ IDEA 2: Campus food swap
+
+💡 Recommendation:
+Start with one dorm."""
+
+ROADMAP = """Phase 1: Validate :: Interview twenty students
+Phase 2: Build :: Ship the booking flow"""
+
+
+def test_blocks_win_over_numbered_lines_inside_them():
+    node = Node("c", "critic", CRITIQUE)
+    assert node.item(1).startswith("⚡ IDEA 1: Peer tutoring marketplace")
+    assert node.item(1).endswith("2. Low cost to supply")
+    assert node.item(2).startswith("⚡ IDEA 2: Campus food swap")
+    assert node.item(3) is None
+
+
+def test_phases_and_numbered_lines():
+    assert Node("r", "roadmap", ROADMAP).item(2) == "Phase 2: Build\n\nShip the booking flow"
+    assert Node("b", "brainstormer", "1. Peer tutoring\n2. Food swap").item(2) == "Food swap"
+
+
+def test_node_prompt_frames_by_agent(monkeypatch):
+    store = SessionStore()
+    monkeypatch.setattr(sessions, "session_store", store)
+    frames = {"roadmap": "Based on this roadmap:\n\n{text}", "critic": "Critique:\n\n{text}"}
+
+    async def prompt():
+        await store.put(Node("i", "brainstormer", "1. Peer tutoring marketplace for exams"))
+        await store.put(Node("r", "roadmap", ROADMAP))
+        await store.put(Node("c", "critic", CRITIQUE))
+        return await node_prompt("Make a deck.", ["i#1", "r#1", "r#2", "c#2"], frames=frames)
+
+    assert asyncio.run(prompt()) == (
+        "Peer tutoring marketplace for exams\n\n"
+        "Based on this roadmap:\n\nPhase 1: Validate\n\nInterview twenty students\n\nPhase 2: Build\n\nShip the booking flow\n\n"
+        "Critique:\n\n⚡ IDEA 2: Campus food swap\n\n💡 Recommendation:\nStart with one dorm.\n\n"
+        "Make a deck.")
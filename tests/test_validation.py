@@ -0,0 +1,39 @@
+import pytest
+
+from agent_core.registry import load_agent
+from agent_core.validation import PhraseMatcher, forbidden_phrases
+
+PROMPTS = ("DEFAULT_PROMPT", "HACKATHON_PROMPT", "STUDENT_PROMPT", "ENTREPRENEUR_PROMPT")
+
+
+@pytest.fixture(scope="module")
+def brainstormer():
+    return load_agent("brainstormer")
+
+
+@pytest.mark.parametrize("name", PROMPTS)
+def test_no_single_word_phrases(brainstormer, name):
+    phrases = forbidden_phrases(getattr(brainstormer, name))
+    assert phrases
+    assert [phrase for phrase in phrases if len(phrase.split()) < 2] == []
+
+
+def test_shared_trailing_words(brainstormer):
+    phrases = set(forbidden_phrases(brainstormer.DEFAULT_PROMPT))
+    assert {"Recipe apps", "vegan apps", "cooking apps", "Fitness tracker", "habit tracker"} <= phrases
+    assert {"Mental health", "Freelance design"} <= phrases
+    assert not {"meditation", "therapy", "writing", "Calendars"} & phrases
+
+    student = set(forbidden_phrases(brainstormer.STUDENT_PROMPT))
+    assert {"Medical advice", "legal advice", "financial advice"} <= student
+    assert not {"Inventory", "manufacturing"} & student
+    assert "Automator" not in forbidden_phrases(brainstormer.HACKATHON_PROMPT)
+    assert "courses" not in forbidden_phrases(brainstormer.ENTREPRENEUR_PROMPT)
+
+
+def test_matcher_on_real_prompt(brainstormer):
+    matcher = PhraseMatcher(forbidden_phrases(brainstormer.DEFAULT_PROMPT))
+    assert matcher.find("AI habit tracker for remote teams")
+    assert matcher.find("Vegan app for meal planning")
+    assert not matcher.find("Writing feedback marketplace for indie authors")
+    assert not matcher.find("Therapy appointment reminders for clinics")